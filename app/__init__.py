@@ -13,8 +13,8 @@ from flask_socketio import SocketIO
 from .models.const import creatives
 from .models.user import User
 from .libs.utils import now_date
-from pyhottop.pyhottop import Hottop
-# from libs.hottop_thread import Hottop
+from .libs.cache import RecordCache, RenderCache
+from .libs.registry import RoasterRegistry
 import copy
 import eventlet
 import logging
@@ -28,7 +28,7 @@ mgr = socketio.RedisManager('redis://' + os.environ.get('REDIS_HOST'))
 sio = SocketIO(client_manager=mgr)
 login_manager = LoginManager()
 mongo = PyMongo()
-ht = Hottop()
+roasters = RoasterRegistry()
 
 logger = logging.getLogger("cloud_cafe")
 logger.setLevel(logging.DEBUG)
@@ -45,22 +45,48 @@ import twitter
 
 
 def tweet_hook(func):
-    """Decorate to run tweets if the integration is enabled."""
+    """Decorate to run tweets if the integration is enabled.
+
+    Tweets are sent from a background task so the handler can reply to the
+    client without waiting on the user lookup or on Twitter.
+    """
     def wrapper(*args, **kwargs):
         results = func(*args, **kwargs)
-        c = mongo.db[app.config['USERS_COLLECTION']]
-        user = c.find_one({"username": current_user.get_id()})
+        sio.start_background_task(send_tweet, app._get_current_object(),
+                                  current_user.get_id(), func.__name__,
+                                  results)
+        return results
+    wrapper.__name__ = func.__name__
+    return wrapper
+
+
+def send_tweet(application, username, action, results):
+    """Tweet about a roasting action if the user has enabled the bot.
+
+    :param application: Application to run in the context of
+    :type application: Flask instance
+    :param username: User who performed the action
+    :type username: str
+    :param action: Name of the handler for the action, like `on_drop`
+    :type action: str
+    :param results: What the handler returned
+    :type results: dict
+    :returns: None
+    """
+    with application.app_context():
+        user = find_user(username)
+        if not user:
+            return None
         integrations = user.get('integrations')
 
         bot = integrations.get('twitter_bot')
         if not bot.get('status'):
-            return results
+            return None
         # if app.config['SIMULATE_ROAST']:
         #     return results
 
         creative_ref = copy.deepcopy(creatives)
-        action = func.__name__
-        base = creative_ref.get(func.__name__)
+        base = creative_ref.get(action)
         creative = None
         media = None
         if action == 'on_start_monitor' and bot.get('tweet_roast_begin'):
@@ -88,7 +114,7 @@ def tweet_hook(func):
 
         if not creative:
             # Didn't trigger any of the actions or they weren't enabled
-            return results
+            return None
 
         tags = 0
         tag_count = random.randint(2, 8)
@@ -119,8 +145,27 @@ def tweet_hook(func):
                 api.PostUpdate(creative, media=open(media, 'rb'))
         except Exception as e:
             logger.error(str(e))
-        return results
-    return wrapper
+
+
+def find_user(username):
+    """Get the account of a user without its password, through the cache.
+
+    :param username: Username of the account
+    :type username: str
+    :returns: dict with the account id as `id`, or None if there is none
+    """
+    def load():
+        c = mongo.db[app.config['USERS_COLLECTION']]
+        user = c.find_one({"username": username}, {'password': 0})
+        if not user:
+            return None
+        user['id'] = str(user.pop('_id'))
+        return user
+
+    user = app.user_cache.get('user', username, load)
+    if not user:
+        return None
+    return dict(user)
 
 
 @login_manager.user_loader
@@ -131,9 +176,7 @@ def load_user(username):
     :type username: str
     :returns: User
     """
-    from flask import current_app as app
-    c = mongo.db[app.config['USERS_COLLECTION']]
-    u = c.find_one({"username": username})
+    u = find_user(username)
     if not u:
         return None
     return User(u)
@@ -145,7 +188,8 @@ def unauthorized():
     return redirect(url_for('core.login'))
 
 
-def create_app(debug=False, simulate=False):
+def create_app(debug=False, simulate=False, isolate=False, high_rate=False,
+               ports=None):
     """Create an application context with blueprints."""
     app = Flask(__name__, static_folder='./resources')
     app.config['SECRET_KEY'] = 'iqR2cYJp93PuuO8VbK1Z'
@@ -155,10 +199,18 @@ def create_app(debug=False, simulate=False):
     app.config['INVENTORY_COLLECTION'] = 'inventory'
     app.config['PROFILE_COLLECTION'] = 'profiles'
     app.config['USERS_COLLECTION'] = 'accounts'
+    app.config['SAMPLES_COLLECTION'] = 'samples'
+    app.config['CHECKPOINT_INTERVAL'] = 10
+    app.config['CHART_POINTS'] = 500
     app.config['SIMULATE_ROAST'] = simulate
+    # Serial ports roasters may be attached to besides discovered adapters
+    app.config['ROASTER_PORTS'] = ports or [
+        p for p in os.environ.get('ROASTER_PORTS', '').split(',') if p]
     app.config['MONGO_URI'] = os.environ.get('MONGO_URI')
     app.config['REDIS_HOST'] = os.environ.get('REDIS_HOST')
     app.redis = Redis(host='redis')
+    app.render_cache = RenderCache(app.redis)
+    app.user_cache = RecordCache(app.redis)
     login_manager.init_app(app)
     mongo.init_app(app)
     sio.init_app(app)
@@ -166,7 +218,11 @@ def create_app(debug=False, simulate=False):
     from .core import core as core_blueprint
     app.register_blueprint(core_blueprint)
 
-    if simulate:
-        ht.set_simulate(True)
+    from .core.queries import ensure_indexes
+    with app.app_context():
+        ensure_indexes()
+
+    roasters.configure(app.config['ROASTER_PORTS'], simulate=simulate,
+                       isolate=isolate, high_rate=high_rate)
 
     return app
@@ -17,6 +17,7 @@ from . import (
     integrations,
     inventory,
     profiles,
+    queries,
     roast
 )
 
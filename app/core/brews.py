@@ -3,6 +3,8 @@ from . import core
 from .. import mongo, logger
 from ..libs.utils import now_time, paranoid_clean, now_date, load_date
 from .forms import BrewForm
+from .history import SUMMARY, roast_summaries
+from .queries import list_items, list_page
 from bson.objectid import ObjectId
 from flask import (
     render_template, redirect, url_for, jsonify, request
@@ -15,35 +17,27 @@ from flask_login import login_required, current_user
 @login_required
 def brews():
     """Render the brews page."""
-    c = mongo.db[app.config['BREWS_COLLECTION']]
-    items = c.find({'user': current_user.get_id()})
-    brews = list()
-    for x in items:
-        x['id'] = str(x['_id'])
-        brews.append(x)
-    brews.sort(key=lambda x: x['datetime'], reverse=True)
-
-    c = mongo.db[app.config['HISTORY_COLLECTION']]
-    items = c.find({'user': current_user.get_id()})
-    roasts = list()
-    for x in items:
-        x['id'] = str(x['_id'])
-        roasts.append(x)
-    roasts.sort(key=lambda x: x['date'], reverse=True)
+    brews = list_items('BREWS_COLLECTION', {'user': current_user.get_id()},
+                       [('datetime', -1)])
+    roasts = roast_summaries(current_user.get_id(), [('date', -1)])
     return render_template('brews.html', brews=brews, roasts=roasts)
 
 
+@core.route('/brews/items')
+@login_required
+def brew_items():
+    """Get a page of brews, newest first, optionally for a single roast."""
+    query = {'user': current_user.get_id()}
+    if request.args.get('roast_id'):
+        query['roast_id'] = paranoid_clean(request.args.get('roast_id'))
+    return jsonify(list_page('BREWS_COLLECTION', query, [('datetime', -1)]))
+
+
 @core.route('/brews/new', methods=['GET'])
 @login_required
 def new_brew():
     """Render the add new brew page."""
-    c = mongo.db[app.config['HISTORY_COLLECTION']]
-    items = c.find({'user': current_user.get_id()})
-    output = list()
-    for x in items:
-        x['id'] = str(x['_id'])
-        output.append(x)
-    output.sort(key=lambda x: x['date'], reverse=True)
+    output = roast_summaries(current_user.get_id(), [('date', -1)])
     return render_template('new_brew.html', roasts=output)
 
 
@@ -55,7 +49,7 @@ def add_brew():
     if form.validate():
         c = mongo.db[app.config['HISTORY_COLLECTION']]
         roast_id = paranoid_clean(form.roast_id.data)
-        roast = c.find_one({'_id': ObjectId(roast_id)})
+        roast = c.find_one({'_id': ObjectId(roast_id)}, SUMMARY)
         td = now_date(str=False) - load_date(roast['date'])
         c = mongo.db[app.config['BREWS_COLLECTION']]
         item = {'coffee': roast['coffee'],
@@ -73,6 +67,7 @@ def add_brew():
                 'user': current_user.get_id(),
                 'days_since_roast': td.days}
         c.insert(item)
+        app.render_cache.invalidate('roast', roast_id)
         return redirect(url_for('core.brews'))
     errors = ','.join([value[0] for value in list(form.errors.values())])
     return jsonify({'errors': errors})
@@ -90,7 +85,7 @@ def edit_brew():
         edit_id = paranoid_clean(request.form.get('brew_id'))
         c = mongo.db[app.config['HISTORY_COLLECTION']]
         roast_id = paranoid_clean(form.roast_id.data)
-        roast = c.find_one({'_id': ObjectId(roast_id)})
+        roast = c.find_one({'_id': ObjectId(roast_id)}, SUMMARY)
         c = mongo.db[app.config['BREWS_COLLECTION']]
         item = {'coffee': roast['coffee'],
                 'roast_id': form.roast_id.data,
@@ -102,7 +97,12 @@ def edit_brew():
                 'grind_smell': form.grind_smell.data.split(','),
                 'wet_smell': form.wet_smell.data.split(','),
                 'tasting_notes': form.tasting_notes.data}
+        previous = c.find_one({'_id': ObjectId(edit_id)}, ['roast_id'])
         c.update({'_id': ObjectId(edit_id)}, {'$set': item})
+        app.render_cache.invalidate('roast', roast_id)
+        if previous and previous.get('roast_id') != roast_id:
+            # The brew moved to another roast
+            app.render_cache.invalidate('roast', previous.get('roast_id'))
         return redirect(url_for('core.brews'))
     errors = ','.join([value[0] for value in list(form.errors.values())])
     return jsonify({'errors': errors})
@@ -118,5 +118,8 @@ def remove_brew():
                         'error': 'ID not found in request!'})
     c = mongo.db[app.config['BREWS_COLLECTION']]
     remove_id = paranoid_clean(args.get('id'))
+    item = c.find_one({'_id': ObjectId(remove_id)}, ['roast_id'])
     c.remove({'_id': ObjectId(remove_id)})
+    if item:
+        app.render_cache.invalidate('roast', item.get('roast_id'))
     return jsonify({'success': True})
@@ -4,21 +4,68 @@ For the most part, these socket functions will only be called when performing
 a roast. If the roast page is open or we need to pass graph data, we will use
 the websocket calls.
 """
-from .. import logger, sio, ht, mongo, tweet_hook
+from .. import logger, sio, roasters, mongo, tweet_hook
 from ..libs.utils import to_bool, now_time, paranoid_clean
 from bson.objectid import ObjectId
 from flask import current_app as app
 from flask import jsonify, request
 from flask_login import current_user
-from pyhottop.pyhottop import SerialConnectionError
+from flask_socketio import join_room
+from functools import partial, wraps
+from ..libs.checkpoint import RoastCheckpointer
+from ..libs.curves import RoastCurve, chart_series
+from ..libs.hottop_thread import SerialConnectionError
+from ..libs.registry import UnknownRoaster
+from .pipeline import finalize_roast
+
+# In-progress roasts being checkpointed, keyed by roaster
+checkpoints = dict()
+
+
+def known_roaster(func):
+    """Decorate to refuse roaster ids that are not configured or attached.
+
+    The client is sent an error instead, and nothing is created for the id.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except UnknownRoaster as e:
+            sio.emit('error', {'code': 'UNKNOWN_ROASTER',
+                               'message': str(e)}, room=request.sid)
+            return False
+    return wrapper
+
+
+def discard_checkpoint(roaster_id):
+    """Stop checkpointing the roast of a roaster and drop what was stored.
+
+    :param roaster_id: Roaster the roast was recorded on
+    :type roaster_id: str
+    :returns: None
+    """
+    checkpoint = checkpoints.pop(roaster_id or roasters.DEFAULT, None)
+    if checkpoint:
+        checkpoint.discard()
 
 
 @sio.on('connect')
 def on_connect():
-    """Handle the initial connections and send back current state."""
+    """Keep track of who connects for stats purposes."""
     logger.debug("Client connected: %s" % request.sid)
+
+
+@sio.on('join')
+@known_roaster
+def on_join(roaster_id=None):
+    """Join the room of a roaster and send back its current state."""
+    logger.debug("Client %s joined %s" % (request.sid, roaster_id))
+    join_room(roasters.room(roaster_id))
+    ht = roasters.get(roaster_id)
     state = ht.get_current_config()
-    sio.emit('init', state)
+    state['roaster'] = roaster_id or roasters.DEFAULT
+    sio.emit('init', state, room=request.sid)
 
 
 @sio.on('disconnect')
@@ -27,187 +74,265 @@ def on_disconnect():
     logger.debug("Client disconnected")
 
 
-def on_callback(data):
+def on_callback(roaster_id, data):
     """Callback handler to stream data into the browser.
 
     Despite not being decorated, this function will still be able to send data
-    back through socketio via the redis manager.
+    back through socketio via the redis manager. Each frame only holds the
+    latest sample, changed roast metadata and a sequence number, and is only
+    sent to clients in the room of the roaster it came from.
     """
     # logger.debug("User callback: %s" % str(data))
-    sio.emit('state', data)
+    sio.emit('state', data, room=roasters.room(roaster_id))
     return data
 
 
+def on_detected(roaster_id, activity):
+    """Tell the room about an event the roaster detected by itself.
+
+    Sent as the same activity marking the event by hand sends, flagged as
+    detected so the UI can tell the two apart.
+    """
+    logger.debug("Detected %s" % activity['event'])
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
+
+
+@sio.on('resync')
+@known_roaster
+def on_resync(roaster_id=None):
+    """Send a full snapshot to a client that missed part of the stream."""
+    ht = roasters.get(roaster_id)
+    logger.debug("Client resync: %s" % request.sid)
+    snapshot = ht.get_stream_snapshot()
+    # Charts only need the outline so far, but every marked event exactly
+    events = snapshot.pop('events')
+    snapshot['series'] = chart_series(RoastCurve.from_events(events),
+                                      app.config['CHART_POINTS'])
+    snapshot['events'] = [e for e in events if 'event' in e]
+    sio.emit('snapshot', snapshot, room=request.sid)
+
+
 @sio.on('mock')
-def on_mock():
+@known_roaster
+def on_mock(roaster_id=None):
     """Launch a thread to simulate activity."""
-    ht.start(on_callback)
+    ht = roasters.get(roaster_id)
+    ht.start(partial(on_callback, roaster_id),
+             partial(on_detected, roaster_id))
     activity = {'activity': 'ROAST_START'}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
 
 
 @sio.on('roaster-setup')
-def on_setup():
+@known_roaster
+def on_setup(roaster_id=None):
     """Establish a connection to the roaster via USB."""
+    ht = roasters.get(roaster_id)
     try:
-        ht.connect()
+        ht.connect(interface=roasters.port(roaster_id))
     except SerialConnectionError as e:
         sio.emit('error', {'code': 'SERIAL_CONNECTION_ERROR',
-                           'message': str(e)})
+                           'message': str(e)}, room=request.sid)
         return False
-    ht.start(on_callback)
+    ht.start(partial(on_callback, roaster_id),
+             partial(on_detected, roaster_id))
     activity = {'activity': 'ROAST_START'}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
     return activity
 
 
 @sio.on('roaster-shutdown')
+@known_roaster
 @tweet_hook
-def on_shutdown():
+def on_shutdown(roaster_id=None):
     """End the connection with the roaster."""
+    ht = roasters.get(roaster_id)
     ht.end()
     activity = {'activity': 'ROAST_SHUTDOWN', 'state': None}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
 
 
 @sio.on('start-monitor')
+@known_roaster
 @tweet_hook
-def on_start_monitor():
+def on_start_monitor(roaster_id=None):
     """Start the monitoring process."""
+    ht = roasters.get(roaster_id)
     state = ht.set_monitor(True)
+    discard_checkpoint(roaster_id)
+    checkpoint = RoastCheckpointer(
+        ht, mongo.db[app.config['SAMPLES_COLLECTION']],
+        current_user.get_id(), interval=app.config['CHECKPOINT_INTERVAL'])
+    checkpoint.start()
+    checkpoints[roaster_id or roasters.DEFAULT] = checkpoint
     activity = {'activity': 'START_MONITOR', 'state': state}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
     return activity
 
 
 @sio.on('stop-monitor')
-@tweet_hook
-def on_stop_monitor():
-    """Stop the monitoring process."""
-    state = ht.set_monitor(False)
-    state = ht.get_roast_properties()
-    c = mongo.db[app.config['HISTORY_COLLECTION']]
+@known_roaster
+def on_stop_monitor(roaster_id=None):
+    """Stop the monitoring process and save the roast in the background.
+
+    The reply only says monitoring has stopped. Saving, the inventory debit
+    and notifications follow in `finalize_roast`, which tells the room once
+    the roast has been saved.
+    """
+    ht = roasters.get(roaster_id)
+    summary = ht.set_monitor(False)
+    # Only saving needs every sample and event
+    state = ht.get_roast()
     state['user'] = current_user.get_id()
-    mid = c.insert(state)
-    state.pop('_id', None)  # Removes the injected mongo ID
-    state['roast_id'] = str(mid)
-    c = mongo.db[app.config['INVENTORY_COLLECTION']]
-    _id = c.update({'label': state.get('coffee').split(' - ')[1]},
-                   {'$inc': {'stock': -int(state.get('input_weight'))}})
-    activity = {'activity': 'STOP_MONITOR', 'state': state}
-    sio.emit('activity', activity)
+    checkpoint = checkpoints.pop(roaster_id or roasters.DEFAULT, None)
+    if not checkpoint:
+        # Monitoring began before a restart, so store everything now
+        checkpoint = RoastCheckpointer(
+            ht, mongo.db[app.config['SAMPLES_COLLECTION']], state['user'])
+    checkpoint.exit.set()
+    sio.start_background_task(finalize_roast, app._get_current_object(),
+                              roaster_id, checkpoint, state)
+    summary['user'] = state['user']
+    summary['roast_id'] = str(checkpoint.roast_id)
+    activity = {'activity': 'STOP_MONITOR', 'state': summary}
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
     return activity
 
 
 @sio.on('drop')
+@known_roaster
 @tweet_hook
-def on_drop():
+def on_drop(roaster_id=None):
     """Drop the coffee and begin the cool-down."""
+    ht = roasters.get(roaster_id)
     ht.drop()
     state = ht.add_roast_event({'event': 'Drop'})
     activity = {'activity': 'DROP_COFFEE', 'state': state}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
     return activity
 
 
 @sio.on('reset')
-def on_reset():
+@known_roaster
+def on_reset(roaster_id=None):
     """Reset the connection with the roaster."""
+    ht = roasters.get(roaster_id)
+    discard_checkpoint(roaster_id)
     ht.reset()
     state = ht.get_roast_properties()
     activity = {'activity': 'ROAST_RESET', 'state': state}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
 
 
 @sio.on('dry-end')
-def on_dry_end():
+@known_roaster
+def on_dry_end(roaster_id=None):
     """Register the dry end event."""
+    ht = roasters.get(roaster_id)
     logger.debug("Dry End")
     state = ht.add_roast_event({'event': 'Dry End'})
     activity = {'activity': 'DRY_END', 'state': state}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
     return activity
 
 
 @sio.on('first-crack')
+@known_roaster
 @tweet_hook
-def on_first_crack():
+def on_first_crack(roaster_id=None):
     """Register the first crack event."""
+    ht = roasters.get(roaster_id)
     logger.debug("First crack")
     state = ht.add_roast_event({'event': 'First Crack'})
     activity = {'activity': 'FIRST_CRACK', 'state': state}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
     return activity
 
 
 @sio.on('second-crack')
+@known_roaster
 @tweet_hook
-def on_second_crack():
+def on_second_crack(roaster_id=None):
     """Register the second crack event."""
+    ht = roasters.get(roaster_id)
     logger.debug("Second crack")
     state = ht.add_roast_event({'event': 'Second Crack'})
     activity = {'activity': 'SECOND_CRACK', 'state': state}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
     return activity
 
 
 @sio.on('roast-properties')
-def on_roast_properties(state):
+@known_roaster
+def on_roast_properties(state, roaster_id=None):
     """Update the roast properties."""
+    ht = roasters.get(roaster_id)
     logger.debug("Roast Properties: %s" % state)
+    # Resetting drops the roast, so stop checkpointing it too
+    discard_checkpoint(roaster_id)
     ht.reset()
     ht.set_roast_properties(state)
     activity = {'activity': 'ROAST_PROPERTIES', 'state': state}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
     return activity
 
 
 @sio.on('drum-motor')
-def on_drum_motor(state):
+@known_roaster
+def on_drum_motor(state, roaster_id=None):
     """Toggle the drum motor control."""
+    ht = roasters.get(roaster_id)
     logger.debug("Drum Motor: %s" % state)
     state = to_bool(state)
     ht.set_drum_motor(state)
     text = "Turn On" if not state else "Turn Off"
     activity = {'activity': 'DRUM_MOTOR', 'state': state, 'text': text}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
 
 
 @sio.on('cooling-motor')
-def on_cooling_motor(state):
+@known_roaster
+def on_cooling_motor(state, roaster_id=None):
     """Toggle the cooling motor control."""
+    ht = roasters.get(roaster_id)
     state = to_bool(state)
     ht.set_cooling_motor(state)
     text = "Turn On" if not state else "Turn Off"
     activity = {'activity': 'COOLING_MOTOR', 'state': state, 'text': text}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
 
 
 @sio.on('solenoid')
-def on_solenoid(state):
+@known_roaster
+def on_solenoid(state, roaster_id=None):
     """Toggle the solenoid control."""
+    ht = roasters.get(roaster_id)
     state = to_bool(state)
     ht.set_solenoid(state)
     text = "Turn On" if not state else "Turn Off"
     activity = {'activity': 'SOLENOID', 'state': state, 'text': text}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
 
 
 @sio.on('main-fan')
-def on_fan(state):
+@known_roaster
+def on_fan(state, roaster_id=None):
     """Toggle the fan control."""
+    ht = roasters.get(roaster_id)
     state = int(state)
     ht.set_main_fan(state)
     text = "Fan Level %d" % state
     activity = {'activity': 'MAIN_FAN', 'state': state, 'text': text}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
 
 
 @sio.on('heater')
-def on_heater(state):
+@known_roaster
+def on_heater(state, roaster_id=None):
     """Toggle the fan control."""
+    ht = roasters.get(roaster_id)
     state = int(state)
     ht.set_heater(state)
     text = "Heater Level %d" % state
     activity = {'activity': 'HEATER', 'state': state, 'text': text}
-    sio.emit('activity', activity)
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
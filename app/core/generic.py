@@ -1,16 +1,21 @@
 """Generic calls within the application."""
 from . import core
-from .. import mongo, logger
-from ..libs.utils import paranoid_clean, now_date, load_date
+from .. import find_user, mongo, logger
+from ..libs.checkpoint import iter_events
+from ..libs.exports import FORMATS, export_name, iter_archive, iter_roast
+from ..libs.utils import now_date, paranoid_clean
 from .forms import AccountSettingsForm, ChangePasswordForm
+from .history import roast_summaries
+from .queries import list_items
 from bson.objectid import ObjectId
 from flask import current_app as app
 from flask import (
-    render_template, redirect, url_for, jsonify, request, Response
+    render_template, redirect, url_for, jsonify, request, Response,
+    stream_with_context
 )
 from flask_login import login_required, current_user
+from functools import partial
 from werkzeug.security import generate_password_hash
-import json
 
 
 @core.route('/debug')
@@ -23,22 +28,11 @@ def debug():
 @login_required
 def root():
     """Render the index page."""
-    c = mongo.db[app.config['HISTORY_COLLECTION']]
-    items = c.find({'user': current_user.get_id()})
-    history = list()
-    for x in items:
-        x['id'] = str(x['_id'])
-        x['rest_days'] = (now_date(False) - load_date(x['date'])).days
-        history.append(x)
-    history.sort(key=lambda x: x['end_time'], reverse=True)
-
-    c = mongo.db[app.config['INVENTORY_COLLECTION']]
-    items = c.find({'user': current_user.get_id()})
-    inventory = list()
-    for x in items:
-        x['id'] = str(x['_id'])
-        inventory.append(x)
-    inventory.sort(key=lambda x: x['stock'], reverse=True)
+    # Only the most recent few roasts are shown on the dashboard
+    history = roast_summaries(current_user.get_id(), [('end_time', -1)],
+                              limit=5)
+    inventory = list_items('INVENTORY_COLLECTION',
+                           {'user': current_user.get_id()}, [('stock', -1)])
 
     return render_template('index.html', history=history, inventory=inventory)
 
@@ -47,15 +41,19 @@ def root():
 @login_required
 def settings():
     """Render the settings page."""
-    c = mongo.db[app.config['USERS_COLLECTION']]
-    user = c.find_one({'username': current_user.get_id()})
+    user = find_user(current_user.get_id())
     if not user:
         return render_template()
-    user['id'] = str(user['_id'])
-    user.pop('_id', None)
     return render_template('settings.html', user=user)
 
 
+@core.route('/account/cache')
+@login_required
+def user_cache_stats():
+    """Show how well the account cache is doing in this process."""
+    return jsonify(app.user_cache.stats())
+
+
 @core.route('/account/settings/update', methods=['POST'])
 @login_required
 def update_account():
@@ -71,6 +69,9 @@ def update_account():
                 'last_name': form.last_name.data,
                 'email': form.email.data}
         c.update({'_id': ObjectId(edit_id)}, {'$set': item})
+        app.user_cache.invalidate('user', current_user.get_id())
+        # Cached pages show the name of the user viewing them
+        app.render_cache.invalidate('user', current_user.get_id())
         return redirect(url_for('core.settings'))
     errors = ','.join([value[0] for value in list(form.errors.values())])
     return jsonify({'errors': errors})
@@ -89,6 +90,7 @@ def account_change_password():
         c = mongo.db[app.config['USERS_COLLECTION']]
         item = {'password': generate_password_hash(form.password.data)}
         c.update({'_id': ObjectId(edit_id)}, {'$set': item})
+        app.user_cache.invalidate('user', current_user.get_id())
         return redirect(url_for('core.settings'))
     errors = ','.join([value[0] for value in list(form.errors.values())])
     return jsonify({'errors': errors})
@@ -97,21 +99,48 @@ def account_change_password():
 @core.route('/export')
 @login_required
 def export_roast():
-    """Export a roast log."""
+    """Export a roast log, streamed as JSON or CSV."""
     c = mongo.db[app.config['HISTORY_COLLECTION']]
     roast_id = request.args.get('id')
     roast_id = paranoid_clean(roast_id)
-    item = c.find_one({'_id': ObjectId(roast_id)}, {'_id': 0})
+    fmt = request.args.get('format', 'json')
+    if fmt not in FORMATS:
+        return jsonify({'success': False, 'message': 'No such format.'})
+    item = c.find_one({'_id': ObjectId(roast_id)}, {'analytics': 0})
     if not item:
         return jsonify({'success': False, 'message': 'No such roast.'})
-    cleaned = list()
-    for i in item.get('events', list()):
-        if not i.get('config', dict()).get('valid'):
-            continue
-        cleaned.append(i)
-    item['events'] = cleaned
-    content = json.dumps(item, indent=4, sort_keys=True)
-    coffee = item['coffee'].replace(',', ' ').replace(' ', '-')
-    f = "{0}-{1}-{2}.log".format(item['date'], coffee, roast_id)
+    samples = mongo.db[app.config['SAMPLES_COLLECTION']]
+    extension, mimetype = FORMATS[fmt]
+    f = export_name(item, extension)
+    headers = {'Content-Disposition': 'attachment;filename=%s' % f}
+    content = iter_roast(item, iter_events(samples, item), fmt)
+    return Response(stream_with_context(content), mimetype=mimetype,
+                    headers=headers)
+
+
+@core.route('/export/archive')
+@login_required
+def export_archive():
+    """Export the roasts of a date range or coffee as a streamed zip."""
+    fmt = request.args.get('format', 'json')
+    if fmt not in FORMATS:
+        return jsonify({'success': False, 'message': 'No such format.'})
+    query = {'user': current_user.get_id()}
+    dates = dict()
+    if request.args.get('start'):
+        dates['$gte'] = paranoid_clean(request.args.get('start'))
+    if request.args.get('end'):
+        dates['$lte'] = paranoid_clean(request.args.get('end'))
+    if dates:
+        query['date'] = dates
+    if request.args.get('coffee'):
+        query['coffee'] = request.args.get('coffee')
+    c = mongo.db[app.config['HISTORY_COLLECTION']]
+    samples = mongo.db[app.config['SAMPLES_COLLECTION']]
+    # Small batches keep only a few roasts in memory at a time
+    roasts = c.find(query, {'analytics': 0}).sort('date', 1).batch_size(10)
+    content = iter_archive(roasts, partial(iter_events, samples), fmt)
+    f = "roasts-%s.zip" % now_date()
     headers = {'Content-Disposition': 'attachment;filename=%s' % f}
-    return Response(content, mimetype='application/json', headers=headers)
+    return Response(stream_with_context(content),
+                    mimetype='application/zip', headers=headers)
@@ -2,27 +2,68 @@
 from . import core
 from .. import mongo
 from ..libs.utils import paranoid_clean, now_date, load_date
+from .queries import list_items, list_page
 from bson.objectid import ObjectId
 from flask import current_app as app
 from flask import render_template, jsonify, request
 from flask_login import login_required, current_user
 
 
+# Fields shown wherever roasts are listed, leaving the events behind
+SUMMARY = ['coffee', 'name', 'date', 'start_time', 'end_time', 'duration',
+           'input_weight', 'output_weight', 'operator']
+
+
+def add_rest_days(items):
+    """Add the days each roast has rested since it was roasted.
+
+    :param items: Roast summaries
+    :type items: list
+    :returns: list
+    """
+    today = now_date(False)
+    for x in items:
+        x['rest_days'] = (today - load_date(x['date'])).days
+    return items
+
+
+def roast_summaries(user, sort, limit=0):
+    """Get the summary of the roasts a user has saved.
+
+    Roast documents carry every sample of the roast, which list pages never
+    show, so only the summary fields are fetched.
+
+    :param user: Owner of the roasts
+    :type user: str
+    :param sort: Fields and directions to sort by
+    :type sort: list
+    :param limit: Most roasts to return, or 0 for all
+    :type limit: int
+    :returns: list
+    """
+    items = list_items('HISTORY_COLLECTION', {'user': user}, sort, SUMMARY,
+                       limit=limit)
+    return add_rest_days(items)
+
+
 @core.route('/history')
 @login_required
 def history():
     """Render the history page."""
-    c = mongo.db[app.config['HISTORY_COLLECTION']]
-    items = c.find({'user': current_user.get_id()})
-    output = list()
-    for x in items:
-        x['id'] = str(x['_id'])
-        x['rest_days'] = (now_date(False) - load_date(x['date'])).days
-        output.append(x)
-    output.sort(key=lambda x: x['end_time'], reverse=True)
+    output = roast_summaries(current_user.get_id(), [('end_time', -1)])
     return render_template('history.html', history=output)
 
 
+@core.route('/history/items')
+@login_required
+def history_items():
+    """Get a page of roast summaries, most recent first."""
+    output = list_page('HISTORY_COLLECTION', {'user': current_user.get_id()},
+                       [('end_time', -1)], SUMMARY)
+    add_rest_days(output['items'])
+    return jsonify(output)
+
+
 @core.route('/history/remove-item', methods=['POST'])
 @login_required
 def remove_history():
@@ -33,4 +74,7 @@ def remove_history():
     c = mongo.db[app.config['HISTORY_COLLECTION']]
     remove_id = paranoid_clean(args.get('id'))
     c.remove({'_id': ObjectId(remove_id)})
+    c = mongo.db[app.config['SAMPLES_COLLECTION']]
+    c.remove({'roast': ObjectId(remove_id)})
+    app.render_cache.invalidate('roast', remove_id)
     return jsonify({'success': True})
@@ -1,6 +1,6 @@
 """Integration calls within the application."""
 from . import core
-from .. import logger, mongo
+from .. import find_user, logger, mongo
 from .forms import IntegrationTwitterbot
 from bson.objectid import ObjectId
 from flask import current_app as app
@@ -14,8 +14,7 @@ from flask_login import login_required, current_user
 @login_required
 def integrations():
     """Render the integrations page."""
-    c = mongo.db[app.config['USERS_COLLECTION']]
-    user = c.find_one({"username": current_user.get_id()})
+    user = find_user(current_user.get_id())
     integrations = user.get('integrations')
     twitter = integrations.get('twitter_bot')
     return render_template('integrations.html', twitter=twitter)
@@ -38,5 +37,6 @@ def integration_twitter_bot():
         c = mongo.db[app.config['USERS_COLLECTION']]
         c.update({'username': current_user.get_id()},
                  {'$set': {'integrations.twitter_bot': obj}})
+        app.user_cache.invalidate('user', current_user.get_id())
         return redirect(url_for('core.integrations'))
     return render_template('integrations.html')
@@ -3,6 +3,7 @@ from . import core
 from .. import mongo
 from ..libs.utils import now_time, paranoid_clean
 from .forms import InventoryForm
+from .queries import list_items, list_page
 from bson.objectid import ObjectId
 from flask import (
     render_template, redirect, url_for, jsonify, request
@@ -15,16 +16,20 @@ from flask_login import login_required, current_user
 @login_required
 def inventory():
     """Render the inventory page."""
-    c = mongo.db[app.config['INVENTORY_COLLECTION']]
-    items = c.find({'user': current_user.get_id()})
-    output = list()
-    for x in items:
-        x['id'] = str(x['_id'])
-        output.append(x)
-    output.sort(key=lambda x: x['datetime'], reverse=True)
+    output = list_items('INVENTORY_COLLECTION',
+                        {'user': current_user.get_id()}, [('datetime', -1)])
     return render_template('inventory.html', inventory=output)
 
 
+@core.route('/inventory/items')
+@login_required
+def inventory_items():
+    """Get a page of inventory, newest first."""
+    return jsonify(list_page('INVENTORY_COLLECTION',
+                             {'user': current_user.get_id()},
+                             [('datetime', -1)]))
+
+
 @core.route('/inventory/add-inventory', methods=['POST'])
 @login_required
 def add_inventory():
@@ -38,6 +43,7 @@ def add_inventory():
                 'fair_trade': form.fair_trade.data, 'tags': list(),
                 'datetime': now_time(), 'user': current_user.get_id()}
         _id = c.insert(item)
+        app.render_cache.invalidate('user', current_user.get_id())
         return redirect(url_for('core.inventory'))
     errors = ','.join([value[0] for value in list(form.errors.values())])
     return jsonify({'errors': errors})
@@ -60,6 +66,7 @@ def edit_inventory():
                 'fair_trade': form.fair_trade.data, 'tags': list(),
                 }
         c.update({'_id': ObjectId(edit_id)}, {'$set': item})
+        app.render_cache.invalidate('user', current_user.get_id())
         return redirect(url_for('core.inventory'))
     errors = ','.join([value[0] for value in list(form.errors.values())])
     return jsonify({'errors': errors})
@@ -76,4 +83,5 @@ def remove_inventory():
     c = mongo.db[app.config['INVENTORY_COLLECTION']]
     remove_id = paranoid_clean(args.get('id'))
     c.remove({'_id': ObjectId(remove_id)})
+    app.render_cache.invalidate('user', current_user.get_id())
     return jsonify({'success': True})
@@ -0,0 +1,108 @@
+"""Finish saving a roast in the background once monitoring stops.
+
+The stop-monitor handler only stops recording and hands the roast over, so
+the operator gets an answer right away. The steps that talk to Mongo and to
+Twitter then run here, one after the other, and the roaster's room is told
+when the roast has been saved or which step failed.
+
+Deriving the analytics and packing the events walk every sample of the
+roast without giving way, so they run in a native thread from the eventlet
+pool rather than holding up the hub that serves the roaster and sockets.
+"""
+import time
+from .. import logger, mongo, roasters, send_tweet, sio
+from bson.objectid import ObjectId
+from eventlet import tpool
+from ..libs.analytics import derive_curve, pack_analytics
+from ..libs.curves import RoastCurve
+from ..libs.samples import SampleStore
+
+
+def derive_and_pack(events):
+    """Derive the analytics of a roast and pack its events.
+
+    The events are walked once, into the store that is packed, and the
+    curve is built from its columns.
+
+    :param events: Samples and events of the roast
+    :type events: list
+    :returns: tuple of the packed analytics and events
+    """
+    store = SampleStore()
+    store.extend(events)
+    analytics = derive_curve(RoastCurve.from_store(store))
+    return pack_analytics(analytics), store.pack()
+
+
+def derive(application, roast):
+    """Derive the analytics shown on the historic roast page."""
+    state = roast['state']
+    state['analytics'], state['events'] = tpool.execute(
+        derive_and_pack, state['events'])
+
+
+def persist(application, roast):
+    """Seal the checkpointed roast into the history collection."""
+    c = mongo.db[application.config['HISTORY_COLLECTION']]
+    stats = roast['checkpoint'].seal(c, roast['state'])
+    logger.debug("Roast sealed: %s" % stats)
+
+
+def debit_inventory(application, roast):
+    """Take the green coffee used by the roast out of stock."""
+    state = roast['state']
+    c = mongo.db[application.config['INVENTORY_COLLECTION']]
+    if state.get('coffee_id'):
+        query = {'_id': ObjectId(state['coffee_id']), 'user': state['user']}
+    else:
+        # Roasts set up before the inventory id was sent along
+        label = (state.get('coffee') or '').split(' - ', 1)[-1]
+        query = {'user': state['user'], 'label': label}
+    c.update(query, {'$inc': {'stock': -int(state.get('input_weight'))}})
+    application.render_cache.invalidate('user', state['user'])
+
+
+def notify(application, roast):
+    """Tweet that the roast is complete if the user wants that."""
+    send_tweet(application, roast['state']['user'], 'on_stop_monitor',
+               {'state': roast['state']})
+
+
+STAGES = [derive, persist, debit_inventory, notify]
+
+
+def finalize_roast(application, roaster_id, checkpoint, state):
+    """Run every stage of saving a finished roast.
+
+    :param application: Application to run in the context of
+    :type application: Flask instance
+    :param roaster_id: Roaster the roast was recorded on
+    :type roaster_id: str
+    :param checkpoint: Checkpointer holding the roast so far
+    :type checkpoint: RoastCheckpointer instance
+    :param state: Final roast properties including its events
+    :type state: dict
+    :returns: dict seconds spent in each stage
+    """
+    roast = {'checkpoint': checkpoint, 'state': state}
+    timings = dict()
+    result = {'roast_id': str(checkpoint.roast_id), 'timings': timings}
+    with application.app_context():
+        for stage in STAGES:
+            start = time.perf_counter()
+            try:
+                stage(application, roast)
+            except Exception as e:
+                logger.exception("Saving the roast failed at %s" %
+                                 stage.__name__)
+                result.update({'stage': stage.__name__, 'error': str(e)})
+                activity = {'activity': 'ROAST_SAVE_FAILED', 'state': result}
+                sio.emit('activity', activity, room=roasters.room(roaster_id))
+                return timings
+            timings[stage.__name__] = time.perf_counter() - start
+            # Let the roaster and socket traffic run between stages
+            sio.sleep(0)
+    logger.debug("Roast finalized: %s" % timings)
+    activity = {'activity': 'ROAST_SAVED', 'state': result}
+    sio.emit('activity', activity, room=roasters.room(roaster_id))
+    return timings
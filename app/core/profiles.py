@@ -3,6 +3,7 @@ from . import core
 from .. import mongo
 from ..libs.utils import paranoid_clean
 from .forms import ProfileForm
+from .queries import list_items, list_page
 from bson.objectid import ObjectId
 from flask import (
     render_template, redirect, url_for, jsonify, request
@@ -15,16 +16,20 @@ from flask_login import login_required, current_user
 @login_required
 def profiles():
     """Render the profiles page."""
-    c = mongo.db[app.config['PROFILE_COLLECTION']]
-    items = c.find({'user': current_user.get_id()})
-    output = list()
-    for x in items:
-        x['id'] = str(x['_id'])
-        output.append(x)
-    output.sort(key=lambda x: x['datetime'], reverse=True)
+    output = list_items('PROFILE_COLLECTION',
+                        {'user': current_user.get_id()}, [('datetime', -1)])
     return render_template('profiles.html', profiles=output)
 
 
+@core.route('/profiles/items')
+@login_required
+def profile_items():
+    """Get a page of roast profiles, newest first."""
+    return jsonify(list_page('PROFILE_COLLECTION',
+                             {'user': current_user.get_id()},
+                             [('datetime', -1)]))
+
+
 @core.route('/profiles/edit-profile', methods=['POST'])
 @login_required
 def edit_profile():
@@ -0,0 +1,112 @@
+"""Shared helpers for querying the collections behind the list pages.
+
+Filtering, sorting and paging are left to Mongo, backed by the compound
+indexes declared here, instead of pulling every document a user owns into
+Python and sorting it there.
+"""
+from .. import mongo
+from flask import current_app as app
+from flask import request
+from pymongo import ASCENDING, DESCENDING
+
+# Compound indexes created at start-up, keyed by collection setting
+INDEXES = {
+    'HISTORY_COLLECTION': [
+        [('user', ASCENDING), ('end_time', DESCENDING)],
+        [('user', ASCENDING), ('date', DESCENDING)]
+    ],
+    'INVENTORY_COLLECTION': [
+        [('user', ASCENDING), ('datetime', DESCENDING)],
+        [('user', ASCENDING), ('stock', DESCENDING)],
+        [('user', ASCENDING), ('label', ASCENDING)]
+    ],
+    'PROFILE_COLLECTION': [
+        [('user', ASCENDING), ('datetime', DESCENDING)]
+    ],
+    'BREWS_COLLECTION': [
+        [('user', ASCENDING), ('datetime', DESCENDING)],
+        [('user', ASCENDING), ('roast_id', ASCENDING),
+         ('datetime', DESCENDING)]
+    ],
+    'SAMPLES_COLLECTION': [
+        [('roast', ASCENDING), ('bucket', ASCENDING)]
+    ],
+    'USERS_COLLECTION': [
+        [('username', ASCENDING)]
+    ]
+}
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+def ensure_indexes():
+    """Create the declared indexes, which is a no-op when they exist.
+
+    :returns: None
+    """
+    for key, indexes in INDEXES.items():
+        c = mongo.db[app.config[key]]
+        for index in indexes:
+            c.create_index(index, background=True)
+
+
+def list_items(key, query, sort, projection=None, skip=0, limit=0):
+    """Find documents sorted by Mongo and tag each with a string id.
+
+    :param key: Name of the collection setting, like `BREWS_COLLECTION`
+    :type key: str
+    :param query: Filter to apply
+    :type query: dict
+    :param sort: Fields and directions to sort by
+    :type sort: list
+    :param projection: Fields to return, or None for all
+    :type projection: list
+    :param skip: Number of documents to skip
+    :type skip: int
+    :param limit: Most documents to return, or 0 for all
+    :type limit: int
+    :returns: list
+    """
+    c = mongo.db[app.config[key]]
+    items = c.find(query, projection).sort(sort).skip(skip).limit(limit)
+    output = list()
+    for x in items:
+        x['id'] = str(x['_id'])
+        output.append(x)
+    return output
+
+
+def page_args():
+    """Get the page and page size asked for in the request.
+
+    :returns: tuple of page and page size
+    """
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        limit = int(request.args.get('limit', PAGE_SIZE))
+    except ValueError:
+        page, limit = 1, PAGE_SIZE
+    return page, min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def list_page(key, query, sort, projection=None):
+    """Get one page of documents ready to be returned as JSON.
+
+    :param key: Name of the collection setting, like `BREWS_COLLECTION`
+    :type key: str
+    :param query: Filter to apply
+    :type query: dict
+    :param sort: Fields and directions to sort by
+    :type sort: list
+    :param projection: Fields to return, or None for all
+    :type projection: list
+    :returns: dict
+    """
+    page, limit = page_args()
+    items = list_items(key, query, sort, projection, (page - 1) * limit,
+                       limit)
+    for x in items:
+        x.pop('_id', None)
+    total = mongo.db[app.config[key]].count_documents(query)
+    return {'success': True, 'items': items, 'page': page, 'limit': limit,
+            'total': total, 'more': page * limit < total}
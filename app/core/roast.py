@@ -1,34 +1,48 @@
 """Calls related to roasting."""
 import cairosvg
+import json
 import math
 import os
 import random
 from . import core
-from .. import logger, mongo
-from ..libs.utils import paranoid_clean, now_time, search_list, now_date
+from .. import logger, mongo, roasters
+from ..libs.analytics import (
+    derive_curve, downsample_chart, pack_analytics, unpack_analytics
+)
+from ..libs.checkpoint import load_store
+from ..libs.curves import ALIGNMENTS, SERIES, RoastCurve, align_curves
+from ..libs.utils import paranoid_clean, now_time, now_date
+from .queries import list_items
 from bson.objectid import ObjectId
 from flask import current_app as app
-from flask import render_template, jsonify, request
+from flask import render_template, jsonify, request, Response
 from flask_login import login_required, current_user
-from collections import OrderedDict
+
+# Most roasts overlaid in one comparison
+MAX_COMPARE = 50
+# Bounds on the points per chart series a client may ask for
+MIN_POINTS = 50
+MAX_POINTS = 5000
 
 
 @core.route('/roast')
 @login_required
 def active_roast():
     """Render the roast page."""
-    c = mongo.db[app.config['INVENTORY_COLLECTION']]
-    items = c.find({'user': current_user.get_id()})
-    output = list()
-    for x in items:
-        x['id'] = str(x['_id'])
-        if int(x['stock']) < 100:
-            continue
-        if app.config['SIMULATE_ROAST'] and x['label'] != 'Test Beans':
-            continue
-        output.append(x)
-    output.sort(key=lambda x: x['datetime'], reverse=True)
-    return render_template('roast.html', inventory=output)
+    query = {'user': current_user.get_id(), 'stock': {'$gte': 100}}
+    if app.config['SIMULATE_ROAST']:
+        query['label'] = 'Test Beans'
+    output = list_items('INVENTORY_COLLECTION', query, [('datetime', -1)])
+    roaster = paranoid_clean(request.args.get('roaster', ''))
+    return render_template('roast.html', inventory=output,
+                           roaster=roaster or roasters.DEFAULT)
+
+
+@core.route('/roast/roasters')
+@login_required
+def roaster_stats():
+    """Show the load of every roaster driven from this server."""
+    return jsonify(roasters.stats())
 
 
 @core.route('/roast/send-svg', methods=['POST'])
@@ -42,133 +56,188 @@ def send_svg():
     return jsonify({'success': True})
 
 
+def roast_analytics(c, item):
+    """Get the stored analytics of a roast, deriving them if needed.
+
+    :param c: History collection
+    :type c: Collection instance
+    :param item: Roast, which may carry its packed analytics
+    :type item: dict
+    :returns: tuple of derived series and OrderedDict of details
+    """
+    analytics = unpack_analytics(item.pop('analytics', None))
+    if not analytics:
+        # Saved before analytics were stored, or derived by an older version
+        events = c.find_one({'_id': item['_id']}, {'events': 1})
+        samples = mongo.db[app.config['SAMPLES_COLLECTION']]
+        curve = RoastCurve.from_store(load_store(samples, events))
+        packed = pack_analytics(derive_curve(curve))
+        c.update({'_id': item['_id']}, {'$set': {'analytics': packed}})
+        analytics = unpack_analytics(packed)
+    return analytics
+
+
 @core.route('/roast/<roast_id>')
 @login_required
 def historic_roast(roast_id):
     """Render a previous roast page."""
+    roast_id = paranoid_clean(roast_id)
+    cache = app.render_cache
+    key = cache.key('roast-page', ('roast', roast_id),
+                    ('user', current_user.get_id()))
+    page = cache.get(key)
+    if page is not None:
+        return page
+
     # Collect the roast history data
     c = mongo.db[app.config['HISTORY_COLLECTION']]
-    roast_id = paranoid_clean(roast_id)
-    item = c.find_one({'_id': ObjectId(roast_id)})
+    item = c.find_one({'_id': ObjectId(roast_id)}, {'events': 0})
     if not item:
         return jsonify({'success': False, 'message': 'No such roast.'})
     item['id'] = str(item['_id'])
     item['notes'] = item['notes'].replace('\n', ' ')
-    derived = {'s1': list(), 's2': list(), 's3': list(), 's4': list(),
-               's5': list(), 's6': list(), 'flags': list(),
-               'observations': list(), 'periods': {'tp2dry': None,
-               'dry2fc': None, 'fc2sc': None, 'sc2end': None, 'fc2end': None}}
-    for p in item['events']:
-        if 'event' in p:
-            label = "%s (%d, %d)" % (p['event'],
-                                     int(p['config']['environment_temp']),
-                                     int(p['config']['bean_temp']))
-            derived['flags'].append({'x': p['time'], 'title': str(label)})
-            continue
-        if not p['config'].get('valid', True):
-            continue
-        derived['s1'].append([p['time'], p['config']['environment_temp']])
-        derived['s2'].append([p['time'], p['config']['bean_temp']])
-        derived['s3'].append([p['time'], p['config']['main_fan'] * 10])
-        derived['s4'].append([p['time'], p['config']['heater']])
+    derived, details = roast_analytics(c, item)
+    derived = downsample_chart(derived, app.config['CHART_POINTS'])
 
     # Collect the inventory data
-    c = mongo.db[app.config['INVENTORY_COLLECTION']]
-    items = c.find({'user': current_user.get_id()})
-    inventory = list()
-    for x in items:
-        x['id'] = str(x['_id'])
-        inventory.append(x)
-    inventory.sort(key=lambda x: x['datetime'], reverse=True)
+    inventory = list_items('INVENTORY_COLLECTION',
+                           {'user': current_user.get_id()},
+                           [('datetime', -1)])
 
     # Collect the cupping data
     cuppings = list()
 
     # Collect the brew data
-    c = mongo.db[app.config['BREWS_COLLECTION']]
-    items = c.find({'user': current_user.get_id(), 'roast_id': roast_id})
-    brews = list()
-    for x in items:
-        x['id'] = str(x['_id'])
-        brews.append(x)
-    brews.sort(key=lambda x: x['datetime'], reverse=True)
-
-    details = OrderedDict({'state': {'last': -1, 'previous': None}})
-    for idx, p in enumerate(item['events']):
-        if not p['config'].get('valid', True):
-            continue
-
-        round_time = int(p['time'])
-        config = p['config']
-        config['bean_temp_str'] = ("%.2f" % config['bean_temp'])
-        config['environment_temp_str'] = ("%.2f" % config['environment_temp'])
-
-        if 'event' in p:
-            derived['observations'].append(p)
-            continue
-
-        if round_time not in details:
-            details[round_time] = dict()
-            details[round_time]['first'] = config
-            if round_time == 1:
-                details[round_time - 1]['last'] = details['state']['previous']
-                last = details[round_time - 1]['last']['bean_temp']
-                first = details[round_time - 1]['first']['bean_temp']
-                details[round_time - 1]['delta'] = (last - first)
-                total = int(((last - first) / float(first)) * 100)
-                details[round_time - 1]['percent'] = total
-
-        if round_time > details['state']['last']:
-            if round_time > 0:
-                details[round_time - 1]['last'] = details['state']['previous']
-                last = details[round_time - 1]['last']['bean_temp']
-                first = details[round_time - 1]['first']['bean_temp']
-                details[round_time - 1]['delta'] = (last - first)
-                last = details[round_time - 1]['last']['environment_temp']
-                first = details[round_time - 1]['first']['environment_temp']
-                derived['s5'].append([p['time'], details[round_time - 1]['delta']])
-                derived['s6'].append([p['time'], last - first])
-                total = int(((last - first) / float(first)) * 100)
-                details[round_time - 1]['percent'] = total
-            details['state']['last'] = round_time
-
-        if (idx == len(item['events']) - 1):
-            details[round_time]['last'] = config
-
-        details['state']['previous'] = config
-
-    del details['state']
-
-    tp = search_list(derived['observations'], 'event', 'Turning Point')
-    dry = search_list(derived['observations'], 'event', 'Dry End')
-    fc = search_list(derived['observations'], 'event', 'First Crack')
-    sc = search_list(derived['observations'], 'event', 'Second Crack')
-    drop = search_list(derived['observations'], 'event', 'Drop')
-    tp2dry = "<b>Drying</b><br>"
-    tp2dry += str(int((dry['time'] - tp['time']) / drop['time'] * 100)) + "%"
-    derived['periods']['tp2dry'] = {'from': tp['time'], 'to': dry['time'],
-                                    'label': {'text': tp2dry},
-                                    'color': '#fcf1dd7d'}
-    dry2fc = "<b>Roasting</b><br>"
-    dry2fc += str(int((fc['time'] - dry['time']) / drop['time'] * 100)) + "%"
-    derived['periods']['dry2fc'] = {'from': dry['time'], 'to': fc['time'],
-                                    'label': {'text': dry2fc, 'z-index': 99},
-                                    'color': '#d9b59496'}
-    if sc:
-        sc2end = "<b>Development</b><br>"
-        sc2end += str(int((drop['time'] - fc['time']) / drop['time'] * 100)) + "%"
-        derived['periods']['sc2end'] = {'from': fc['time'], 'to': drop['time'],
-                                        'label': {'text': sc2end},
-                                        'color': '#fff52247'}
-    fc2end = "<b>Development</b><br>"
-    fc2end += str(int((drop['time'] - fc['time']) / drop['time'] * 100)) + "%"
-    derived['periods']['fc2end'] = {'from': fc['time'], 'to': drop['time'],
-                                    'label': {'text': fc2end},
-                                        'color': '#fff52247'}
-
-    return render_template('historic_roast.html', roast=item,
+    brews = list_items('BREWS_COLLECTION',
+                       {'user': current_user.get_id(), 'roast_id': roast_id},
+                       [('datetime', -1)])
+
+    page = render_template('historic_roast.html', roast=item,
                            inventory=inventory, derived=derived,
                            cuppings=cuppings, brews=brews, details=details)
+    cache.set(key, page)
+    return page
+
+
+@core.route('/roast/<roast_id>/data')
+@login_required
+def historic_roast_data(roast_id):
+    """Get the chart series and details of a previous roast."""
+    roast_id = paranoid_clean(roast_id)
+    cache = app.render_cache
+    points = chart_points()
+    key = cache.key('roast-data:%d' % points, ('roast', roast_id))
+    content = cache.get(key)
+    if content is None:
+        c = mongo.db[app.config['HISTORY_COLLECTION']]
+        item = c.find_one({'_id': ObjectId(roast_id)}, {'analytics': 1})
+        if not item:
+            return jsonify({'success': False, 'message': 'No such roast.'})
+        derived, details = roast_analytics(c, item)
+        derived = downsample_chart(derived, points)
+        content = json.dumps({'success': True, 'derived': derived,
+                              'details': list(details.items())})
+        cache.set(key, content)
+    return Response(content, mimetype='application/json')
+
+
+def chart_points():
+    """Get the most points per chart series asked for in the request.
+
+    :returns: int
+    """
+    try:
+        points = int(request.args.get('points', app.config['CHART_POINTS']))
+    except ValueError:
+        points = app.config['CHART_POINTS']
+    return min(max(points, MIN_POINTS), MAX_POINTS)
+
+
+def roast_curve(samples, item):
+    """Build the curve of a saved roast, whichever way it was stored.
+
+    :param samples: Collection the buckets are stored in
+    :type samples: Collection instance
+    :param item: Roast including its `_id` and any stored events
+    :type item: dict
+    :returns: RoastCurve instance
+    """
+    return RoastCurve.from_store(load_store(samples, item))
+
+
+def _rounded(rows):
+    """Round resampled series to a tenth, with gaps as None.
+
+    :returns: list
+    """
+    return [[None if v != v else v for v in row]
+            for row in rows.round(1).tolist()]
+
+
+@core.route('/roast/compare')
+@login_required
+def compare_roasts():
+    """Get several roasts lined up on one time grid for overlaying.
+
+    Roasts are listed in `ids`, separated by commas, and lined up on their
+    charge or turning point with `align`. Series are sampled every `step`
+    seconds, or less often when that would give more than `points`.
+    """
+    ids = [paranoid_clean(i) for i in request.args.get('ids', '').split(',')
+           if i.strip()]
+    align = request.args.get('align', 'charge')
+    try:
+        step = min(max(float(request.args.get('step', 5)), 1), 60)
+        roast_ids = [ObjectId(i) for i in ids]
+    except Exception:
+        return jsonify({'success': False, 'message': 'Invalid request.'})
+    if not roast_ids or len(roast_ids) > MAX_COMPARE:
+        return jsonify({'success': False,
+                        'message': 'Pick 1 to %d roasts.' % MAX_COMPARE})
+    if align not in ALIGNMENTS:
+        return jsonify({'success': False, 'message': 'No such alignment.'})
+
+    cache = app.render_cache
+    points = chart_points()
+    name = 'roast-compare:%s:%s:%s:%d' % (current_user.get_id(), align, step,
+                                          points)
+    key = cache.key(name, *[('roast', i) for i in ids])
+    content = cache.get(key)
+    if content is not None:
+        return Response(content, mimetype='application/json')
+
+    c = mongo.db[app.config['HISTORY_COLLECTION']]
+    samples = mongo.db[app.config['SAMPLES_COLLECTION']]
+    query = {'_id': {'$in': roast_ids}, 'user': current_user.get_id()}
+    fields = ['events', 'coffee', 'name', 'date', 'duration']
+    found = {str(x['_id']): x for x in c.find(query, fields)}
+    # Keep the order the roasts were asked for in
+    items = [found[i] for i in ids if i in found]
+    curves = [roast_curve(samples, x) for x in items]
+    grid, offsets, series = align_curves(curves, align, step, points=points)
+    roasts = list()
+    for idx, item in enumerate(items):
+        roast = {k: item.get(k) for k in fields if k != 'events'}
+        roast['id'] = str(item['_id'])
+        roast['offset'] = float(offsets[idx])
+        roast['development_ratio'] = curves[idx].development_ratio()
+        roasts.append(roast)
+    output = {'success': True, 'align': align, 'step': step,
+              'grid': grid.round(4).tolist(), 'roasts': roasts,
+              'missing': [i for i in ids if i not in found]}
+    for key_name in SERIES:
+        for roast, row in zip(roasts, _rounded(series[key_name])):
+            roast[key_name] = row
+    content = json.dumps(output)
+    cache.set(key, content)
+    return Response(content, mimetype='application/json')
+
+
+@core.route('/roast/cache')
+@login_required
+def render_cache_stats():
+    """Show how well the render cache is doing."""
+    return jsonify(app.render_cache.stats())
 
 
 @core.route('/roast/update-properties', methods=['POST'])
@@ -189,6 +258,7 @@ def update_properties():
             'input_weight': state.get('input_weight'),
             'output_weight': state.get('output_weight')}
     c.update({'_id': ObjectId(roast_id)}, {'$set': item})
+    app.render_cache.invalidate('roast', roast_id)
     return jsonify({'success': True})
 
 
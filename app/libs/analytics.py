@@ -0,0 +1,179 @@
+"""
+Derive the charts and tables shown for a finished roast.
+
+The historic roast page used to rebuild every series, the per-minute details
+and the phase periods from the raw events on each view. None of it changes
+unless the events do, so it is derived once when a roast is saved and stored
+next to it, compressed, with a version number so that stored results are
+rebuilt whenever the way they are derived changes. The numbers themselves
+come from the array-backed `RoastCurve`, which is quickest to build straight
+from the columns of a `SampleStore` rather than from a list of events.
+"""
+import json
+import zlib
+
+from collections import OrderedDict
+
+import numpy as np
+
+from .curves import CHART_POINTS, RoastCurve, downsample
+from .utils import search_list
+
+# Bump whenever `derive_curve` changes what it produces
+VERSION = 2
+
+
+def _period(title, start, end, drop, color, label=None):
+    """Build a chart plot band covering one phase of the roast.
+
+    :returns: dict
+    """
+    text = "<b>%s</b><br>" % title
+    text += str(int((end['time'] - start['time']) / drop['time'] * 100)) + "%"
+    label = dict(label or dict(), text=text)
+    return {'from': start['time'], 'to': end['time'], 'label': label,
+            'color': color}
+
+
+def _periods(observations):
+    """Work out the phases of the roast from its marked events.
+
+    Phases are left out when the events that bound them were never marked.
+
+    :param observations: Marked events of the roast
+    :type observations: list
+    :returns: dict
+    """
+    periods = {'tp2dry': None, 'dry2fc': None, 'fc2sc': None, 'sc2end': None,
+               'fc2end': None}
+    tp = search_list(observations, 'event', 'Turning Point')
+    dry = search_list(observations, 'event', 'Dry End')
+    fc = search_list(observations, 'event', 'First Crack')
+    sc = search_list(observations, 'event', 'Second Crack')
+    drop = search_list(observations, 'event', 'Drop')
+    if not drop or not drop['time']:
+        return periods
+    if tp and dry:
+        periods['tp2dry'] = _period('Drying', tp, dry, drop, '#fcf1dd7d')
+    if dry and fc:
+        periods['dry2fc'] = _period('Roasting', dry, fc, drop, '#d9b59496',
+                                    {'z-index': 99})
+    if fc and sc:
+        periods['sc2end'] = _period('Development', fc, drop, drop,
+                                    '#fff52247')
+    if fc:
+        periods['fc2end'] = _period('Development', fc, drop, drop,
+                                    '#fff52247')
+    return periods
+
+
+def _series(time, values):
+    """Pair up times and values for a chart series.
+
+    :returns: list
+    """
+    return np.column_stack((time, values)).tolist()
+
+
+def _details(curve, derived):
+    """Summarize the bean temperature over every minute of the roast.
+
+    Also fills in the per-minute bean and environment deltas series.
+
+    :param curve: Readings of the roast
+    :type curve: RoastCurve instance
+    :param derived: Series being derived
+    :type derived: dict
+    :returns: list of minute and summary pairs
+    """
+    bean = curve.aggregates(60)
+    environment = curve.aggregates(60, 'environment_temp')
+    derived['s5'] = _series(bean['end'], bean['delta'])
+    derived['s6'] = _series(environment['end'], environment['delta'])
+    details = list()
+    for idx, minute in enumerate(bean['period'].tolist()):
+        details.append([minute, {
+            'first': {'bean_temp_str': "%.2f" % bean['first'][idx]},
+            'last': {'bean_temp_str': "%.2f" % bean['last'][idx]},
+            'delta': round(float(bean['delta'][idx]), 2),
+            'percent': int(bean['percent'][idx])}])
+    return details
+
+
+def derive_roast(events):
+    """Derive the chart series, details and phases of a roast from events.
+
+    Building the curve walks every event, so use `derive_curve` with a curve
+    built by `RoastCurve.from_store` where the samples are in a store.
+
+    :param events: Samples and marked events of the roast
+    :type events: iterable
+    :returns: dict with the derived series, the per-minute details and the
+              headline numbers of the roast
+    """
+    return derive_curve(RoastCurve.from_events(events))
+
+
+def derive_curve(curve):
+    """Derive the chart series, details and phases of a roast.
+
+    :param curve: Curve of the roast
+    :type curve: RoastCurve instance
+    :returns: dict with the derived series, the per-minute details and the
+              headline numbers of the roast
+    """
+    derived = {'s1': _series(curve.time, curve.environment_temp),
+               's2': _series(curve.time, curve.bean_temp),
+               's3': _series(curve.time, curve.main_fan * 10),
+               's4': _series(curve.time, curve.heater),
+               'flags': list()}
+    for marker in curve.markers:
+        label = "%s (%d, %d)" % (marker['event'],
+                                 int(marker['environment_temp'] or 0),
+                                 int(marker['bean_temp'] or 0))
+        derived['flags'].append({'x': marker['time'], 'title': label})
+    details = _details(curve, derived)
+    derived['periods'] = _periods(curve.markers)
+    derived['summary'] = curve.summary()
+    return {'derived': derived, 'details': details}
+
+
+def downsample_chart(derived, points=CHART_POINTS):
+    """Thin out the chart series of derived analytics for sending.
+
+    Flags and phases are left exactly where they are.
+
+    :param derived: Derived series from `derive_curve`
+    :type derived: dict
+    :param points: Most points to keep in each series
+    :type points: int
+    :returns: dict
+    """
+    output = dict(derived)
+    for name in ['s1', 's2', 's3', 's4', 's5', 's6']:
+        output[name] = downsample(derived[name], points)
+    return output
+
+
+def pack_analytics(analytics):
+    """Compress derived analytics for storing next to the roast.
+
+    :param analytics: Result of `derive_curve`
+    :type analytics: dict
+    :returns: dict
+    """
+    payload = json.dumps(analytics, separators=(',', ':')).encode('utf-8')
+    return {'version': VERSION, 'data': zlib.compress(payload)}
+
+
+def unpack_analytics(packed):
+    """Decompress stored analytics, or None if they are missing or stale.
+
+    :param packed: Stored analytics
+    :type packed: dict
+    :returns: tuple of derived series and OrderedDict of details, or None
+    """
+    if not packed or packed.get('version') != VERSION:
+        return None
+    analytics = json.loads(zlib.decompress(packed['data']).decode('utf-8'))
+    return analytics['derived'], OrderedDict(analytics['details'])
@@ -0,0 +1,255 @@
+"""
+Cache rendered pages, JSON responses and records that are read constantly.
+
+Cache keys carry the content version of everything the cached content was
+built from, such as a roast and the inventory of the user viewing it. Instead
+of hunting down every key that mentions a roast, invalidating simply bumps its
+version, so later lookups build new keys and the stale entries age out on
+their own. Redis problems are treated as misses so a page is never lost
+because the cache is down.
+
+Records such as user accounts are read on every request but rarely change, so
+they are kept for a short while in process and, optionally, for longer in
+Redis so that every worker shares them.
+"""
+import json
+import logging
+import time
+
+from collections import OrderedDict
+from redis.exceptions import RedisError
+
+log = logging.getLogger("cloud_cafe")
+
+
+class RenderCache:
+
+    """Versioned cache of rendered content kept in Redis.
+
+    :param redis: Connection to Redis
+    :type redis: Redis instance
+    :param ttl: Seconds a cached entry is kept
+    :type ttl: int
+    :returns: RenderCache instance
+    """
+
+    PREFIX = 'render'
+    TTL = 60 * 60 * 24
+
+    def __init__(self, redis, ttl=TTL):
+        """Use an existing Redis connection."""
+        self._redis = redis
+        self.ttl = ttl
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _name(self, *parts):
+        """Join parts into a Redis key under the cache prefix.
+
+        :returns: str
+        """
+        return ':'.join([self.PREFIX] + [str(p) for p in parts])
+
+    def key(self, name, *scopes):
+        """Build the key for content built from a set of scoped sources.
+
+        :param name: Name of the cached content, like `roast-page`
+        :type name: str
+        :param scopes: Pairs of scope and identifier, like ('roast', id)
+        :type scopes: tuple
+        :returns: str or None if the versions could not be read
+        """
+        names = [self._name('version', s, i) for s, i in scopes]
+        try:
+            versions = self._redis.mget(names) if names else list()
+        except RedisError as e:
+            log.error("Render cache unavailable: %s" % e)
+            return None
+        parts = ["%s=%s.%s" % (s, i, int(v or 0))
+                 for (s, i), v in zip(scopes, versions)]
+        return self._name(name, *parts)
+
+    def get(self, key):
+        """Get cached content.
+
+        :param key: Key built by `key`
+        :type key: str
+        :returns: str or None on a miss
+        """
+        value = None
+        if key:
+            try:
+                value = self._redis.get(key)
+            except RedisError as e:
+                log.error("Render cache unavailable: %s" % e)
+        self._stats['hits' if value is not None else 'misses'] += 1
+        if value is None:
+            return None
+        return value.decode('utf-8')
+
+    def set(self, key, value):
+        """Cache content.
+
+        :param key: Key built by `key`
+        :type key: str
+        :param value: Rendered content
+        :type value: str
+        :returns: None
+        """
+        if not key:
+            return None
+        try:
+            self._redis.setex(key, self.ttl, value)
+        except RedisError as e:
+            log.error("Render cache unavailable: %s" % e)
+
+    def invalidate(self, scope, ident):
+        """Make everything cached from a source stale.
+
+        :param scope: Kind of source, like `roast` or `user`
+        :type scope: str
+        :param ident: Identifier of the source
+        :type ident: str
+        :returns: None
+        """
+        try:
+            self._redis.incr(self._name('version', scope, ident))
+        except RedisError as e:
+            log.error("Render cache unavailable: %s" % e)
+        self._stats['invalidations'] += 1
+
+    def stats(self):
+        """Get the hit, miss and invalidation counts of this process.
+
+        Counting in Redis would cost a write on every lookup, so each
+        process keeps its own counts like `RecordCache` does.
+
+        :returns: dict
+        """
+        stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / float(lookups) if lookups else 0.0
+        return stats
+
+
+class RecordCache:
+
+    """Time-limited cache of records, in process and optionally in Redis.
+
+    Records must be JSON serializable when Redis is used. Invalidating drops
+    the record here and in Redis; other processes may keep serving their
+    in-process copy for up to `local_ttl` seconds.
+
+    :param redis: Connection to Redis, or None to cache in process only
+    :type redis: Redis instance
+    :param ttl: Seconds a record is kept in Redis, or in process without it
+    :type ttl: int
+    :param local_ttl: Seconds a record is kept in process when Redis is used
+    :type local_ttl: int
+    :param size: Most records kept in process
+    :type size: int
+    :returns: RecordCache instance
+    """
+
+    PREFIX = 'record'
+    TTL = 300
+    LOCAL_TTL = 5
+    SIZE = 1024
+
+    def __init__(self, redis=None, ttl=TTL, local_ttl=LOCAL_TTL, size=SIZE):
+        """Start with an empty cache."""
+        self._redis = redis
+        self.ttl = ttl
+        self.local_ttl = local_ttl if redis is not None else ttl
+        self._size = size
+        self._local = OrderedDict()
+        self._stats = {'hits': 0, 'redis_hits': 0, 'misses': 0,
+                       'invalidations': 0}
+
+    def _name(self, kind, ident):
+        """Build the Redis key of a record.
+
+        :returns: str
+        """
+        return ':'.join([self.PREFIX, kind, str(ident)])
+
+    def _keep(self, name, record):
+        """Hold a record in process, dropping the oldest when full.
+
+        :returns: None
+        """
+        self._local.pop(name, None)
+        self._local[name] = (time.monotonic() + self.local_ttl, record)
+        while len(self._local) > self._size:
+            self._local.popitem(last=False)
+
+    def get(self, kind, ident, load):
+        """Get a record, loading and caching it on a miss.
+
+        Records that are not found are not cached.
+
+        :param kind: Kind of record, like `user`
+        :type kind: str
+        :param ident: Identifier of the record
+        :type ident: str
+        :param load: Function loading the record on a miss
+        :type load: function
+        :returns: dict or None if `load` found nothing
+        """
+        name = self._name(kind, ident)
+        cached = self._local.get(name)
+        if cached and cached[0] > time.monotonic():
+            self._stats['hits'] += 1
+            return cached[1]
+        if self._redis is not None:
+            try:
+                value = self._redis.get(name)
+            except RedisError as e:
+                log.error("Record cache unavailable: %s" % e)
+                value = None
+            if value is not None:
+                record = json.loads(value.decode('utf-8'))
+                self._stats['redis_hits'] += 1
+                self._keep(name, record)
+                return record
+        self._stats['misses'] += 1
+        record = load()
+        if record is None:
+            return None
+        self._keep(name, record)
+        if self._redis is not None:
+            try:
+                self._redis.setex(name, self.ttl, json.dumps(record))
+            except RedisError as e:
+                log.error("Record cache unavailable: %s" % e)
+        return record
+
+    def invalidate(self, kind, ident):
+        """Drop a record so the next lookup loads it again.
+
+        :param kind: Kind of record, like `user`
+        :type kind: str
+        :param ident: Identifier of the record
+        :type ident: str
+        :returns: None
+        """
+        name = self._name(kind, ident)
+        self._local.pop(name, None)
+        self._stats['invalidations'] += 1
+        if self._redis is None:
+            return None
+        try:
+            self._redis.delete(name)
+        except RedisError as e:
+            log.error("Record cache unavailable: %s" % e)
+
+    def stats(self):
+        """Get the hit, miss and invalidation counts of this process.
+
+        :returns: dict
+        """
+        stats = dict(self._stats)
+        hits = stats['hits'] + stats['redis_hits']
+        lookups = hits + stats['misses']
+        stats['hit_ratio'] = hits / float(lookups) if lookups else 0.0
+        stats['size'] = len(self._local)
+        return stats
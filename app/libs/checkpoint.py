@@ -0,0 +1,287 @@
+"""
+Persist a roast to Mongo while it is still in progress.
+
+Saving the whole roast in one insert when monitoring stops means a single
+large write at the busiest moment, and a crash before then loses the roast.
+Instead, the samples recorded since the last checkpoint are appended every
+few seconds to bucket documents holding a fixed number of samples each.
+Stopping only has to flush the last few seconds and insert the roast itself
+under the identifier the buckets were filed with.
+
+Events are packed with `pack_events` both in the buckets and in the sealed
+roast, which is small enough that the buckets are dropped once it is saved.
+Buckets left behind by a crash are sealed or discarded by `recover_roasts`.
+"""
+import bson
+import datetime
+import time
+
+from bson.objectid import ObjectId
+from threading import Thread, Event, Lock
+
+from .samples import SampleStore, pack_events, unpack_events
+from .utils import now_time, load_time, timedelta2period
+
+
+def iter_events(samples, roast):
+    """Yield the events of a saved roast, whichever way they were stored.
+
+    Events are either packed into the roast, stored inline as a list by
+    older versions, or still in the buckets of a roast that was never sealed.
+    Only one bucket is decoded at a time.
+
+    :param samples: Collection the buckets are stored in
+    :type samples: Collection instance
+    :param roast: Roast document, which must include its `_id`
+    :type roast: dict
+    """
+    if 'events' in roast:
+        if isinstance(roast['events'], list):
+            yield from roast['events']
+        else:
+            yield from SampleStore.unpack(roast['events'])
+        return
+    query = {'roast': roast['_id']}
+    for bucket in samples.find(query).sort('bucket', 1):
+        for chunk in bucket.get('chunks', list()):
+            yield from unpack_events(chunk)
+
+
+def load_events(samples, roast):
+    """Get the events of a saved roast as a list.
+
+    :param samples: Collection the buckets are stored in
+    :type samples: Collection instance
+    :param roast: Roast document, which must include its `_id`
+    :type roast: dict
+    :returns: list
+    """
+    return list(iter_events(samples, roast))
+
+
+def load_store(samples, roast):
+    """Get the samples and events of a saved roast in a column store.
+
+    Packed events are unpacked straight into the columns, without building
+    a dictionary per sample as `load_events` does.
+
+    :param samples: Collection the buckets are stored in
+    :type samples: Collection instance
+    :param roast: Roast document, which must include its `_id`
+    :type roast: dict
+    :returns: SampleStore instance
+    """
+    if isinstance(roast.get('events'), dict):
+        return SampleStore.unpack(roast['events'])
+    store = SampleStore()
+    store.extend(iter_events(samples, roast))
+    return store
+
+
+def recovered_roast(roast_id, last, events):
+    """Build a roast document from the buckets of an unfinished roast.
+
+    The roast properties come from the last checkpoint, which was taken
+    mid-roast, so the fields only set when monitoring stops are filled in
+    from when that checkpoint was written and the last recorded event.
+
+    :param roast_id: Identifier the buckets were filed with
+    :type roast_id: ObjectId
+    :param last: Newest bucket of the roast
+    :type last: dict
+    :param events: Every sample and event of the roast
+    :type events: list
+    :returns: dict
+    """
+    roast = dict(last.get('state') or dict())
+    if not roast.get('end_time'):
+        roast['end_time'] = last.get('updated') or roast.get('start_time')
+    if not roast['end_time']:
+        # Buckets written before checkpoints were timestamped
+        moment = roast_id.generation_time.astimezone(tz=None)
+        roast['end_time'] = moment.strftime("%Y-%m-%d %H:%M:%S")
+    roast['date'] = load_time(roast['end_time']).strftime("%Y-%m-%d")
+    if not roast.get('start_time'):
+        roast['start_time'] = roast['end_time']
+    if roast.get('duration', -1) == -1:
+        minutes = max([e.get('time', 0.0) for e in events])
+        td = datetime.timedelta(seconds=minutes * 60)
+        roast['duration'] = timedelta2period(td)
+    for key in ['coffee', 'name', 'operator']:
+        roast.setdefault(key, None)
+    for key in ['input_weight', 'output_weight']:
+        roast.setdefault(key, -1)
+    roast.update({'_id': roast_id, 'user': last.get('user'),
+                  'recovered': True, 'events': pack_events(events)})
+    return roast
+
+
+def recover_roasts(samples, history, age=60, discard=False):
+    """Seal or discard the buckets of roasts that were never finished.
+
+    Buckets are only left behind when the server stopped mid-roast, or
+    after sealing when removing them failed. Roasts already in the history
+    just have their buckets removed. The rest are saved from their buckets
+    with the roast properties of the last checkpoint and flagged as
+    recovered, unless `discard` is set. Roasts that started less than `age`
+    minutes ago may still be running elsewhere, so they are left alone.
+
+    :param samples: Collection the buckets are stored in
+    :type samples: Collection instance
+    :param history: Collection finished roasts are stored in
+    :type history: Collection instance
+    :param age: Minutes since a roast started before it is recovered
+    :type age: int or float
+    :param discard: Remove unfinished roasts instead of saving them
+    :type discard: bool
+    :returns: dict counts of sealed, discarded and cleaned up roasts
+    """
+    stats = {'sealed': 0, 'discarded': 0, 'cleaned': 0, 'skipped': 0}
+    cutoff = ObjectId.from_datetime(
+        datetime.datetime.utcnow() - datetime.timedelta(minutes=age))
+    for roast_id in samples.distinct('roast'):
+        if roast_id >= cutoff:
+            stats['skipped'] += 1
+            continue
+        if history.find_one({'_id': roast_id}, {'_id': 1}):
+            stats['cleaned'] += 1
+        elif discard:
+            stats['discarded'] += 1
+        else:
+            last = samples.find_one({'roast': roast_id},
+                                    sort=[('bucket', -1)])
+            events = load_events(samples, {'_id': roast_id})
+            if events:
+                history.insert(recovered_roast(roast_id, last, events))
+                stats['sealed'] += 1
+            else:
+                stats['discarded'] += 1
+        samples.remove({'roast': roast_id})
+    return stats
+
+
+class RoastCheckpointer(Thread):
+
+    """Append the samples of an in-progress roast to bucket documents.
+
+    :param roaster: Roaster being monitored
+    :type roaster: Hottop instance
+    :param samples: Collection the buckets are stored in
+    :type samples: Collection instance
+    :param user: Owner of the roast
+    :type user: str
+    :param interval: Seconds between checkpoints
+    :type interval: int or float
+    :param bucket_size: Samples and events kept in each bucket
+    :type bucket_size: int
+    :returns: RoastCheckpointer instance
+    """
+
+    INTERVAL = 10
+    BUCKET_SIZE = 240
+
+    def __init__(self, roaster, samples, user, interval=INTERVAL,
+                 bucket_size=BUCKET_SIZE):
+        """Pick the roast identifier up front so buckets can refer to it."""
+        Thread.__init__(self, name="roast-checkpoint")
+        self.daemon = True
+        self.roast_id = ObjectId()
+        self.interval = interval
+        self.bucket_size = bucket_size
+        self._roaster = roaster
+        self._samples = samples
+        self._user = user
+        self._position = 0
+        self._lock = Lock()
+        self._stats = {'checkpoints': 0, 'writes': 0, 'bytes': 0,
+                       'stored': 0, 'latency': 0.0, 'max_latency': 0.0}
+        self.exit = Event()
+
+    def run(self):
+        """Checkpoint until the exit signal has been set.
+
+        :returns: None
+        """
+        while not self.exit.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """Append everything recorded since the last checkpoint.
+
+        The latest roast properties are stored on the bucket being written
+        to, along with when it was written, so an interrupted roast can be
+        recovered from its buckets.
+
+        :returns: int number of samples and events written
+        """
+        with self._lock:
+            start = time.perf_counter()
+            events, self._position = self._roaster.get_events_since(
+                self._position)
+            state = self._roaster.get_roast(events=False)
+            updated = now_time(str=True)
+            stored = self._stats['stored']
+            offset = 0
+            while offset < len(events):
+                bucket = (stored + offset) // self.bucket_size
+                room = self.bucket_size - (stored + offset) % self.bucket_size
+                chunk = events[offset:offset + room]
+                update = {'$push': {'chunks': pack_events(chunk)},
+                          '$inc': {'count': len(chunk)},
+                          '$set': {'user': self._user, 'state': state,
+                                   'updated': updated}}
+                self._samples.update({'roast': self.roast_id,
+                                      'bucket': bucket}, update, upsert=True)
+                self._stats['writes'] += 1
+                self._stats['bytes'] += len(bson.BSON.encode(update))
+                offset += len(chunk)
+            elapsed = time.perf_counter() - start
+            self._stats['stored'] += len(events)
+            self._stats['checkpoints'] += 1
+            self._stats['latency'] = elapsed
+            self._stats['max_latency'] = max(self._stats['max_latency'],
+                                             elapsed)
+            return len(events)
+
+    def seal(self, history, state):
+        """Stop checkpointing and save the finished roast.
+
+        :param history: Collection finished roasts are stored in
+        :type history: Collection instance
+        :param state: Final roast properties, events packed or not
+        :type state: dict
+        :returns: dict timings and sizes of the final writes
+        """
+        self.exit.set()
+        start = time.perf_counter()
+        self.flush()
+        roast = dict(state)
+        roast['_id'] = self.roast_id
+        events = state.get('events', list())
+        if isinstance(events, list):
+            events = pack_events(events)
+        roast['events'] = events
+        history.insert(roast)
+        self._stats['bytes'] += len(bson.BSON.encode(roast))
+        with self._lock:
+            self._samples.remove({'roast': self.roast_id})
+        stats = self.get_stats()
+        stats['seal_latency'] = time.perf_counter() - start
+        return stats
+
+    def discard(self):
+        """Stop checkpointing and remove what was stored.
+
+        :returns: None
+        """
+        self.exit.set()
+        with self._lock:
+            self._samples.remove({'roast': self.roast_id})
+
+    def get_stats(self):
+        """Get the counters for checkpoint writes.
+
+        :returns: dict
+        """
+        with self._lock:
+            return dict(self._stats)
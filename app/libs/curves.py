@@ -0,0 +1,499 @@
+"""
+Analyse roast curves held in NumPy arrays.
+
+Every reading of a roast becomes a slot in a handful of columns, so rates of
+rise, phase lengths, the development time ratio, the area under the curve
+and the per-minute summaries are each a few array operations instead of a
+Python loop over a dictionary per reading. The historic roast page, exports
+and comparisons all work from the same `RoastCurve`.
+
+Times are kept in minutes, the way they are recorded, and rates of rise are
+given in degrees per minute over windows measured in seconds. Series sent to
+charts are thinned out with Largest-Triangle-Three-Buckets, which keeps the
+shape of a curve, peaks included, with a fraction of its points.
+"""
+from array import array
+
+import numpy as np
+
+from .samples import SampleStore
+
+# Events that older versions of the roast page named differently
+ALIASES = {'Drop Coffee': 'Drop'}
+ROR_WINDOWS = [15, 30, 60]
+ALIGNMENTS = ['charge', 'turning_point']
+# Series that can be resampled, with rates of rise over the middle window
+SERIES = ['bean_temp', 'environment_temp', 'ror']
+# Points kept in each chart series unless asked for otherwise
+CHART_POINTS = 500
+PHASES = [('drying', 'Charge', 'Dry End'),
+          ('maillard', 'Dry End', 'First Crack'),
+          ('development', 'First Crack', 'Drop')]
+
+
+def _event(event):
+    """Get a marked event with its name normalized.
+
+    :returns: dict
+    """
+    config = event.get('config', dict())
+    return {'event': ALIASES.get(event['event'], event['event']),
+            'time': event['time'],
+            'bean_temp': config.get('bean_temp'),
+            'environment_temp': config.get('environment_temp')}
+
+
+def lttb(x, y, points):
+    """Pick the points that best keep the shape of a series.
+
+    Largest-Triangle-Three-Buckets splits the series into buckets and keeps
+    the point of each bucket making the largest triangle with the point kept
+    before it and the average of the next bucket. The first and last points
+    are always kept.
+
+    :param x: Positions of the series, in increasing order
+    :type x: array
+    :param y: Values of the series
+    :type y: array
+    :param points: Most points to keep
+    :type points: int
+    :returns: array of the indices kept
+    """
+    count = len(x)
+    if points >= count or points < 3:
+        return np.arange(count)
+    edges = np.linspace(1, count - 1, points - 1).astype(int)
+    edges = np.append(edges, count)
+    kept = np.empty(points, dtype=int)
+    kept[0] = 0
+    kept[-1] = count - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        following = slice(end, edges[bucket + 2])
+        ax, ay = x[previous], y[previous]
+        area = np.abs((ax - x[following].mean()) * (y[start:end] - ay) -
+                      (ax - x[start:end]) * (y[following].mean() - ay))
+        previous = start + int(np.argmax(area))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def downsample(series, points=CHART_POINTS):
+    """Thin out a chart series of time and value pairs.
+
+    :param series: Pairs of time and value
+    :type series: list
+    :param points: Most points to keep
+    :type points: int
+    :returns: list of pairs
+    """
+    if len(series) <= points:
+        return series
+    pairs = np.asarray(series, dtype=float)
+    return pairs[lttb(pairs[:, 0], pairs[:, 1], points)].tolist()
+
+
+def chart_series(curve, points=CHART_POINTS):
+    """Get the thinned out series shown on the roast charts.
+
+    :param curve: Readings of the roast
+    :type curve: RoastCurve instance
+    :param points: Most points to keep in each series
+    :type points: int
+    :returns: dict of `s1` environment, `s2` bean, `s3` fan and `s4` heat
+    """
+    columns = {'s1': curve.environment_temp, 's2': curve.bean_temp,
+               's3': curve.main_fan * 10, 's4': curve.heater}
+    output = dict()
+    for name, values in columns.items():
+        kept = lttb(curve.time, values, points)
+        output[name] = np.column_stack((curve.time[kept],
+                                        values[kept])).tolist()
+    return output
+
+
+class CurveBuilder:
+
+    """Collect the columns of a curve from events as they go past.
+
+    :returns: CurveBuilder instance
+    """
+
+    def __init__(self):
+        """Start with empty columns."""
+        self.time = array('d')
+        self.bean_temp = array('d')
+        self.environment_temp = array('d')
+        self.main_fan = array('d')
+        self.heater = array('d')
+        self.markers = list()
+
+    def add(self, event):
+        """Add a reading or marked event in the shape it is stored in.
+
+        Readings flagged as invalid are left out.
+
+        :param event: Reading or marked event
+        :type event: dict
+        :returns: None
+        """
+        if 'event' in event:
+            self.markers.append(_event(event))
+            return None
+        config = event['config']
+        if not config.get('valid', True):
+            return None
+        self.time.append(event['time'])
+        self.bean_temp.append(config['bean_temp'])
+        self.environment_temp.append(config['environment_temp'])
+        self.main_fan.append(config.get('main_fan', 0))
+        self.heater.append(config.get('heater', 0))
+
+    def feed(self, events):
+        """Collect events while passing them on.
+
+        :param events: Readings and marked events
+        :type events: iterable
+        """
+        for event in events:
+            self.add(event)
+            yield event
+
+    def build(self):
+        """Build the curve from what has been collected.
+
+        :returns: RoastCurve instance
+        """
+        return RoastCurve(self.time, self.bean_temp, self.environment_temp,
+                          self.main_fan, self.heater, self.markers)
+
+
+class RoastCurve:
+
+    """Readings of a roast as arrays, with the events marked during it.
+
+    :param time: Minutes into the roast of each reading
+    :type time: sequence of float
+    :param bean_temp: Bean temperature of each reading
+    :type bean_temp: sequence of float
+    :param environment_temp: Environment temperature of each reading
+    :type environment_temp: sequence of float
+    :param main_fan: Main fan level of each reading
+    :type main_fan: sequence of int
+    :param heater: Heater level of each reading
+    :type heater: sequence of int
+    :param markers: Marked events with their time and temperatures
+    :type markers: list
+    :returns: RoastCurve instance
+    """
+
+    def __init__(self, time, bean_temp, environment_temp, main_fan, heater,
+                 markers):
+        """Wrap the columns in arrays, without copying where possible."""
+        self.time = np.asarray(time, dtype=float)
+        self.bean_temp = np.asarray(bean_temp, dtype=float)
+        self.environment_temp = np.asarray(environment_temp, dtype=float)
+        self.main_fan = np.asarray(main_fan, dtype=float)
+        self.heater = np.asarray(heater, dtype=float)
+        self.markers = markers
+
+    @classmethod
+    def from_events(cls, events):
+        """Build a curve from readings and events in their stored shape.
+
+        :param events: Readings and marked events
+        :type events: iterable
+        :returns: RoastCurve instance
+        """
+        builder = CurveBuilder()
+        for event in events:
+            builder.add(event)
+        return builder.build()
+
+    @classmethod
+    def from_store(cls, store):
+        """Build a curve straight from the columns of a sample store.
+
+        :param store: Store holding the readings of a roast
+        :type store: SampleStore instance
+        :returns: RoastCurve instance
+        """
+        bit = SampleStore.FLAGS.index('valid')
+        valid = (np.frombuffer(store.flags, dtype=np.uint8) >> bit) & 1 == 1
+        columns = [np.frombuffer(c, dtype=c_type)[valid] for c, c_type in [
+            (store.time, float), (store.bean_temp, float),
+            (store.environment_temp, float), (store.main_fan, np.uint8),
+            (store.heater, np.uint8)]]
+        markers = [_event(e) for e in store.markers()]
+        return cls(*columns, markers=markers)
+
+    def __len__(self):
+        return len(self.time)
+
+    def marker(self, name):
+        """Get the first event marked with a name.
+
+        :param name: Name of the event, like `First Crack`
+        :type name: str
+        :returns: dict or None if it was never marked
+        """
+        for marker in self.markers:
+            if marker['event'] == name:
+                return marker
+        return None
+
+    def _start(self):
+        """Get the minute the roast began, at charge if it was marked.
+
+        :returns: float
+        """
+        charge = self.marker('Charge')
+        if charge:
+            return charge['time']
+        return float(self.time[0]) if len(self) else 0.0
+
+    def turning_point(self):
+        """Get the minute the bean temperature bottomed out after charge.
+
+        The marked event is used when there is one. Otherwise it is the
+        lowest bean temperature before first crack, or in the first half of
+        the roast without one.
+
+        :returns: float
+        """
+        marked = self.marker('Turning Point')
+        if marked:
+            return marked['time']
+        if not len(self):
+            return 0.0
+        first_crack = self.marker('First Crack')
+        end = first_crack['time'] if first_crack else self.time[-1] / 2
+        inside = (self.time >= self._start()) & (self.time <= end)
+        if not inside.any():
+            return self._start()
+        index = np.flatnonzero(inside)[np.argmin(self.bean_temp[inside])]
+        return float(self.time[index])
+
+    def anchor(self, align):
+        """Get the minute the curve is lined up on when comparing roasts.
+
+        :param align: One of `ALIGNMENTS`
+        :type align: str
+        :returns: float
+        """
+        if align == 'turning_point':
+            return self.turning_point()
+        return self._start()
+
+    def column(self, key):
+        """Get one of the `SERIES` of the curve.
+
+        :param key: Name of the series
+        :type key: str
+        :returns: array
+        """
+        if key == 'ror':
+            return self.ror(ROR_WINDOWS[1])
+        return getattr(self, key)
+
+    def ror(self, window=30, key='bean_temp'):
+        """Get the rate of rise at every reading.
+
+        Each rate is the change since the last reading at least `window`
+        seconds earlier, or since the first reading early in the roast.
+
+        :param window: Seconds the rate is measured over
+        :type window: int or float
+        :param key: Temperature to use, `bean_temp` or `environment_temp`
+        :type key: str
+        :returns: array of degrees per minute
+        """
+        values = getattr(self, key)
+        lag = np.searchsorted(self.time, self.time - window / 60.0,
+                              side='right') - 1
+        lag = np.clip(lag, 0, None)
+        elapsed = self.time - self.time[lag]
+        rise = values - values[lag]
+        rates = np.zeros(len(self))
+        np.divide(rise, elapsed, out=rates, where=elapsed > 0)
+        return rates
+
+    def rors(self, windows=ROR_WINDOWS, key='bean_temp'):
+        """Get the rate of rise over several windows.
+
+        :param windows: Seconds each rate is measured over
+        :type windows: list
+        :param key: Temperature to use, `bean_temp` or `environment_temp`
+        :type key: str
+        :returns: dict of window to array of degrees per minute
+        """
+        return {w: self.ror(w, key) for w in windows}
+
+    def phases(self):
+        """Get the length of each phase and its share of the roast.
+
+        Phases whose bounding events were never marked are None.
+
+        :returns: dict of phase name to a dict or None
+        """
+        drop = self.marker('Drop')
+        start = self._start()
+        total = drop['time'] - start if drop else None
+        phases = dict()
+        for name, first, last in PHASES:
+            begin = self.marker(first)
+            end = self.marker(last)
+            if first == 'Charge':
+                begin = {'time': start}
+            if not begin or not end or end['time'] < begin['time']:
+                phases[name] = None
+                continue
+            duration = end['time'] - begin['time']
+            ratio = duration / total if total else None
+            phases[name] = {'start': begin['time'], 'end': end['time'],
+                            'duration': duration, 'ratio': ratio}
+        return phases
+
+    def development_ratio(self):
+        """Get the share of the roast spent after first crack.
+
+        :returns: float or None without first crack and drop
+        """
+        development = self.phases()['development']
+        if not development:
+            return None
+        return development['ratio']
+
+    def area_under_curve(self, key='bean_temp', base=0.0):
+        """Get the area between a temperature curve and a base line.
+
+        Only the part of the curve above the base, between charge and drop
+        when they were marked, is counted.
+
+        :param key: Temperature to use, `bean_temp` or `environment_temp`
+        :type key: str
+        :param base: Temperature the area is measured from
+        :type base: float
+        :returns: float in degree minutes
+        """
+        drop = self.marker('Drop')
+        end = drop['time'] if drop else np.inf
+        inside = (self.time >= self._start()) & (self.time <= end)
+        time = self.time[inside]
+        values = np.clip(getattr(self, key)[inside] - base, 0, None)
+        if len(time) < 2:
+            return 0.0
+        return float(np.sum((values[1:] + values[:-1]) / 2 * np.diff(time)))
+
+    def aggregates(self, seconds=60, key='bean_temp'):
+        """Summarize a temperature over fixed periods of the roast.
+
+        :param seconds: Length of each period
+        :type seconds: int
+        :param key: Temperature to use, `bean_temp` or `environment_temp`
+        :type key: str
+        :returns: dict of arrays with one value per period that has readings
+        """
+        values = getattr(self, key)
+        if not len(self):
+            empty = np.zeros(0)
+            return {k: empty for k in ['period', 'start', 'end', 'first',
+                                       'last', 'min', 'max', 'mean', 'delta',
+                                       'percent']}
+        periods = (self.time * 60 // seconds).astype(int)
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        ends = np.r_[starts[1:], len(self)] - 1
+        counts = ends - starts + 1
+        first = values[starts]
+        last = values[ends]
+        delta = last - first
+        percent = np.zeros(len(starts))
+        np.divide(delta * 100, first, out=percent, where=first != 0)
+        return {'period': periods[starts], 'start': self.time[starts],
+                'end': self.time[ends], 'first': first, 'last': last,
+                'min': np.minimum.reduceat(values, starts),
+                'max': np.maximum.reduceat(values, starts),
+                'mean': np.add.reduceat(values, starts) / counts,
+                'delta': delta, 'percent': percent}
+
+    def summary(self, windows=ROR_WINDOWS):
+        """Get the headline numbers of the roast.
+
+        :param windows: Seconds each rate of rise is measured over
+        :type windows: list
+        :returns: dict of plain values ready to be stored or encoded
+        """
+        first_crack = self.marker('First Crack')
+        ror = dict()
+        for window, rates in self.rors(windows).items():
+            entry = {'max': float(rates.max()) if len(self) else None,
+                     'first_crack': None}
+            if first_crack and len(self):
+                index = np.searchsorted(self.time, first_crack['time'])
+                index = min(index, len(self) - 1)
+                entry['first_crack'] = float(rates[index])
+            ror[str(window)] = entry
+        return {'duration': float(self.time[-1]) if len(self) else 0.0,
+                'phases': self.phases(),
+                'development_ratio': self.development_ratio(),
+                'area_under_curve': self.area_under_curve(),
+                'ror': ror,
+                'events': {m['event']: m for m in reversed(self.markers)}}
+
+
+def align_curves(curves, align='charge', step=5, keys=SERIES, points=None):
+    """Resample curves onto one grid of times since a shared event.
+
+    The curves are laid end to end, far enough apart not to overlap, so every
+    series of every curve is resampled with a single interpolation. Grid
+    points before a curve starts or after it ends are NaN.
+
+    :param curves: Curves to compare
+    :type curves: list of RoastCurve
+    :param align: One of `ALIGNMENTS`, the event put at minute zero
+    :type align: str
+    :param step: Seconds between grid points
+    :type step: int or float
+    :param keys: Names of the `SERIES` to resample
+    :type keys: list
+    :param points: Most grid points, widening the step if needed
+    :type points: int
+    :returns: tuple of the grid in minutes, the minute each curve was moved
+              back by and a dict of series name to an array with a row per
+              curve
+    """
+    curves = list(curves)
+    offsets = np.array([c.anchor(align) for c in curves])
+    filled = np.array([len(c) > 0 for c in curves], dtype=bool)
+    starts = np.array([c.time[0] if len(c) else np.nan for c in curves])
+    ends = np.array([c.time[-1] if len(c) else np.nan for c in curves])
+    starts -= offsets
+    ends -= offsets
+    if not filled.any():
+        return np.zeros(0), offsets, {k: np.zeros((len(curves), 0))
+                                      for k in keys}
+    spacing = step / 60.0
+    if points and points > 2:
+        # One step spare since the grid starts on a whole step
+        span = np.nanmax(ends) - np.nanmin(starts)
+        spacing = max(spacing, span / (points - 2))
+    first = np.floor(np.nanmin(starts) / spacing) * spacing
+    grid = np.arange(first, np.nanmax(ends) + spacing, spacing)
+    # Far enough apart that neighbouring curves never overlap
+    gap = np.nanmax(ends) - np.nanmin(starts) + 2 * spacing + 1
+    shifts = np.arange(len(curves)) * gap - offsets
+    times = np.concatenate([c.time + shift
+                            for c, shift, f in zip(curves, shifts, filled)
+                            if f])
+    points = grid[np.newaxis, :] + (np.arange(len(curves)) * gap)[:, None]
+    outside = ((grid[np.newaxis, :] < starts[:, None]) |
+               (grid[np.newaxis, :] > ends[:, None]) | ~filled[:, None])
+    resampled = dict()
+    for key in keys:
+        values = np.concatenate([c.column(key)
+                                 for c, f in zip(curves, filled) if f])
+        rows = np.interp(points.ravel(), times, values).reshape(points.shape)
+        rows[outside] = np.nan
+        resampled[key] = rows
+    return grid, offsets, resampled
@@ -0,0 +1,405 @@
+"""
+Spot roast events from the live readings as they arrive.
+
+Every reading updates one set of incremental features, such as the short
+bean temperature slope and a rolling history of the rate of rise, and each
+detector only looks at those features instead of keeping a window of its
+own. Detectors are registered by name and run in order on every reading,
+within a fixed time budget so a slow detector can not hold up the roaster
+loop. Detectors left over when the budget runs out go first next time.
+Each detector fires once per roast and keeps its own timing counters.
+
+Events an operator also marks by hand, like dry end, are only suggested
+under a name of their own, so a roast never holds two of the same event.
+Once the operator has marked it, the detector stops looking.
+
+Temperatures are in degrees Fahrenheit, as read from the roaster, and rates
+of rise in degrees per minute.
+"""
+import time
+
+from collections import deque
+
+from .estimators import RollingSlope
+
+# Seconds of rate of rise history kept for the detectors
+HISTORY = 60
+# Seconds each reading may spend in the detectors
+BUDGET = 0.002
+# Degrees per minute the bean slope has to pass to count as falling or rising
+EPSILON = 1.0
+
+
+class Features:
+
+    """Incremental features of the readings so far, shared by detectors.
+
+    :param slope_window: Readings in the short bean temperature slope
+    :type slope_window: int
+    :param history: Seconds of rate of rise history to keep
+    :type history: int or float
+    :returns: Features instance
+    """
+
+    def __init__(self, slope_window=5, history=HISTORY):
+        """Start with no readings."""
+        self.slope_window = slope_window
+        self.history = history
+        self.reset()
+
+    def reset(self):
+        """Forget every reading and marked event.
+
+        :returns: None
+        """
+        self.time = None
+        self.bean_temp = None
+        self.environment_temp = None
+        self.bean_slope = 0.0
+        self.ror = 0.0
+        self.readings = 0
+        self.marked = dict()
+        self._slope = RollingSlope(self.slope_window)
+        self._rors = deque()
+
+    def set_slope_window(self, window):
+        """Change how many readings the bean temperature slope spans.
+
+        :param window: Readings in the slope
+        :type window: int
+        :returns: None
+        """
+        self.slope_window = window
+        self._slope = RollingSlope(window)
+
+    def update(self, config, rates):
+        """Add a reading.
+
+        :param config: Reading including its time and temperatures
+        :type config: dict
+        :param rates: Rates of rise of the reading, by temperature
+        :type rates: dict
+        :returns: None
+        """
+        self.time = config['time']
+        self.bean_temp = config['bean_temp']
+        self.environment_temp = config['environment_temp']
+        self.bean_slope = self._slope.update(self.time, self.bean_temp)
+        self.ror = rates.get('bean_temp', 0.0)
+        self.readings += 1
+        self._rors.append((self.time, self.ror))
+        oldest = self.time - self.history / 60.0
+        while self._rors[0][0] < oldest:
+            self._rors.popleft()
+
+    def ror_change(self, seconds):
+        """Get how much the rate of rise moved over the last few seconds.
+
+        :param seconds: How far back to compare with, up to `history`
+        :type seconds: int or float
+        :returns: float
+        """
+        since = self.time - seconds / 60.0
+        for moment, ror in self._rors:
+            if moment >= since:
+                return self.ror - ror
+        return 0.0
+
+
+class Detector:
+
+    """Spot one kind of roast event from the shared features.
+
+    :returns: Detector instance
+    """
+
+    # Name the detector is registered under
+    name = None
+    # Event marked on the roast when it fires
+    event = None
+    # Roast property set to the reading before the one it fired on
+    field = None
+    # Event that has to be marked before it starts looking
+    after = None
+    # Event marked by hand that makes looking for this one pointless
+    manual = None
+    # Activity sent to the UI when it fires, if the frames do not carry it
+    activity = None
+
+    def __init__(self):
+        """Start the timing counters."""
+        self._stats = {'calls': 0, 'fired': 0, 'total': 0.0, 'max': 0.0}
+
+    def reset(self):
+        """Forget anything kept from the previous roast.
+
+        :returns: None
+        """
+        pass
+
+    def pending(self, features):
+        """Tell whether the detector still has to look at readings.
+
+        :param features: Features of the readings so far
+        :type features: Features instance
+        :returns: bool
+        """
+        if self.event in features.marked or self.manual in features.marked:
+            return False
+        return self.after is None or self.after in features.marked
+
+    def detect(self, features):
+        """Tell whether the event happened at the latest reading.
+
+        Subclasses override this, the base detector never fires.
+
+        :param features: Features of the readings so far
+        :type features: Features instance
+        :returns: bool
+        """
+        return False
+
+    def run(self, features):
+        """Look at the latest reading and count the time it took.
+
+        :param features: Features of the readings so far
+        :type features: Features instance
+        :returns: bool
+        """
+        start = time.perf_counter()
+        fired = bool(self.detect(features))
+        elapsed = time.perf_counter() - start
+        self._stats['calls'] += 1
+        self._stats['total'] += elapsed
+        self._stats['max'] = max(self._stats['max'], elapsed)
+        if fired:
+            self._stats['fired'] += 1
+        return fired
+
+    def get_stats(self):
+        """Get the call, fire and timing counters.
+
+        :returns: dict
+        """
+        stats = dict(self._stats)
+        total = stats.pop('total')
+        stats['mean'] = total / stats['calls'] if stats['calls'] else 0.0
+        return stats
+
+
+class ChargeDetector(Detector):
+
+    """Beans were charged once the bean temperature starts to fall."""
+
+    name = 'charge'
+    event = 'Charge'
+    field = 'charge'
+
+    def detect(self, features):
+        return features.bean_slope < -EPSILON
+
+
+class TurningPointDetector(Detector):
+
+    """Beans turned once the bean temperature rises again after charge."""
+
+    name = 'turning_point'
+    event = 'Turning Point'
+    field = 'turning_point'
+    after = 'Charge'
+
+    def detect(self, features):
+        return features.bean_slope > EPSILON
+
+
+class DryEndDetector(Detector):
+
+    """Drying ended once the beans climb past a temperature after turning.
+
+    The beans have to be seen below the temperature first, so a roaster
+    that is still hot from preheating does not end drying straight away.
+    This is only a suggestion, the operator still marks dry end by hand.
+
+    :param threshold: Bean temperature drying ends at
+    :type threshold: int or float
+    :returns: DryEndDetector instance
+    """
+
+    name = 'dry_end'
+    event = 'Detected Dry End'
+    manual = 'Dry End'
+    activity = 'DRY_END'
+    after = 'Turning Point'
+    THRESHOLD = 300
+
+    def __init__(self, threshold=THRESHOLD):
+        Detector.__init__(self)
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self._below = False
+
+    def detect(self, features):
+        if features.bean_temp < self.threshold:
+            self._below = True
+            return False
+        return self._below
+
+
+class RorCrashDetector(Detector):
+
+    """The rate of rise crashed when it drops sharply after first crack.
+
+    :param drop: Fall in degrees per minute that counts as a crash
+    :type drop: int or float
+    :param seconds: Seconds the fall has to happen within
+    :type seconds: int or float
+    :returns: RorCrashDetector instance
+    """
+
+    name = 'ror_crash'
+    event = 'RoR Crash'
+    activity = 'ROR_CRASH'
+    after = 'First Crack'
+    DROP = 10
+    SECONDS = 30
+
+    def __init__(self, drop=DROP, seconds=SECONDS):
+        Detector.__init__(self)
+        self.drop = drop
+        self.seconds = seconds
+
+    def detect(self, features):
+        return features.ror_change(self.seconds) <= -self.drop
+
+
+class FlickDetector(Detector):
+
+    """The rate of rise flicked when it climbs again late in the roast.
+
+    After first crack the rate of rise should keep falling. A flick is a
+    climb of more than `rise` above the lowest rate seen since then.
+
+    :param rise: Climb in degrees per minute that counts as a flick
+    :type rise: int or float
+    :returns: FlickDetector instance
+    """
+
+    name = 'flick'
+    event = 'Flick'
+    activity = 'FLICK'
+    after = 'First Crack'
+    RISE = 3
+
+    def __init__(self, rise=RISE):
+        Detector.__init__(self)
+        self.rise = rise
+        self.reset()
+
+    def reset(self):
+        self._lowest = None
+
+    def detect(self, features):
+        if self._lowest is None or features.ror < self._lowest:
+            self._lowest = features.ror
+            return False
+        return features.ror - self._lowest > self.rise
+
+
+# Detectors by the name they are configured with
+DETECTORS = {d.name: d for d in [ChargeDetector, TurningPointDetector,
+                                 DryEndDetector, RorCrashDetector,
+                                 FlickDetector]}
+DEFAULT_DETECTORS = ['charge', 'turning_point', 'dry_end', 'ror_crash',
+                     'flick']
+
+
+class DetectorPipeline:
+
+    """Run registered detectors over each reading within a time budget.
+
+    :param names: Names of the `DETECTORS` to run, in order
+    :type names: list
+    :param budget: Seconds each reading may spend in the detectors
+    :type budget: float
+    :param slope_window: Readings in the short bean temperature slope
+    :type slope_window: int
+    :returns: DetectorPipeline instance
+    """
+
+    def __init__(self, names=DEFAULT_DETECTORS, budget=BUDGET,
+                 slope_window=5):
+        """Create the detectors and the features they share."""
+        unknown = [n for n in names if n not in DETECTORS]
+        if unknown:
+            raise ValueError("Unknown detectors: %s" % ', '.join(unknown))
+        self.budget = budget
+        self.features = Features(slope_window)
+        self.detectors = [DETECTORS[n]() for n in names]
+        self._next = 0
+        self._stats = {'readings': 0, 'overruns': 0, 'deferred': 0}
+
+    def reset(self):
+        """Forget the roast so far, keeping the counters.
+
+        :returns: None
+        """
+        self.features.reset()
+        for detector in self.detectors:
+            detector.reset()
+        self._next = 0
+
+    def marked(self, event, moment):
+        """Tell the detectors an event was marked, by them or by hand.
+
+        :param event: Name of the event
+        :type event: str
+        :param moment: Minute of the roast it was marked at
+        :type moment: float
+        :returns: None
+        """
+        self.features.marked.setdefault(event, moment)
+
+    def update(self, config, rates):
+        """Add a reading and run the detectors still looking.
+
+        :param config: Reading including its time and temperatures
+        :type config: dict
+        :param rates: Rates of rise of the reading, by temperature
+        :type rates: dict
+        :returns: list of the detectors that fired
+        """
+        start = time.perf_counter()
+        features = self.features
+        features.update(config, rates)
+        self._stats['readings'] += 1
+        order = self.detectors[self._next:] + self.detectors[:self._next]
+        self._next = 0
+        fired = list()
+        ran = False
+        for idx, detector in enumerate(order):
+            # At least one detector runs so none of them can starve
+            if ran and time.perf_counter() - start > self.budget:
+                # Pick up where this reading left off on the next one
+                self._next = self.detectors.index(detector)
+                self._stats['overruns'] += 1
+                self._stats['deferred'] += len(order) - idx
+                break
+            if not detector.pending(features):
+                continue
+            ran = True
+            if detector.run(features):
+                self.marked(detector.event, features.time)
+                fired.append(detector)
+        return fired
+
+    def get_stats(self):
+        """Get the pipeline counters and those of every detector.
+
+        :returns: dict
+        """
+        stats = dict(self._stats)
+        stats['budget'] = self.budget
+        stats['detectors'] = {d.name: d.get_stats() for d in self.detectors}
+        return stats
@@ -0,0 +1,304 @@
+"""
+Emulate a Hottop on a pseudo-terminal.
+
+`MockProcess` hands pre-decoded readings straight to the Hottop, so the serial
+reads, frame decoding, validation and configuration writes of the real
+`ControlProcess` never run without a roaster attached. `HottopEmulator` opens
+a pseudo-terminal and speaks the roaster's 36-byte protocol on it instead:
+status frames go out on a schedule, configuration frames written by the host
+are decoded and echoed back in the device state, and jitter, short reads,
+line noise and corrupted frames can be mixed in to exercise the decoder.
+
+Readings come from either a recorded roast log or a small thermal model, and
+the emulator can run faster than real time by shrinking the wall-clock time
+between frames while stepping the roast forward by the full interval.
+"""
+import json
+import os
+import pty
+import random
+import select
+import time
+import tty
+
+from threading import Thread, Event
+
+from .frames import FrameDecoder, encode_frame
+from .scheduler import TickScheduler
+
+CONTROLS = ['heater', 'fan', 'main_fan', 'solenoid', 'drum_motor',
+            'cooling_motor']
+
+
+class LogReplay:
+
+    """Replay the temperatures recorded in a roast log.
+
+    Temperatures are interpolated at the emulator's own clock, so a log
+    recorded every half second can be replayed at any sampling interval.
+
+    :param path: Location of a saved roast log
+    :type path: str
+    :param loop: Start over once the end of the log is reached
+    :type loop: bool
+    :returns: LogReplay instance
+    """
+
+    def __init__(self, path, loop=True):
+        """Load the recorded readings."""
+        with open(path) as handle:
+            roast = json.load(handle)
+        readings = [e for e in roast['events'] if 'event' not in e]
+        self._times = [e['time'] * 60.0 for e in readings]
+        self._temps = [(e['config']['environment_temp'],
+                        e['config']['bean_temp']) for e in readings]
+        self.loop = loop
+        self.controls = {k: readings[0]['config'].get(k, 0)
+                         for k in CONTROLS}
+        self._index = 0
+        self._offset = 0.0
+
+    def step(self, t, controls):
+        """Get the temperatures recorded at a point in time.
+
+        :param t: Seconds since the emulator started
+        :type t: float
+        :param controls: Current device settings, unused when replaying
+        :type controls: dict
+        :returns: tuple of environment and bean temperature
+        """
+        t -= self._offset
+        if t > self._times[-1] and self.loop:
+            self._offset += self._times[-1]
+            self._index = 0
+            t -= self._times[-1]
+        while (self._index < len(self._times) - 1 and
+                self._times[self._index + 1] <= t):
+            self._index += 1
+        if self._index == len(self._times) - 1:
+            return self._temps[-1]
+        t0, t1 = self._times[self._index], self._times[self._index + 1]
+        share = min(max((t - t0) / (t1 - t0), 0.0), 1.0) if t1 > t0 else 0.0
+        low, high = self._temps[self._index], self._temps[self._index + 1]
+        return tuple([a + (b - a) * share for a, b in zip(low, high)])
+
+
+class ThermalModel:
+
+    """Two-body thermal model of the drum air and the beans.
+
+    The air heats towards a target set by the heater and cooled by the
+    exhaust fan, and the beans follow the air. Beans are charged into the
+    drum at `charge_at` seconds, before which the bean probe reads the air.
+
+    :param ambient: Room temperature in Fahrenheit
+    :type ambient: float
+    :param charge_at: Seconds before the beans are charged, or None
+    :type charge_at: float
+    :returns: ThermalModel instance
+    """
+
+    HEAT_GAIN = 420.0
+    FAN_LOSS = 8.0
+    AIR_LAG = 45.0
+    BEAN_LAG = 150.0
+    COOLING_LAG = 20.0
+
+    def __init__(self, ambient=70.0, charge_at=60.0):
+        """Start with everything at room temperature."""
+        self.ambient = ambient
+        self.charge_at = charge_at
+        self.controls = {'heater': 100, 'fan': 0, 'main_fan': 0,
+                         'solenoid': 0, 'drum_motor': 1, 'cooling_motor': 0}
+        self._air = ambient
+        self._beans = None
+        self._last = 0.0
+
+    def step(self, t, controls):
+        """Advance the model to a point in time.
+
+        :param t: Seconds since the emulator started
+        :type t: float
+        :param controls: Current device settings
+        :type controls: dict
+        :returns: tuple of environment and bean temperature
+        """
+        dt, self._last = t - self._last, t
+        target = (self.ambient + controls['heater'] / 100.0 * self.HEAT_GAIN -
+                  controls['main_fan'] * self.FAN_LOSS)
+        self._air += (target - self._air) * min(dt / self.AIR_LAG, 1.0)
+        if self._beans is None:
+            if self.charge_at is None or t < self.charge_at:
+                return self._air, self._air
+            self._beans = self.ambient
+        if controls['solenoid'] and controls['cooling_motor']:
+            # Beans have been dropped into the cooling tray
+            lag, towards = self.COOLING_LAG, self.ambient
+        else:
+            lag, towards = self.BEAN_LAG, self._air
+        self._beans += (towards - self._beans) * min(dt / lag, 1.0)
+        return self._air, self._beans
+
+
+class HottopEmulator(Thread):
+
+    """Serve Hottop status frames on a pseudo-terminal.
+
+    Open `port` with the same serial settings used for a real roaster. The
+    wall-clock time between frames is `interval / speed` while the source is
+    stepped by the full interval, so a speed of ten runs a twelve minute roast
+    in a little over a minute.
+
+    :param source: Where readings come from
+    :type source: LogReplay or ThermalModel instance
+    :param interval: Seconds of roast time between frames
+    :type interval: int or float
+    :param speed: How many times faster than real time to run
+    :type speed: int or float
+    :param jitter: Largest random delay before a frame, as share of a tick
+    :type jitter: float
+    :param short_reads: Chance a frame is written in two pieces
+    :type short_reads: float
+    :param corrupt: Chance a byte of a frame is flipped
+    :type corrupt: float
+    :param noise: Chance of stray bytes on the line before a frame
+    :type noise: float
+    :param seed: Seed for the random faults
+    :type seed: int
+    :returns: HottopEmulator instance
+    """
+
+    SENSOR_NOISE = 0.5
+
+    def __init__(self, source, interval=0.5, speed=1.0, jitter=0.0,
+                 short_reads=0.0, corrupt=0.0, noise=0.0, seed=None):
+        """Open the pseudo-terminal without starting to send frames."""
+        Thread.__init__(self, name="hottop-emulator")
+        self.daemon = True
+        self._source = source
+        self.interval = interval
+        self.speed = speed
+        self.jitter = jitter
+        self.short_reads = short_reads
+        self.corrupt = corrupt
+        self.noise = noise
+        self._random = random.Random(seed)
+        self._controls = dict(source.controls)
+        self._decoder = FrameDecoder()
+        self._ticker = TickScheduler(interval / float(speed))
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self._stats = {'frames': 0, 'short_reads': 0, 'corrupted': 0,
+                       'noise_bytes': 0, 'overflows': 0, 'commands': 0}
+        self.exit = Event()
+
+    def _receive(self):
+        """Decode configuration frames written by the host.
+
+        :returns: None
+        """
+        while select.select([self._master], [], [], 0)[0]:
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                # Nobody has the port open
+                return None
+            if not data:
+                return None
+            for command in self._decoder.feed(data):
+                self._stats['commands'] += 1
+                self._controls.update({k: command[k] for k in CONTROLS})
+
+    def _write(self, data):
+        """Write bytes to the host, dropping them if nobody is reading.
+
+        :param data: Bytes to write
+        :type data: bytes
+        :returns: None
+        """
+        try:
+            os.write(self._master, data)
+        except (BlockingIOError, OSError):
+            self._stats['overflows'] += 1
+
+    def _transmit(self, frame):
+        """Send a frame with whatever faults have been asked for.
+
+        :param frame: Encoded status frame
+        :type frame: bytes
+        :returns: None
+        """
+        rand = self._random.random
+        if rand() < self.noise:
+            stray = bytes([self._random.randrange(256)
+                           for _ in range(self._random.randint(1, 8))])
+            self._stats['noise_bytes'] += len(stray)
+            self._write(stray)
+        if rand() < self.corrupt:
+            frame = bytearray(frame)
+            frame[self._random.randrange(2, len(frame))] ^= 0xFF
+            frame = bytes(frame)
+            self._stats['corrupted'] += 1
+        if rand() < self.short_reads:
+            split = self._random.randrange(1, len(frame))
+            self._write(frame[:split])
+            time.sleep(self._ticker.interval / 10.0)
+            self._write(frame[split:])
+            self._stats['short_reads'] += 1
+        else:
+            self._write(frame)
+        self._stats['frames'] += 1
+
+    def reading(self, t):
+        """Build the reading the roaster reports at a point in roast time.
+
+        :param t: Seconds since the emulator started
+        :type t: float
+        :returns: dict
+        """
+        environment, beans = self._source.step(t, self._controls)
+        gauss = self._random.gauss
+        reading = dict(self._controls)
+        reading['environment_temp'] = environment + gauss(0, self.SENSOR_NOISE)
+        reading['bean_temp'] = beans + gauss(0, self.SENSOR_NOISE)
+        reading['chaff_tray'] = 1
+        return reading
+
+    def run(self):
+        """Send frames until the exit signal has been set.
+
+        :returns: None
+        """
+        self._ticker.start()
+        t = 0.0
+        while not self.exit.is_set():
+            self._receive()
+            if self.jitter:
+                delay = self._random.uniform(0, self.jitter)
+                time.sleep(delay * self._ticker.interval)
+            self._transmit(encode_frame(self.reading(t)))
+            t += self.interval
+            self._ticker.wait()
+
+    def get_stats(self):
+        """Get the counters for frames sent and commands received.
+
+        :returns: dict
+        """
+        stats = dict(self._stats)
+        stats['controls'] = dict(self._controls)
+        stats['ticks'] = self._ticker.stats()
+        return stats
+
+    def shutdown(self):
+        """Stop sending frames and close the pseudo-terminal.
+
+        :returns: None
+        """
+        self.exit.set()
+        if self.is_alive():
+            self.join()
+        os.close(self._master)
+        os.close(self._slave)
@@ -0,0 +1,297 @@
+"""
+Incremental estimators used while the roast is running.
+
+These are updated once per sample from inside the control callback, so every
+estimator only looks at its own window and the work per update does not grow
+with how long the roast has gone on for.
+"""
+from collections import deque
+
+
+class RollingSlope:
+
+    """Least-squares slope over a rolling window of samples.
+
+    The means of x and y and the centered sums of squares and products are
+    kept for the samples inside the window, updated the way Welford's method
+    does. When the window is full, the oldest sample is taken back out so
+    each update is O(1). Centering keeps the sums small however large the
+    temperatures are. Taking samples back out still leaves rounding noise,
+    so the run of equal values at the end of the window is counted as well
+    and a flat window gives a slope of exactly 0.0, never a tiny one either
+    side of it.
+
+    :param window: Number of samples used in the regression
+    :type window: int
+    :returns: RollingSlope instance
+    """
+
+    def __init__(self, window=5):
+        """Start with an empty window."""
+        if window < 2:
+            raise ValueError("Window must hold at least 2 samples")
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        """Clear all samples from the window.
+
+        :returns: None
+        """
+        self._points = deque(list(), self.window)
+        self._mx = 0.0
+        self._my = 0.0
+        self._cxx = 0.0
+        self._cxy = 0.0
+        self._flat = 0
+
+    def __len__(self):
+        return len(self._points)
+
+    def _add(self, x, y):
+        """Fold a sample into the means and centered sums.
+
+        :returns: None
+        """
+        n = len(self._points) + 1
+        dx = x - self._mx
+        self._mx += dx / n
+        self._my += (y - self._my) / n
+        self._cxx += dx * (x - self._mx)
+        self._cxy += dx * (y - self._my)
+
+    def _remove(self, x, y):
+        """Take a sample back out of the means and centered sums.
+
+        :returns: None
+        """
+        n = len(self._points) - 1
+        mx, my = self._mx, self._my
+        self._mx -= (x - mx) / n
+        self._my -= (y - my) / n
+        self._cxx -= (x - self._mx) * (x - mx)
+        self._cxy -= (x - self._mx) * (y - my)
+
+    def update(self, x, y):
+        """Add a sample to the window and return the new slope.
+
+        :param x: Sample position, usually the roast time
+        :type x: float
+        :param y: Sample value, usually a temperature
+        :type y: float
+        :returns: float
+        """
+        if len(self._points) == self.window:
+            self._remove(*self._points[0])
+            self._points.popleft()
+        if self._points and self._points[-1][1] == y:
+            self._flat += 1
+        else:
+            self._flat = 1
+        self._add(x, y)
+        self._points.append((x, y))
+        return self.slope()
+
+    def slope(self):
+        """Get the slope of the samples currently in the window.
+
+        Fewer than two samples, or samples that all share the same position,
+        do not describe a line, so a flat slope of 0.0 is returned instead.
+        The same goes for samples that all share the same value.
+
+        :returns: float
+        """
+        n = len(self._points)
+        if n < 2 or self._flat >= n or self._cxx <= 0:
+            return 0.0
+        return self._cxy / self._cxx
+
+
+class EmaSlope:
+
+    """Exponential moving average of the slope between consecutive samples.
+
+    Each update blends the slope from the previous sample into the average
+    with a weight of 2 / (window + 1), the way a moving average over
+    `window` samples would.
+
+    :param window: Number of samples the average roughly spans
+    :type window: int
+    :returns: EmaSlope instance
+    """
+
+    def __init__(self, window=5):
+        """Start with no samples."""
+        if window < 2:
+            raise ValueError("Window must hold at least 2 samples")
+        self.window = window
+        self._alpha = 2.0 / (window + 1)
+        self.reset()
+
+    def reset(self):
+        """Forget every sample.
+
+        :returns: None
+        """
+        self._last = None
+        self._slope = None
+
+    def update(self, x, y):
+        """Add a sample and return the new average slope.
+
+        :param x: Sample position, usually the roast time
+        :type x: float
+        :param y: Sample value, usually a temperature
+        :type y: float
+        :returns: float
+        """
+        if self._last is not None and x > self._last[0]:
+            slope = (y - self._last[1]) / (x - self._last[0])
+            if self._slope is None:
+                self._slope = slope
+            else:
+                self._slope += self._alpha * (slope - self._slope)
+        self._last = (x, y)
+        return self.slope()
+
+    def slope(self):
+        """Get the average slope, 0.0 until there are two samples.
+
+        :returns: float
+        """
+        return self._slope if self._slope is not None else 0.0
+
+
+class PolynomialSlope:
+
+    """Slope at the newest sample of a quadratic fit over a rolling window.
+
+    This is a Savitzky-Golay derivative evaluated at the end of the window,
+    so it follows bends in the curve more closely than a straight line fit.
+    Samples do not need to be evenly spaced. Running sums of x to the fourth
+    power cancel out badly once x is far from zero, so on every update the
+    sums are worked out again with x measured back from the newest sample
+    and scaled by the span of the window, and y measured from the newest
+    value. That is O(window), but it stays accurate however long the roast.
+
+    :param window: Number of samples used in the fit
+    :type window: int
+    :returns: PolynomialSlope instance
+    """
+
+    def __init__(self, window=7):
+        """Start with an empty window."""
+        if window < 3:
+            raise ValueError("Window must hold at least 3 samples")
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        """Clear all samples from the window.
+
+        :returns: None
+        """
+        self._points = deque(list(), self.window)
+
+    def __len__(self):
+        return len(self._points)
+
+    def update(self, x, y):
+        """Add a sample to the window and return the new slope.
+
+        :param x: Sample position, usually the roast time
+        :type x: float
+        :param y: Sample value, usually a temperature
+        :type y: float
+        :returns: float
+        """
+        self._points.append((x, y))
+        return self.slope()
+
+    def slope(self):
+        """Get the slope of the fit at the newest sample.
+
+        With fewer than three samples, or samples that do not pin down a
+        curve, a flat slope of 0.0 is returned instead.
+
+        :returns: float
+        """
+        if len(self._points) < 3:
+            return 0.0
+        xn, yn = self._points[-1]
+        span = xn - self._points[0][0]
+        if span <= 0:
+            return 0.0
+        # Sums of u^0..u^4 and of v * u^0..u^2, with u in [-1, 0]
+        s0, s1, s2, s3, s4 = 0.0, 0.0, 0.0, 0.0, 0.0
+        t0, t1, t2 = 0.0, 0.0, 0.0
+        for x, y in self._points:
+            u = (x - xn) / span
+            v = y - yn
+            u2 = u * u
+            s0 += 1
+            s1 += u
+            s2 += u2
+            s3 += u2 * u
+            s4 += u2 * u2
+            t0 += v
+            t1 += v * u
+            t2 += v * u2
+        # Normal equations for v = a + b u + c u^2, solved by Cramer's rule
+        det = (s0 * (s2 * s4 - s3 * s3) - s1 * (s1 * s4 - s3 * s2) +
+               s2 * (s1 * s3 - s2 * s2))
+        if abs(det) < 1e-12:
+            return 0.0
+        b = (s0 * (t1 * s4 - s3 * t2) - t0 * (s1 * s4 - s3 * s2) +
+             s2 * (s1 * t2 - t1 * s2)) / det
+        # The newest sample sits at u = 0, so the slope there is just b
+        return b / span
+
+
+# Ways of estimating the rate of rise, by the name they are configured with
+SLOPES = {'ema': EmaSlope, 'least_squares': RollingSlope,
+          'savitzky_golay': PolynomialSlope}
+
+
+class RateOfRise:
+
+    """Rate of rise of the bean and environment temperatures.
+
+    Both temperatures are run through their own estimator on every reading.
+    Times are in minutes, so rates come out in degrees per minute.
+
+    :param method: One of `SLOPES`
+    :type method: str
+    :param window: Number of samples each estimator spans
+    :type window: int
+    :returns: RateOfRise instance
+    """
+
+    KEYS = ['bean_temp', 'environment_temp']
+
+    def __init__(self, method='least_squares', window=60):
+        """Create an estimator for each temperature."""
+        if method not in SLOPES:
+            raise ValueError("Unknown rate of rise method: %s" % method)
+        self.method = method
+        self.window = max(3, window)
+        self._estimators = {k: SLOPES[method](self.window)
+                            for k in self.KEYS}
+
+    def reset(self):
+        """Forget every reading.
+
+        :returns: None
+        """
+        for estimator in self._estimators.values():
+            estimator.reset()
+
+    def update(self, config):
+        """Add a reading and return the new rates.
+
+        :param config: Reading including its time and temperatures
+        :type config: dict
+        :returns: dict of temperature name to degrees per minute
+        """
+        return {k: e.update(config['time'], config[k])
+                for k, e in self._estimators.items()}
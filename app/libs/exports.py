@@ -0,0 +1,182 @@
+"""
+Write roast logs out a piece at a time for streamed downloads.
+
+Exports used to load every event of a roast, filter them into a new list and
+dump the whole file into one string before the response started. The
+generators here yield each event as soon as it is decoded, so a download
+holds about one event, or one roast of an archive, in memory however long it
+runs. The JSON written is the same as `json.dumps(roast, indent=4,
+sort_keys=True)` so exported logs can still be imported, plus a `summary` of
+the roast built from the readings as they stream past.
+"""
+import csv
+import json
+import zipfile
+
+from .curves import CurveBuilder
+
+INDENT = ' ' * 4
+CSV_COLUMNS = ['time', 'environment_temp', 'bean_temp', 'heater', 'fan',
+               'main_fan', 'solenoid', 'drum_motor', 'cooling_motor',
+               'chaff_tray', 'event']
+FORMATS = {'json': ('log', 'application/json'), 'csv': ('csv', 'text/csv')}
+
+
+def exported_events(events):
+    """Leave out the readings that were flagged as invalid.
+
+    :param events: Samples and marked events of the roast
+    :type events: iterable
+    """
+    for event in events:
+        if event.get('config', dict()).get('valid'):
+            yield event
+
+
+def _indented(value, depth):
+    """Encode a value as indented JSON nested at some depth.
+
+    :returns: str
+    """
+    text = json.dumps(value, indent=4, sort_keys=True)
+    return text.replace('\n', '\n' + INDENT * depth)
+
+
+def iter_json(roast, events):
+    """Yield a roast log as JSON, streaming its events.
+
+    :param roast: Roast properties without their events, where functions are
+                  called for their value once the events have been written
+    :type roast: dict
+    :param events: Samples and marked events to write under `events`
+    :type events: iterable
+    """
+    fields = dict(roast, events=None)
+    separator = '{\n'
+    for key in sorted(fields):
+        yield separator + INDENT + json.dumps(key) + ': '
+        separator = ',\n'
+        if key != 'events':
+            value = fields[key]
+            yield _indented(value() if callable(value) else value, 1)
+            continue
+        opened = False
+        for event in events:
+            yield (',\n' if opened else '[\n') + INDENT * 2
+            yield _indented(event, 2)
+            opened = True
+        yield '\n' + INDENT + ']' if opened else '[]'
+    yield '\n}'
+
+
+class _Line:
+
+    """File-like target that hands back what the csv writer writes."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(events):
+    """Yield the samples and marked events of a roast as CSV rows.
+
+    Marked events are written as a row at their reading with the name of the
+    event in the last column.
+
+    :param events: Samples and marked events of the roast
+    :type events: iterable
+    """
+    writer = csv.writer(_Line())
+    yield writer.writerow(CSV_COLUMNS)
+    for event in events:
+        config = event.get('config', dict())
+        row = [event.get('time')]
+        row += [config.get(key) for key in CSV_COLUMNS[1:-1]]
+        row.append(event.get('event', ''))
+        yield writer.writerow(row)
+
+
+def export_name(roast, extension):
+    """Name the file a roast is exported to.
+
+    :param roast: Roast document with its `_id`
+    :type roast: dict
+    :param extension: File extension without the dot
+    :type extension: str
+    :returns: str
+    """
+    coffee = (roast.get('coffee') or '').replace(',', ' ').replace(' ', '-')
+    return "{0}-{1}-{2}.{3}".format(roast.get('date'), coffee, roast['_id'],
+                                    extension)
+
+
+def iter_roast(roast, events, fmt):
+    """Yield one roast exported in a format.
+
+    :param roast: Roast document, which must include its `_id`
+    :type roast: dict
+    :param events: Samples and marked events of the roast
+    :type events: iterable
+    :param fmt: One of `FORMATS`
+    :type fmt: str
+    """
+    events = exported_events(events)
+    if fmt == 'csv':
+        return iter_csv(events)
+    # Analytics are derived again when a log is imported
+    skip = ['_id', 'events', 'analytics']
+    fields = {k: v for k, v in roast.items() if k not in skip}
+    builder = CurveBuilder()
+    # Sorts after `events`, so every reading has been collected by then
+    fields['summary'] = lambda: builder.build().summary()
+    return iter_json(fields, builder.feed(events))
+
+
+class _Spool:
+
+    """Unseekable target that collects what the zip writer writes."""
+
+    def __init__(self):
+        self._chunks = list()
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Take everything written since the last drain.
+
+        :returns: bytes
+        """
+        data = b''.join(self._chunks)
+        self._chunks = list()
+        return data
+
+
+def iter_archive(roasts, load, fmt):
+    """Yield a zip archive of many exported roasts as it is written.
+
+    :param roasts: Roast documents, each with its `_id`
+    :type roasts: iterable
+    :param load: Function giving the events of a roast document
+    :type load: function
+    :param fmt: One of `FORMATS`
+    :type fmt: str
+    """
+    extension = FORMATS[fmt][0]
+    spool = _Spool()
+    with zipfile.ZipFile(spool, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for roast in roasts:
+            name = export_name(roast, extension)
+            with archive.open(name, 'w') as entry:
+                for chunk in iter_roast(roast, load(roast), fmt):
+                    entry.write(chunk.encode('utf-8'))
+                    data = spool.drain()
+                    if data:
+                        yield data
+            yield spool.drain()
+    # The central directory is written when the archive is closed
+    yield spool.drain()
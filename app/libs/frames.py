@@ -0,0 +1,135 @@
+"""
+Decode the status frames streamed back from the Hottop roaster.
+
+The roaster writes 36-byte frames that begin with the 0xA5 0x96 header and end
+with a checksum of the preceding bytes. Serial reads do not line up with frame
+boundaries, so incoming bytes are buffered and scanned for the header. Anything
+that does not form a valid frame is dropped and counted, and decoding picks up
+again at the next header instead of reopening the port.
+"""
+import struct
+
+FRAME_SIZE = 36
+HEADER = b'\xa5\x96'
+TEMPS = struct.Struct('>HH')
+
+
+def celsius2fahrenheit(c):
+    """Convert temperatures."""
+    return (c * 1.8) + 32
+
+
+def fahrenheit2celsius(f):
+    """Convert temperatures."""
+    return (f - 32) / 1.8
+
+
+def encode_frame(settings):
+    """Build the status frame the roaster would send for a set of readings.
+
+    This is the inverse of `FrameDecoder`. Temperatures are given in
+    Fahrenheit and rounded to whole degrees Celsius on the wire, the same
+    precision the roaster reports them with.
+
+    :param settings: Readings and device states
+    :type settings: dict
+    :returns: bytes
+    """
+    frame = bytearray(FRAME_SIZE)
+    frame[0:7] = HEADER + b'\xb0\xa0\x01\x01\x24'
+    frame[10] = int(settings.get('heater', 0))
+    frame[11] = int(settings.get('fan', 0))
+    frame[12] = int(settings.get('main_fan', 0))
+    frame[16] = int(settings.get('solenoid', 0))
+    frame[17] = int(settings.get('drum_motor', 0))
+    frame[18] = int(settings.get('cooling_motor', 0))
+    frame[19] = int(settings.get('chaff_tray', 1))
+    temps = [settings.get('environment_temp', 32),
+             settings.get('bean_temp', 32)]
+    temps = [min(max(int(round(fahrenheit2celsius(t))), 0), 0xFFFF)
+             for t in temps]
+    TEMPS.pack_into(frame, 23, *temps)
+    frame[-1] = sum(frame[:FRAME_SIZE - 1]) & 0xFF
+    return bytes(frame)
+
+
+class FrameDecoder:
+
+    """Buffer serial bytes and pull complete, validated frames out of them.
+
+    :returns: FrameDecoder instance
+    """
+
+    def __init__(self):
+        """Start with an empty buffer and zeroed counters."""
+        self._buffer = bytearray()
+        self.frames = 0
+        self.dropped_bytes = 0
+        self.bad_checksums = 0
+
+    def _drop(self, count):
+        """Discard bytes from the front of the buffer.
+
+        :param count: Number of bytes to discard
+        :type count: int
+        :returns: None
+        """
+        del self._buffer[:count]
+        self.dropped_bytes += count
+
+    def _decode(self, view):
+        """Convert a validated frame into settings.
+
+        :param view: Frame bytes
+        :type view: memoryview
+        :returns: dict
+        """
+        et, bt = TEMPS.unpack_from(view, 23)
+        return {'heater': view[10], 'fan': view[11], 'main_fan': view[12],
+                'environment_temp': celsius2fahrenheit(et),
+                'bean_temp': celsius2fahrenheit(bt),
+                'solenoid': view[16], 'drum_motor': view[17],
+                'cooling_motor': view[18], 'chaff_tray': view[19]}
+
+    def feed(self, data):
+        """Add bytes read from the serial port and decode any full frames.
+
+        :param data: Raw bytes from the serial interface
+        :type data: bytes
+        :returns: list of decoded settings, oldest first
+        """
+        self._buffer.extend(data)
+        decoded = list()
+        while True:
+            start = self._buffer.find(HEADER)
+            if start == -1:
+                # Hold onto a trailing byte that could begin the next header
+                keep = 1 if self._buffer[-1:] == HEADER[:1] else 0
+                self._drop(len(self._buffer) - keep)
+                break
+            if start > 0:
+                self._drop(start)
+            if len(self._buffer) < FRAME_SIZE:
+                break
+            with memoryview(self._buffer) as view:
+                frame = view[:FRAME_SIZE]
+                valid = (sum(frame[:FRAME_SIZE - 1]) & 0xFF) == frame[-1]
+                if valid:
+                    decoded.append(self._decode(frame))
+                frame.release()
+            if not valid:
+                self.bad_checksums += 1
+                self._drop(1)
+                continue
+            del self._buffer[:FRAME_SIZE]
+            self.frames += 1
+        return decoded
+
+    def stats(self):
+        """Get the decoding counters.
+
+        :returns: dict
+        """
+        return {'frames': self.frames, 'dropped_bytes': self.dropped_bytes,
+                'bad_checksums': self.bad_checksums,
+                'buffered': len(self._buffer)}
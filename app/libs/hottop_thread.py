@@ -23,16 +23,21 @@ __email__ = "info@splitkeycoffee.com"
 __status__ = "BETA"
 
 import binascii
-import copy
 import datetime
 import glob
 import logging
 import serial
 import sys
 import time
-from scipy.stats import linregress
 
+from .detectors import DEFAULT_DETECTORS, BUDGET, DetectorPipeline
+from .estimators import SLOPES, RateOfRise
+from .frames import FRAME_SIZE, FrameDecoder, celsius2fahrenheit
 from .mock import MockProcess
+from .samples import Decimator, SampleStore
+from .scheduler import TickScheduler
+from .shared import SPAWN, CommandMailbox, SampleRing
+from .stream import StateStream
 
 py2 = sys.version[0] == '2'
 
@@ -42,7 +47,6 @@ else:
     from queue import Queue
 
 from threading import Thread, Event
-from collections import deque
 
 
 class InvalidInput(Exception):
@@ -72,11 +76,6 @@ def hex2int(value):
     return int(binascii.hexlify(value), 16)
 
 
-def celsius2fahrenheit(c):
-    """Convert temperatures."""
-    return (c * 1.8) + 32
-
-
 def now_time(str=False):
     """Get the current time."""
     if str:
@@ -131,6 +130,7 @@ class ControlProcess(Thread):
 
     MAX_BOUND_TEMP = 500
     MIN_BOUND_TEMP = 50
+    KEEP_ALIVE = 1.0
 
     def __init__(self, conn, config, q, logger, callback=None):
         """Extend threads to support more control logic."""
@@ -140,10 +140,18 @@ class ControlProcess(Thread):
         self._config = config
         self._q = q
         self._cb = callback
-        self._retry_count = 0
+        self._decoder = FrameDecoder()
+        self._ticker = TickScheduler(config['interval'], sleep=self._sleep)
+        self._sent = None
+        self._sent_at = 0
+        self._commanded_at = None
+        self._commands = {'writes': 0, 'unchanged': 0, 'commands': 0,
+                          'latency': 0.0, 'max_latency': 0.0,
+                          'total_latency': 0.0}
 
         # Trigger events used in the core loop.
         self.cooldown = Event()
+        self.command = Event()
         self.exit = Event()
 
     def _generate_config(self):
@@ -176,98 +184,151 @@ class ControlProcess(Thread):
         config[35] = sum([b for b in config[:35]]) & 0xFF
         return bytes(config)
 
-    def _send_config(self):
+    def _send_config(self, force=False):
         """Send configuration data to the hottop.
 
+        Configuration is only written when it differs from what was last sent
+        or when the keep-alive period has passed, unless forced.
+
+        :param force: Write even if nothing has changed
+        :type force: bool
         :returns: bool
         :raises: Generic exceptions if an error is identified.
         """
         serialized = self._generate_config()
+        now = time.monotonic()
+        if (not force and serialized == self._sent and
+                now - self._sent_at < self.KEEP_ALIVE):
+            self._commands['unchanged'] += 1
+            return False
         self._log.debug("Configuration has been serialized")
         try:
-            self._conn.flushInput()
-            self._conn.flushOutput()
             self._conn.write(serialized)
-            return True
+            self._conn.flush()
         except Exception as e:
             self._log.error(e)
             raise Exception(e)
+        self._sent = serialized
+        self._sent_at = now
+        self._commands['writes'] += 1
+        if self._commanded_at is not None:
+            latency = time.monotonic() - self._commanded_at
+            self._commanded_at = None
+            self._commands['commands'] += 1
+            self._commands['latency'] = latency
+            self._commands['total_latency'] += latency
+            self._commands['max_latency'] = max(
+                self._commands['max_latency'], latency)
+        return True
 
-    def _validate_checksum(self, buffer):
-        """Validate the buffer response against the checksum.
+    def _sync_commands(self):
+        """Apply any control settings passed in through the shared queue.
 
-        When reading the serial interface, data will come back in a raw format
-        with an included checksum process.
+        Settings from a `CommandMailbox` also carry the cooldown and exit
+        flags of an isolated process. They are acted on here, every tick and
+        whenever a command wakes the loop, so a shutdown is honoured even
+        when the roaster has stopped sending frames.
 
-        :returns: bool
+        :returns: None
         """
-        self._log.debug("Validating the buffer")
-        if len(buffer) == 0:
-            self._log.debug("Buffer was empty")
-            if self._conn.isOpen():
-                self._log.debug('Closing connection')
-                self._conn.close()
-            return False
-        p0 = hex2int(buffer[0])
-        p1 = hex2int(buffer[1])
-        checksum = sum([hex2int(c) for c in buffer[:35]]) & 0xFF
-        p35 = hex2int(buffer[35])
-        if p0 != 165 or p1 != 150 or p35 != checksum:
-            self._log.debug("Buffer checksum was not valid")
-            return False
-        return True
+        while not self._q.empty():
+            update = self._q.get()
+            if update:
+                self._config.update(update)
+        if self._config.get('cooldown') and not self.cooldown.is_set():
+            self.drop()
+        if self._config.get('exit') and not self.exit.is_set():
+            self.shutdown()
+
+    def _sleep(self, seconds):
+        """Wait for the next tick, writing commands as soon as they arrive.
+
+        :param seconds: How long to wait
+        :type seconds: float
+        :returns: None
+        """
+        end = time.monotonic() + seconds
+        while self.command.wait(max(end - time.monotonic(), 0)):
+            self.command.clear()
+            if self._commanded_at is None:
+                self._commanded_at = time.monotonic()
+            self._sync_commands()
+            if self.exit.is_set():
+                return None
+            self._apply_cooldown()
+            self._send_config()
 
-    def _read_settings(self, retry=True):
-        """Read the information from the Hottop.
+    def _apply_cooldown(self):
+        """Force the cool-down configuration once a drop has been registered.
 
-        Read the settings from the serial interface and convert them into a
-        human-readable format that can be shared back to the end-user. Reading
-        from the serial interface will occasionally produce strange results or
-        blank reads, so a retry process has been built into the function as a
-        recursive check.
+        :returns: None
+        """
+        if not self.cooldown.is_set():
+            return None
+        self._log.debug("Cool down process triggered")
+        self._config['drum_motor'] = 1
+        self._config['heater'] = 0
+        self._config['solenoid'] = 1
+        self._config['cooling_motor'] = 1
+        self._config['main_fan'] = 10
+
+    def notify(self):
+        """Wake the core loop so changed controls are written right away.
+
+        :returns: None
+        """
+        if self._commanded_at is None:
+            self._commanded_at = time.monotonic()
+        self.command.set()
+
+    def get_command_stats(self):
+        """Get the counters for configuration writes.
 
         :returns: dict
         """
+        stats = dict(self._commands)
+        total = stats.pop('total_latency')
+        count = stats['commands']
+        stats['mean_latency'] = total / count if count else 0.0
+        return stats
+
+    def _read_settings(self):
+        """Read the information from the Hottop.
+
+        Read whatever is waiting on the serial interface and pass it through
+        the frame decoder, which finds the frame header, validates the
+        checksum and converts the values into a human-readable format that can
+        be shared back to the end-user. Partial or corrupt frames are dropped
+        by the decoder, so reading continues until a full frame is found or
+        the serial read times out.
+
+        :returns: dict or None if no frame was read
+        """
         if not self._conn.isOpen():
             self._log.debug("Reopening connection")
             self._conn.open()
-        self._conn.flushInput()
-        self._conn.flushOutput()
-        buffer = self._conn.read(36)
-        if len(buffer) != 36:
-            self._log.debug('Buffer length (%d) did not match 36' % len(buffer))
-            if self._conn.isOpen():
-                self._log.debug('Closing connection')
-                self._conn.close()
-                self._read_settings(retry=True)
-
-        check = self._validate_checksum(buffer)
-        if not check and (retry and self._retry_count <= 3):
-            if self._retry_count == 3:
-                self._log.error('Retry count reached on buffer check')
-                self._read_settings(retry=False)
-            else:
-                self._retry_count += 1
-                self._read_settings(retry=True)
+        settings = list()
+        while not settings:
+            buffer = self._conn.read(self._conn.in_waiting or FRAME_SIZE)
+            if len(buffer) == 0:
+                self._log.debug("Buffer was empty")
+                return None
+            settings = self._decoder.feed(buffer)
+        return settings[-1]
+
+    def get_frame_stats(self):
+        """Get the counters kept while decoding frames.
 
-        try:
-            settings = dict()
-            settings['heater'] = hex2int(buffer[10])
-            settings['fan'] = hex2int(buffer[11])
-            settings['main_fan'] = hex2int(buffer[12])
-            et = hex2int(buffer[23] + buffer[24])
-            settings['environment_temp'] = celsius2fahrenheit(et)
-            bt = hex2int(buffer[25] + buffer[26])
-            settings['bean_temp'] = celsius2fahrenheit(bt)
-            settings['solenoid'] = hex2int(buffer[16])
-            settings['drum_motor'] = hex2int(buffer[17])
-            settings['cooling_motor'] = hex2int(buffer[18])
-            settings['chaff_tray'] = hex2int(buffer[19])
-            self._retry_count = 0
-        except Exception:
-            self._log.error("Pulled a cache configuration!")
-            settings = self._generate_config()
-        return settings
+        :returns: dict
+        """
+        return self._decoder.stats()
+
+    def get_tick_stats(self):
+        """Get the scheduling counters for the core loop.
+
+        :returns: dict
+        """
+        return self._ticker.stats()
 
     def _valid_config(self, settings):
         """Scan through the returned settings to ensure they appear sane.
@@ -304,7 +365,7 @@ class ControlProcess(Thread):
         :returns: None
         """
         for range in (0, 10):
-            self._send_config()
+            self._send_config(force=True)
             time.sleep(self._config['interval'])
 
     def run(self):
@@ -322,30 +383,34 @@ class ControlProcess(Thread):
         and pre-configure the system with a configuration, so the user doesn't
         need to do it themselves.
 
+        Ticks are scheduled against deadlines on the monotonic clock, so time
+        spent reading and writing does not push later ticks back. Readings are
+        stamped with the monotonic time they were acquired. Configuration is
+        only written when it changes or the keep-alive period runs out, and
+        commands that arrive between ticks are written as soon as they land.
+
         :returns: None
         """
         self._wake_up()
 
-        while not self._q.empty():
-            self._config = self._q.get()
-
+        self._ticker.start()
         while not self.exit.is_set():
+            self._sync_commands()
             settings = self._read_settings()
+            if settings is None:
+                self._ticker.wait()
+                continue
+            settings['acquired'] = time.monotonic()
             settings['valid'] = self._valid_config(settings)
             self._cb(settings)
 
-            if self.cooldown.is_set():
-                self._log.debug("Cool down process triggered")
-                self._config['drum_motor'] = 1
-                self._config['heater'] = 0
-                self._config['solenoid'] = 1
-                self._config['cooling_motor'] = 1
-                self._config['main_fan'] = 10
+            self._apply_cooldown()
 
             if settings['valid']:
                 self._log.debug("Settings were valid, sending...")
                 self._send_config()
-            time.sleep(self._config['interval'])
+            self._ticker.interval = self._config['interval']
+            self._ticker.wait()
 
     def drop(self):
         """Register a drop event to begin the cool-down process.
@@ -364,6 +429,212 @@ class ControlProcess(Thread):
         self.exit.set()
 
 
+class IsolatedProcess(SPAWN.Process):
+
+    """Run the control loop in a dedicated OS process.
+
+    The web process shares its interpreter and event hub with Socket.IO, Mongo
+    and template rendering, all of which can stall the roaster loop. This
+    process owns the serial connection and runs a `ControlProcess` loop of its
+    own. Readings are published into a shared `SampleRing` and controls are
+    picked up from a shared `CommandMailbox` once per tick.
+
+    :param port: Serial port of the Hottop
+    :type port: str
+    :param settings: Keyword arguments used to open the serial port
+    :type settings: dict
+    :param config: Initial configurations settings
+    :type config: dict
+    :param ring: Shared ring the readings are published into
+    :type ring: SampleRing instance
+    :param commands: Shared mailbox with the latest controls
+    :type commands: CommandMailbox instance
+    :returns: IsolatedProcess instance
+    """
+
+    STATS = ['ticks', 'overruns', 'skipped', 'jitter', 'max_jitter',
+             'mean_jitter', 'frames', 'dropped_bytes', 'bad_checksums',
+             'writes', 'unchanged', 'commands', 'latency', 'max_latency',
+             'mean_latency']
+
+    def __init__(self, port, settings, config, ring, commands):
+        """Prepare the process without starting it."""
+        SPAWN.Process.__init__(self, name="hottop-acquisition")
+        self.daemon = True
+        self._port = port
+        self._settings = settings
+        self._config = dict(config)
+        self._ring = ring
+        self._commands = commands
+        self._stats = SPAWN.RawArray('d', len(self.STATS))
+        self.wake = SPAWN.Event()
+
+    def run(self):
+        """Open the serial port and run the control loop until told to exit.
+
+        :returns: None
+        """
+        log = logging.getLogger(Hottop.NAME)
+        log.setLevel(logging.INFO)
+        log.addHandler(logging.StreamHandler(sys.stdout))
+        conn = serial.Serial(self._port, **self._settings)
+        control = ControlProcess(conn, self._config, self._commands, log)
+        control.command = self.wake
+
+        def publish(settings):
+            self._ring.write(settings)
+            stats = control.get_tick_stats()
+            stats.update(control.get_frame_stats())
+            stats.update(control.get_command_stats())
+            self._stats[:] = [float(stats[key]) for key in self.STATS]
+
+        control._cb = publish
+        control.run()
+        conn.close()
+
+    def get_stats(self):
+        """Get the counters published by the process.
+
+        :returns: dict
+        """
+        return dict(zip(self.STATS, self._stats[:]))
+
+
+class RingReader(Thread):
+
+    """Pass readings from the shared ring back into the Hottop.
+
+    :param ring: Shared ring the readings are published into
+    :type ring: SampleRing instance
+    :param interval: Seconds to wait between polls
+    :type interval: int or float
+    :param logger: Shared logger to keep continuity
+    :type logger: Logging instance
+    :param callback: Function called with every reading
+    :type callback: function
+    :returns: RingReader instance
+    """
+
+    def __init__(self, ring, interval, logger, callback):
+        """Start reading from the current head of the ring."""
+        Thread.__init__(self)
+        self.daemon = True
+        self._ring = ring
+        self._interval = interval
+        self._log = logger
+        self._cb = callback
+        self._next = ring.head()
+        self.lost = 0
+        self.exit = Event()
+
+    def run(self):
+        """Poll the ring until the exit signal has been set.
+
+        :returns: None
+        """
+        while not self.exit.wait(self._interval):
+            readings, self._next, lost = self._ring.read(self._next)
+            if lost:
+                self._log.error("Lost %d readings from the ring" % lost)
+                self.lost += lost
+            for reading in readings:
+                self._cb(reading)
+
+
+class IsolatedControl:
+
+    """Drive an `IsolatedProcess` with the same calls as `ControlProcess`.
+
+    :param port: Serial port of the Hottop
+    :type port: str
+    :param settings: Keyword arguments used to open the serial port
+    :type settings: dict
+    :param config: Initial configurations settings
+    :type config: dict
+    :param commands: Shared mailbox with the latest controls
+    :type commands: CommandMailbox instance
+    :param logger: Shared logger to keep continuity
+    :type logger: Logging instance
+    :param callback: Function called with every reading
+    :type callback: function
+    :param capacity: Number of readings kept in the shared ring
+    :type capacity: int
+    :returns: IsolatedControl instance
+    """
+
+    def __init__(self, port, settings, config, commands, logger, callback,
+                 capacity=1024):
+        """Create the shared ring, the process and the reader."""
+        self._commands = commands
+        self._ring = SampleRing(capacity)
+        self._process = IsolatedProcess(port, settings, config, self._ring,
+                                        commands)
+        self._reader = RingReader(self._ring, config['interval'] / 2.0,
+                                  logger, callback)
+
+    def start(self):
+        """Start the acquisition process and the reader.
+
+        :returns: None
+        """
+        self._process.start()
+        self._reader.start()
+
+    def is_alive(self):
+        """Check that the acquisition process is still running.
+
+        :returns: bool
+        """
+        return self._process.is_alive()
+
+    def get_tick_stats(self):
+        """Get the scheduling counters from the acquisition process.
+
+        :returns: dict
+        """
+        stats = self._process.get_stats()
+        stats['lost'] = self._reader.lost
+        return stats
+
+    def get_frame_stats(self):
+        """Get the frame decoding counters from the acquisition process.
+
+        :returns: dict
+        """
+        return self._process.get_stats()
+
+    def get_command_stats(self):
+        """Get the configuration write counters from the acquisition process.
+
+        :returns: dict
+        """
+        return self._process.get_stats()
+
+    def notify(self):
+        """Wake the acquisition process so it picks up the new controls.
+
+        :returns: None
+        """
+        self._process.wake.set()
+
+    def drop(self):
+        """Register a drop event to begin the cool-down process.
+
+        :returns: None
+        """
+        self._commands.flag('cooldown')
+        self.notify()
+
+    def shutdown(self):
+        """Stop the acquisition process and the reader.
+
+        :returns: None
+        """
+        self._commands.flag('exit')
+        self.notify()
+        self._reader.exit.set()
+
+
 class Hottop:
 
     """Object to interact and control the hottop roaster.
@@ -380,21 +651,36 @@ class Hottop:
     TIMEOUT = 1
     LOG_LEVEL = logging.DEBUG
     INTERVAL = 0.5
+    HIGH_RATE_INTERVAL = 0.1
+    UI_INTERVAL = 0.5
+    STORAGE_INTERVAL = 0.5
+    SLOPE_WINDOW = 5
+    RING_SIZE = 1024
+    ROR_METHOD = 'least_squares'
+    ROR_WINDOW = 30
+    DETECTORS = DEFAULT_DETECTORS
+    DETECTOR_BUDGET = BUDGET
 
     def __init__(self):
         """Start of the hottop."""
         self._log = self._logger()
         self._simulate = False
+        self._isolate = False
         self._conn = None
         self._roast = dict()
         self._roasting = False
         self._roast_start = None
         self._roast_end = None
+        self._clock_start = None
         self._config = dict()
-        self._window = deque(list(), 5)
-        self._deltas = list()
-        self._temp_window = deque([-1 for x in range(0, 120)], 120)
+        self._user_callback = None
+        self._event_callback = None
+        self._detectors = DetectorPipeline(self.DETECTORS,
+                                           self.DETECTOR_BUDGET,
+                                           self.SLOPE_WINDOW)
         self._q = Queue()
+        self._stream = StateStream()
+        self._callback_stats = {'calls': 0, 'total': 0.0, 'max': 0.0}
         self._init_controls()
 
     def _logger(self):
@@ -404,6 +690,9 @@ class Hottop:
         """
         logger = logging.getLogger(self.NAME)
         logger.setLevel(self.LOG_LEVEL)
+        if logger.handlers:
+            # Several roasters share the same logger
+            return logger
         shandler = logging.StreamHandler(sys.stdout)
         fmt = '\033[1;32m%(levelname)-5s %(module)s:%(funcName)s():'
         fmt += '%(lineno)d %(asctime)s\033[0m| %(message)s'
@@ -442,6 +731,15 @@ class Hottop:
                 pass
         return match
 
+    def _serial_settings(self):
+        """Get the keyword arguments used to open the serial port.
+
+        :returns: dict
+        """
+        return {'baudrate': self.BAUDRATE, 'bytesize': self.BYTE_SIZE,
+                'parity': self.PARITY, 'stopbits': self.STOPBITS,
+                'timeout': self.TIMEOUT}
+
     def connect(self, interface=None):
         """Connect to the USB for the hottop.
 
@@ -458,13 +756,13 @@ class Hottop:
             self._log.debug("Auto-discovered USB port: %s" % match)
         else:
             self.USB_PORT = interface
+        if self._isolate:
+            # The acquisition process opens the port itself
+            return True
 
         try:
-            self._conn = serial.Serial(self.USB_PORT, baudrate=self.BAUDRATE,
-                                       bytesize=self.BYTE_SIZE,
-                                       parity=self.PARITY,
-                                       stopbits=self.STOPBITS,
-                                       timeout=self.TIMEOUT)
+            self._conn = serial.Serial(self.USB_PORT,
+                                       **self._serial_settings())
         except serial.serialutil.SerialException as e:
             raise SerialConnectionError(str(e))
 
@@ -498,11 +796,37 @@ class Hottop:
         self._roast['end_time'] = None
         self._roast['duration'] = -1
         self._roast['notes'] = None
-        self._roast['events'] = list()
+        self._samples = SampleStore()
         self._roast['last'] = None
         self._roast['record'] = False
         self._roast['charge'] = None
         self._roast['turning_point'] = None
+        self._init_tiers()
+        self._init_ror()
+
+    def _init_tiers(self):
+        """Set up the rates readings are passed on to the UI and storage.
+
+        Every reading is used for event detection. Readings for the UI and for
+        the saved roast are decimated down to their own, slower rates so that
+        sampling faster doesn't multiply the browser and database load.
+
+        :returns: None
+        """
+        tolerance = self._config['interval'] / 2.0
+        self._tiers = {'ui': Decimator(self.UI_INTERVAL, tolerance),
+                       'storage': Decimator(self.STORAGE_INTERVAL, tolerance)}
+
+    def _init_ror(self):
+        """Set up the rate of rise estimators for the current interval.
+
+        The window is configured in seconds and spans however many readings
+        arrive in that time.
+
+        :returns: None
+        """
+        samples = int(round(self.ROR_WINDOW / self._config['interval']))
+        self._ror = RateOfRise(self.ROR_METHOD, samples)
 
     def _callback(self, data):
         """Processor callback to clean-up stream data.
@@ -510,108 +834,85 @@ class Hottop:
         This function provides a hook into the output stream of data from the
         controller processing thread. Hottop readings are saved into a local
         class variable for later saving. If the user has defined a callback, it
-        will be called within this private function.
+        will be called within this private function. Time spent handling each
+        reading is tracked to judge how many roasters a process can drive.
 
         :param data: Information from the controller process
         :type data: dict
         :returns: None
         """
-        local = copy.deepcopy(data)
+        start = time.perf_counter()
+        self._handle_reading(data)
+        elapsed = time.perf_counter() - start
+        self._callback_stats['calls'] += 1
+        self._callback_stats['total'] += elapsed
+        self._callback_stats['max'] = max(self._callback_stats['max'],
+                                          elapsed)
+
+    def _handle_reading(self, data):
+        """Record a reading and pass it on to the user callback.
+
+        :param data: Information from the controller process
+        :type data: dict
+        :returns: None
+        """
+        local = dict(data)
+        acquired = local.pop('acquired', None) or time.monotonic()
         output = dict()
         output['config'] = local
         if self._roast_start:
-            td = (now_time() - load_time(self._roast_start))
-            # Seconds since starting
-            output['time'] = ((td.total_seconds() + 60) / 60) - 1
-            self._roast['duration'] = output['time']
+            elapsed = acquired - self._clock_start
+            # Minutes since starting
+            output['time'] = elapsed / 60.0
             local.update({'time': output['time']})
-            ct = load_time(now_time(str=True))
-            st = load_time(self._roast['start_time'])
-            self._roast['duration'] = timedelta2period(ct - st)
+            td = datetime.timedelta(seconds=elapsed)
+            self._roast['duration'] = timedelta2period(td)
+
+        store = self._tiers['storage'].due(acquired)
+        show = self._tiers['ui'].due(acquired)
+        if self._roast['record'] and local.get('valid', True):
+            # Every reading feeds the estimators so they stay O(1) and smooth
+            rates = self._ror.update(local)
+            output['ror'] = {k: round(v, 1) for k, v in rates.items()}
+            self._detect(local, rates)
 
         if self._roast['record']:
-            copied = copy.deepcopy(output)
-            self._derive_charge(copied['config'])
-            self._derive_turning_point(copied['config'])
-            self._roast['events'].append(copied)
             self._roast['last'] = local
 
-            # if self._roast.get('charge'):
-            # if len(self._deltas) == 0:
-            #     self._log.debug("Hit the turning point")
-            #     output['config']['delta_bean_temp'] = 1
-
-            if self._temp_window[0] != -1:
-                output['alt_time'] = ((td.total_seconds() + 60) / 60) - 1.5
-                delta = (local['bean_temp'] - self._temp_window[0])
-                # delta = int((delta / float(self._temp_window[0])) * 100)
-                delta = int(round(local['bean_temp'] - self._temp_window[0]))
-                if int(self._roast['duration'][3:]) % 10 == 0:
-                    output['config']['delta_bean_temp'] = delta
-                self._log.debug("%s - %s = %s"
-                    % (local['bean_temp'], self._temp_window[0], delta))
-                self._deltas.append(delta)
-
-            self._temp_window.append(local['bean_temp'])
-
-        if self._user_callback:
-            # self._log.debug("Passing data back to client handler")
-            output['roast'] = self._roast
-            output['roasting'] = self._roasting
-            if local.get('valid', True):
-                self._user_callback(output)
+        if self._roast['record'] and store:
+            self._samples.append(local)
 
-    def _derive_charge(self, config):
-        """Use a temperature window to identify the roast charge.
+        if self._user_callback and local.get('valid', True) and show:
+            # self._log.debug("Passing data back to client handler")
+            frame = self._stream.frame(output, self._roast, self._roasting)
+            self._user_callback(frame)
 
-        The charge will manifest as a sudden downward trend on the temperature.
-        Once found, we save it and avoid overwriting. The charge is needed in
-        order to derive the turning point.
+    def _detect(self, config, rates):
+        """Run the event detectors over a reading and mark what they find.
 
-        :param config: Current snapshot of the configuration
-        :type config: dict
-        :returns: None
-        """
-        if self._roast.get('charge'):
-            return None
-        self._window.append(config)
-        time, temp = list(), list()
-        for x in list(self._window):
-            time.append(x['time'])
-            temp.append(x['bean_temp'])
-        slope, intercept, r_value, p_value, std_err = linregress(time, temp)
-        if slope < 0:
-            self._roast['charge'] = self._roast['last']
-            self.add_roast_event({'event': 'Charge'})
-            return config
-        return None
-
-    def _derive_turning_point(self, config):
-        """Use a temperature window to identify the roast turning point.
-
-        Turning point relies on the charge being set first. We use the rolling
-        5-point window to measure slope. If we show a positive trend after
-        the charge, then the temperature has begun to turn.
+        Detectors share the features of the readings so far and each fires
+        once per roast. Charge and turning point are also kept on the roast
+        as the reading before the one they were spotted on and reach the UI
+        with the next frame. Other events are passed to the event callback
+        as the same activity marking them by hand would send.
 
         :param config: Current snapshot of the configuration
         :type config: dict
+        :param rates: Rates of rise of the reading
+        :type rates: dict
         :returns: None
         """
-        if not self._roast.get('charge') or self._roast.get('turning_point'):
-            return None
-        self._window.append(config)
-        time, temp = list(), list()
-        for x in list(self._window):
-            time.append(x['time'])
-            temp.append(x['bean_temp'])
-        slope, intercept, r_value, p_value, std_err = linregress(time, temp)
-        if slope > 0:
-            self._roast['turning_point'] = self._roast['last']
-            self.add_roast_event({'event': 'Turning Point'})
-            return config
-        return None
-
-    def start(self, func=None):
+        for detector in self._detectors.update(config, rates):
+            if detector.field:
+                self._roast[detector.field] = self._roast['last']
+            self._mark({'event': detector.event})
+            if detector.activity and self._event_callback:
+                state = self.get_roast(events=False)
+                self._event_callback({'activity': detector.activity,
+                                      'state': state, 'detected': True,
+                                      'event': detector.event})
+
+    def start(self, func=None, event_func=None):
         """Start the roaster control process.
 
         This function will kick off the processing thread for the Hottop and
@@ -621,15 +922,26 @@ class Hottop:
 
         :param func: Callback function for Hottop stream data
         :type func: function
+        :param event_func: Callback function for events found by detectors
+        :type event_func: function
         :returns: None
         """
         self._user_callback = func
-        if not self._simulate:
-            self._process = ControlProcess(self._conn, self._config, self._q,
-                                           self._log, callback=self._callback)
-        else:
+        self._event_callback = event_func
+        if self._simulate:
             self._process = MockProcess(self._config, self._q,
                                         self._log, callback=self._callback)
+        elif self._isolate:
+            self._q = CommandMailbox()
+            self._q.put(self._config)
+            self._process = IsolatedControl(self.USB_PORT,
+                                            self._serial_settings(),
+                                            self._config, self._q, self._log,
+                                            self._callback,
+                                            capacity=self.RING_SIZE)
+        else:
+            self._process = ControlProcess(self._conn, self._config, self._q,
+                                           self._log, callback=self._callback)
         self._process.start()
         self._roasting = True
 
@@ -663,6 +975,15 @@ class Hottop:
         """
         self._process.drop()
 
+    def _command(self):
+        """Pass the controls to the control process and wake it up.
+
+        :returns: None
+        """
+        self._q.put(self._config)
+        if getattr(self, '_process', None):
+            self._process.notify()
+
     def reset(self):
         """Reset the internal roast properties.
 
@@ -671,8 +992,10 @@ class Hottop:
         self._roasting = False
         self._roast_start = None
         self._roast_end = None
+        self._clock_start = None
         self._roast = dict()
-        self._window = deque(list(), 5)
+        self._detectors.reset()
+        self._stream.reset()
         self._init_controls()
 
     def add_roast_event(self, event):
@@ -686,37 +1009,130 @@ class Hottop:
 
         :param event: Details describing what happened
         :type event: dict
-        :returns: dict
+        :returns: dict roast properties, without the samples and events
         """
-        event.update({'time': self.get_roast_time(),
-                      'config': self.get_roast_properties()['last']})
-        self._roast['events'].append(event)
+        self._mark(event)
         return self.get_roast_properties()
 
-    def get_roast(self):
+    def _mark(self, event):
+        """Save an event with the roast and let the detectors know.
+
+        :param event: Details describing what happened
+        :type event: dict
+        :returns: None
+        """
+        event.update({'time': self.get_roast_time(),
+                      'config': self._roast['last']})
+        self._samples.mark(event)
+        if 'event' in event:
+            self._detectors.marked(event['event'], event['time'])
+
+    def get_roast(self, events=True):
         """Get the roast information.
 
-        :returns: list
+        Readings are kept in a column store while roasting, so the list of
+        events is built from it each time this is called.
+
+        :param events: Include the list of samples and events
+        :type events: bool
+        :returns: dict
         """
-        return self._roast
+        roast = dict(self._roast)
+        if events:
+            roast['events'] = self._samples.materialize()
+        return roast
+
+    def get_events_since(self, position):
+        """Get the samples and events recorded after a position.
+
+        :param position: Position returned from the previous call, or 0
+        :type position: int
+        :returns: tuple of events and the position to pass next time
+        """
+        samples = self._samples
+        events = samples.since(position)
+        return events, position + len(events)
+
+    def get_stream_snapshot(self):
+        """Get a full snapshot of the live stream for resynchronizing.
+
+        Frames passed to the user callback only carry the latest sample and
+        changed roast metadata. Clients that miss a frame should use this
+        snapshot to rebuild their state before applying new frames.
+
+        :returns: dict
+        """
+        return self._stream.snapshot(self.get_roast(), self._roasting)
 
     def get_roast_time(self):
         """Get the roast time.
 
         :returns: float
         """
-        td = (now_time() - load_time(self._roast_start))
-        return ((td.total_seconds() + 60) / 60) - 1
+        return (time.monotonic() - self._clock_start) / 60.0
 
     def get_serial_state(self):
         """Get the state of the USB connection.
 
         :returns: dict
         """
+        if self._isolate and getattr(self, '_process', None):
+            return self._process.is_alive()
         if not self._conn:
             return False
         return self._conn.isOpen()
 
+    def get_frame_stats(self):
+        """Get the frame decoding counters from the control process.
+
+        :returns: dict
+        """
+        if self._simulate or not getattr(self, '_process', None):
+            return dict()
+        return self._process.get_frame_stats()
+
+    def get_tick_stats(self):
+        """Get the scheduling counters from the control process.
+
+        :returns: dict
+        """
+        if not getattr(self, '_process', None):
+            return dict()
+        return self._process.get_tick_stats()
+
+    def get_command_stats(self):
+        """Get the configuration write counters from the control process.
+
+        :returns: dict
+        """
+        if not getattr(self, '_process', None):
+            return dict()
+        return self._process.get_command_stats()
+
+    def get_callback_stats(self):
+        """Get the time spent handling readings from the control process.
+
+        :returns: dict
+        """
+        stats = dict(self._callback_stats)
+        total = stats.pop('total')
+        stats['mean'] = total / stats['calls'] if stats['calls'] else 0.0
+        return stats
+
+    def get_detector_stats(self):
+        """Get the time spent and events found by each event detector.
+
+        :returns: dict
+        """
+        return self._detectors.get_stats()
+
+    def get_roasting(self):
+        """Get whether the control process is running.
+
+        :returns: bool
+        """
+        return self._roasting
+
     def get_current_config(self):
         """Get the current running config and state.
 
@@ -735,16 +1151,151 @@ class Hottop:
         :returns: None
         :raises: InvalidInput
         """
-        if type(interval) != float or type(interval) != int:
+        if type(interval) not in [float, int] or interval <= 0:
             raise InvalidInput("Interval value must be of float or int")
-        self._config['interval']
+        self.INTERVAL = interval
+        self._config['interval'] = interval
+        self._init_tiers()
+        self._init_ror()
+        self._command()
+
+    def get_high_rate(self):
+        """Get the high-rate sampling status.
+
+        :returns: bool
+        """
+        return self._config['interval'] < Hottop.INTERVAL
+
+    def set_high_rate(self, status):
+        """Set the high-rate sampling status.
+
+        High-rate sampling polls the roaster at `HIGH_RATE_INTERVAL` so events
+        are detected on every reading, while the UI and stored roast keep
+        their own rates. The slope window is scaled to cover the same amount
+        of time as it does at the normal rate.
+
+        :param status: Value to set the high-rate sampling
+        :type status: bool
+        :returns: None
+        :raises: InvalidInput
+        """
+        if type(status) != bool:
+            raise InvalidInput("Status value must be bool")
+        interval = self.HIGH_RATE_INTERVAL if status else Hottop.INTERVAL
+        window = Hottop.SLOPE_WINDOW * Hottop.INTERVAL / interval
+        self.set_slope_window(max(2, int(round(window))))
+        self.set_interval(interval)
+
+    def get_ui_interval(self):
+        """Get the interval readings are streamed to the UI at.
+
+        :returns: float
+        """
+        return self.UI_INTERVAL
+
+    def set_ui_interval(self, interval):
+        """Set the interval readings are streamed to the UI at.
+
+        :param interval: Seconds between streamed readings
+        :type interval: int or float
+        :returns: None
+        :raises: InvalidInput
+        """
+        if type(interval) not in [float, int] or interval <= 0:
+            raise InvalidInput("Interval value must be of float or int")
+        self.UI_INTERVAL = interval
+        self._init_tiers()
+
+    def get_storage_interval(self):
+        """Get the interval readings are saved with the roast at.
+
+        :returns: float
+        """
+        return self.STORAGE_INTERVAL
+
+    def set_storage_interval(self, interval):
+        """Set the interval readings are saved with the roast at.
+
+        :param interval: Seconds between saved readings
+        :type interval: int or float
+        :returns: None
+        :raises: InvalidInput
+        """
+        if type(interval) not in [float, int] or interval <= 0:
+            raise InvalidInput("Interval value must be of float or int")
+        self.STORAGE_INTERVAL = interval
+        self._init_tiers()
+
+    def get_slope_window(self):
+        """Get the number of samples the event detectors take slopes over.
+
+        :returns: int
+        """
+        return self._detectors.features.slope_window
+
+    def set_slope_window(self, window):
+        """Set the number of samples the event detectors take slopes over.
+
+        :param window: Samples kept in the rolling slope window
+        :type window: int
+        :returns: None
+        :raises: InvalidInput
+        """
+        if type(window) != int or window < 2:
+            raise InvalidInput("Slope window must be an int of at least 2")
+        self.SLOPE_WINDOW = window
+        self._detectors.features.set_slope_window(window)
+
+    def get_ror_method(self):
+        """Get the way the live rate of rise is estimated.
+
+        :returns: str
+        """
+        return self._ror.method
+
+    def set_ror_method(self, method):
+        """Set the way the live rate of rise is estimated.
+
+        :param method: One of `ema`, `least_squares` or `savitzky_golay`
+        :type method: str
+        :returns: None
+        :raises: InvalidInput
+        """
+        if method not in SLOPES:
+            raise InvalidInput("Rate of rise method must be one of: %s"
+                               % ', '.join(sorted(SLOPES)))
+        self.ROR_METHOD = method
+        self._init_ror()
+
+    def get_ror_window(self):
+        """Get the seconds the live rate of rise is measured over.
+
+        :returns: int or float
+        """
+        return self.ROR_WINDOW
+
+    def set_ror_window(self, window):
+        """Set the seconds the live rate of rise is measured over.
+
+        :param window: Seconds of readings each rate spans
+        :type window: int or float
+        :returns: None
+        :raises: InvalidInput
+        """
+        if type(window) not in [float, int] or window <= 0:
+            raise InvalidInput("Window value must be of float or int")
+        self.ROR_WINDOW = window
+        self._init_ror()
 
     def get_roast_properties(self):
         """Get the roast properties.
 
+        These leave out the samples and events, which would have to be built
+        from the column store on every call. Use `get_roast` for those.
+
         :returns: dict
         """
-        return self._roast
+        return self.get_roast(events=False)
 
     def set_roast_properties(self, settings):
         """Set the properties of the roast.
@@ -757,7 +1308,7 @@ class Hottop:
         if type(settings) != dict:
             raise InvalidInput("Properties value must be of dict")
         valid = ['name', 'input_weight', 'output_weight', 'operator', 'notes',
-                 'coffee']
+                 'coffee', 'coffee_id']
         for key, value in settings.items():
             if key not in valid:
                 continue
@@ -786,18 +1337,18 @@ class Hottop:
         if type(monitor) != bool:
             raise InvalidInput("Monitor value must be bool")
         self._roast['record'] = bool2int(monitor)
-        self._q.put(self._config)
+        self._command()
 
         if self._roast['record']:
             self._roast_start = now_time(str=True)
+            self._clock_start = time.monotonic()
             self._roast['start_time'] = self._roast_start
         else:
             self._roast_end = now_time(str=True)
             self._roast['end_time'] = self._roast_end
             self._roast['date'] = now_date(str=True)
-            et = load_time(self._roast['end_time'])
-            st = load_time(self._roast['start_time'])
-            self._roast['duration'] = timedelta2period(et - st)
+            td = datetime.timedelta(seconds=self.get_roast_time() * 60)
+            self._roast['duration'] = timedelta2period(td)
         return self.get_roast_properties()
 
     def get_heater(self):
@@ -818,7 +1369,7 @@ class Hottop:
         if type(heater) != int and heater not in list(range(0, 101)):
             raise InvalidInput("Heater value must be int between 0-100")
         self._config['heater'] = heater
-        self._q.put(self._config)
+        self._command()
 
     def get_fan(self):
         """Get the fan config.
@@ -838,7 +1389,7 @@ class Hottop:
         if type(fan) != int and fan not in list(range(0, 11)):
             raise InvalidInput("Fan value must be int between 0-10")
         self._config['fan'] = fan
-        self._q.put(self._config)
+        self._command()
 
     def get_main_fan(self):
         """Get the main fan config.
@@ -858,7 +1409,7 @@ class Hottop:
         if type(main_fan) != int and main_fan not in list(range(0, 11)):
             raise InvalidInput("Main fan value must be int between 0-10")
         self._config['main_fan'] = main_fan
-        self._q.put(self._config)
+        self._command()
 
     def get_drum_motor(self):
         """Get the drum motor config.
@@ -879,7 +1430,7 @@ class Hottop:
             raise InvalidInput("Drum motor value must be bool")
         self._config['drum_motor'] = bool2int(drum_motor)
         self._log.debug(self._config)
-        self._q.put(self._config)
+        self._command()
 
     def get_solenoid(self):
         """Get the solenoid config.
@@ -899,7 +1450,7 @@ class Hottop:
         if type(solenoid) != bool:
             raise InvalidInput("Solenoid value must be bool")
         self._config['solenoid'] = bool2int(solenoid)
-        self._q.put(self._config)
+        self._command()
 
     def get_cooling_motor(self):
         """Get the cooling motor config.
@@ -919,7 +1470,7 @@ class Hottop:
         if type(cooling_motor) != bool:
             raise InvalidInput("Cooling motor value must be bool")
         self._config['cooling_motor'] = bool2int(cooling_motor)
-        self._q.put(self._config)
+        self._command()
 
     def get_simulate(self):
         """Get the simulation status.
@@ -939,3 +1490,25 @@ class Hottop:
         if type(status) != bool:
             raise InvalidInput("Status value must be bool")
         self._simulate = bool2int(status)
+
+    def get_isolate(self):
+        """Get the process isolation status.
+
+        :returns: bool
+        """
+        return self._isolate
+
+    def set_isolate(self, status):
+        """Set the process isolation status.
+
+        When isolated, the serial connection and control loop run in their
+        own OS process and readings are shared back through shared memory.
+
+        :param status: Value to set the isolation
+        :type status: bool
+        :returns: None
+        :raises: InvalidInput
+        """
+        if type(status) != bool:
+            raise InvalidInput("Status value must be bool")
+        self._isolate = status
@@ -0,0 +1,208 @@
+"""
+Import roast logs written by the export page back into the history.
+
+Parsing a log, packing its events and deriving its analytics is CPU work, so
+logs are prepared in a pool of worker processes while the parent only checks
+for duplicates and writes batches to Mongo. A roast is identified by its
+owner and the times it started and ended, which survive an export, so running
+an import twice, or importing logs of roasts that were never deleted, does
+not store them again.
+"""
+import json
+import os
+import re
+import time
+
+from bson.objectid import ObjectId
+from concurrent.futures import ProcessPoolExecutor
+from pymongo.errors import BulkWriteError
+
+from .analytics import derive_curve, pack_analytics
+from .curves import RoastCurve
+from .samples import SampleStore
+
+EXTENSIONS = ('.log', '.json')
+BATCH_SIZE = 200
+# Exports name their file after the roast, ending with its id
+ROAST_ID = re.compile(r'-([0-9a-f]{24})\.[a-z]+$')
+DUPLICATE_KEY = 11000
+
+
+def find_logs(paths):
+    """List the roast logs in a set of files and directories.
+
+    :param paths: Files or directories to search
+    :type paths: list
+    :returns: list of file paths
+    """
+    found = list()
+    for path in paths:
+        if os.path.isfile(path):
+            found.append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            for name in sorted(files):
+                if name.endswith(EXTENSIONS):
+                    found.append(os.path.join(root, name))
+    return found
+
+
+def roast_identity(roast):
+    """Get the values that tell one roast apart from another.
+
+    :param roast: Roast document or exported log
+    :type roast: dict
+    :returns: tuple
+    """
+    return (roast.get('user'), roast.get('start_time'), roast.get('end_time'))
+
+
+def parse_log(path, user=None):
+    """Turn an exported log into a roast document ready to be stored.
+
+    Runs in a worker process, so it only returns picklable values and reports
+    problems instead of raising them.
+
+    :param path: Location of the log
+    :type path: str
+    :param user: Owner to give the roast instead of the one in the log
+    :type user: str
+    :returns: tuple of the path, the roast or None and an error or None
+    """
+    try:
+        with open(path) as handle:
+            roast = json.load(handle)
+        if not isinstance(roast, dict) or 'events' not in roast:
+            return path, None, "not a roast log"
+        if user:
+            roast['user'] = user
+        roast.pop('_id', None)
+        roast.pop('id', None)
+        roast.pop('summary', None)
+        match = ROAST_ID.search(os.path.basename(path))
+        if match:
+            # Keep the id so brews still point at the roast
+            roast['_id'] = ObjectId(match.group(1))
+        store = SampleStore()
+        store.extend(roast['events'])
+        curve = RoastCurve.from_store(store)
+        roast['analytics'] = pack_analytics(derive_curve(curve))
+        roast['events'] = store.pack()
+    except Exception as e:
+        return path, None, str(e)
+    return path, roast, None
+
+
+class RoastImporter:
+
+    """Import roast logs in bulk, skipping roasts that are already stored.
+
+    :param history: Collection finished roasts are stored in
+    :type history: Collection instance
+    :param user: Owner to give every imported roast, or None to keep the one
+                 in each log
+    :type user: str
+    :param workers: Processes used to parse logs, or None for one per CPU
+    :type workers: int
+    :param batch_size: Roasts written to Mongo at once
+    :type batch_size: int
+    :param progress: Optional callback given the stats after every batch
+    :type progress: function
+    :returns: RoastImporter instance
+    """
+
+    def __init__(self, history, user=None, workers=None,
+                 batch_size=BATCH_SIZE, progress=None):
+        """Set up the counters."""
+        self._history = history
+        self._user = user
+        self._workers = workers
+        self._batch_size = batch_size
+        self._progress = progress
+        self._seen = set()
+        self._stats = {'files': 0, 'imported': 0, 'duplicates': 0,
+                       'failed': 0, 'seconds': 0.0}
+
+    def _load_seen(self, users):
+        """Remember the identity of every stored roast of some users.
+
+        :param users: Owners to look up, or None for every owner
+        :type users: list
+        :returns: None
+        """
+        query = dict()
+        if users is not None:
+            query = {'user': {'$in': users}}
+        projection = {'user': 1, 'start_time': 1, 'end_time': 1}
+        for item in self._history.find(query, projection):
+            self._seen.add(roast_identity(item))
+
+    def _write(self, batch):
+        """Insert a batch of roasts, counting any already stored by id.
+
+        :param batch: Roasts to store
+        :type batch: list
+        :returns: None
+        """
+        if not batch:
+            return
+        try:
+            result = self._history.insert_many(batch, ordered=False)
+            self._stats['imported'] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            details = e.details
+            self._stats['imported'] += details.get('nInserted', 0)
+            for error in details.get('writeErrors', list()):
+                if error.get('code') == DUPLICATE_KEY:
+                    self._stats['duplicates'] += 1
+                else:
+                    self._stats['failed'] += 1
+        del batch[:]
+        if self._progress:
+            self._progress(self.get_stats())
+
+    def run(self, paths):
+        """Import every roast log found in a set of files and directories.
+
+        :param paths: Files or directories to import
+        :type paths: list
+        :returns: dict of counts and the rate of the import
+        """
+        start = time.perf_counter()
+        logs = find_logs(paths)
+        self._stats['files'] = len(logs)
+        self._load_seen([self._user] if self._user else None)
+        chunksize = max(1, min(len(logs) // 64, 32))
+        batch = list()
+        with ProcessPoolExecutor(self._workers) as pool:
+            users = [self._user] * len(logs)
+            parsed = pool.map(parse_log, logs, users, chunksize=chunksize)
+            for path, roast, error in parsed:
+                if error:
+                    self._stats['failed'] += 1
+                    self._stats.setdefault('errors', dict())[path] = error
+                    continue
+                identity = roast_identity(roast)
+                if identity in self._seen:
+                    self._stats['duplicates'] += 1
+                    continue
+                self._seen.add(identity)
+                batch.append(roast)
+                if len(batch) >= self._batch_size:
+                    self._stats['seconds'] = time.perf_counter() - start
+                    self._write(batch)
+        self._stats['seconds'] = time.perf_counter() - start
+        self._write(batch)
+        return self.get_stats()
+
+    def get_stats(self):
+        """Get the counts so far and the rate of roasts per minute.
+
+        :returns: dict
+        """
+        stats = dict(self._stats)
+        stats['done'] = (stats['imported'] + stats['duplicates'] +
+                         stats['failed'])
+        seconds = stats['seconds']
+        stats['per_minute'] = stats['done'] / seconds * 60 if seconds else 0.0
+        return stats
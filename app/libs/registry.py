@@ -0,0 +1,194 @@
+"""
+Keep track of every roaster driven from this process.
+
+Each roaster gets its own `Hottop` with its own control loop, roast state and
+detectors. Roasters are keyed by the serial port they are attached to, with a
+default entry that auto-discovers the port the way a single roaster always has.
+
+Roaster ids come from the browser, so only the default, ports configured for
+the server and serial adapters found on this machine are accepted. Anything
+else is refused rather than created, so clients can neither grow the registry
+without bound nor get the server to open arbitrary device paths.
+"""
+import glob
+import sys
+
+from threading import Lock
+
+from .hottop_thread import Hottop
+
+# Device paths serial adapters show up under, by platform
+ADAPTERS = {'darwin': ['/dev/cu.usbserial-*'],
+            'linux': ['/dev/ttyUSB*', '/dev/ttyACM*']}
+
+
+class UnknownRoaster(Exception):
+
+    """Exception for roaster ids that are not configured or attached."""
+
+    pass
+
+
+def discover_ports():
+    """List the serial adapters attached to this machine.
+
+    :returns: list of device paths
+    """
+    ports = list()
+    for platform, patterns in ADAPTERS.items():
+        if sys.platform.startswith(platform):
+            for pattern in patterns:
+                ports.extend(glob.glob(pattern))
+    return sorted(ports)
+
+
+class RoasterRegistry:
+
+    """Registry of roasters keyed by device or port.
+
+    :param factory: Callable used to create a new roaster
+    :type factory: function
+    :returns: RoasterRegistry instance
+    """
+
+    DEFAULT = 'default'
+
+    def __init__(self, factory=Hottop):
+        """Start with no roasters."""
+        self._factory = factory
+        self._roasters = dict()
+        self._options = dict()
+        self._ports = set()
+        self._lock = Lock()
+
+    def _apply(self, roaster):
+        """Apply the shared options to a roaster.
+
+        :param roaster: Roaster to configure
+        :type roaster: Hottop instance
+        :returns: None
+        """
+        if self._options.get('simulate'):
+            roaster.set_simulate(True)
+        if self._options.get('isolate'):
+            roaster.set_isolate(True)
+        if self._options.get('high_rate'):
+            roaster.set_high_rate(True)
+
+    def configure(self, ports=None, **options):
+        """Set options applied to every roaster, such as `simulate`.
+
+        :param ports: Serial ports roasters may be attached to, on top of the
+                      ones discovered
+        :type ports: list
+        :returns: None
+        """
+        with self._lock:
+            self._ports.update(ports or list())
+            self._options.update(options)
+            for roaster in self._roasters.values():
+                self._apply(roaster)
+
+    def known(self, roaster_id):
+        """Tell whether a roaster id may be used.
+
+        :param roaster_id: Port of the roaster, or None for the default
+        :type roaster_id: str
+        :returns: bool
+        """
+        if not roaster_id or roaster_id == self.DEFAULT:
+            return True
+        if roaster_id in self._roasters or roaster_id in self._ports:
+            return True
+        return roaster_id in discover_ports()
+
+    def get(self, roaster_id=None):
+        """Get a roaster, creating it the first time it is asked for.
+
+        :param roaster_id: Port of the roaster, or None for the default
+        :type roaster_id: str
+        :returns: Hottop instance
+        :raises: UnknownRoaster
+        """
+        roaster_id = roaster_id or self.DEFAULT
+        if not self.known(roaster_id):
+            raise UnknownRoaster("Unknown roaster: %s" % roaster_id)
+        with self._lock:
+            if roaster_id not in self._roasters:
+                roaster = self._factory()
+                self._apply(roaster)
+                self._roasters[roaster_id] = roaster
+            return self._roasters[roaster_id]
+
+    def remove(self, roaster_id):
+        """Forget a roaster, ending its control loop if it is running.
+
+        :param roaster_id: Port of the roaster
+        :type roaster_id: str
+        :returns: None
+        """
+        with self._lock:
+            roaster = self._roasters.pop(roaster_id or self.DEFAULT, None)
+        if roaster and roaster.get_roasting():
+            roaster.end()
+
+    def ids(self):
+        """Get the identifiers of every roaster in use.
+
+        :returns: list
+        """
+        return sorted(self._roasters.keys())
+
+    def ports(self):
+        """Get the ports roasters may be attached to.
+
+        :returns: list
+        """
+        return sorted(self._ports.union(discover_ports()))
+
+    def port(self, roaster_id):
+        """Get the serial port to connect a roaster through.
+
+        :param roaster_id: Port of the roaster, or None for the default
+        :type roaster_id: str
+        :returns: str or None to auto-discover
+        """
+        if not roaster_id or roaster_id == self.DEFAULT:
+            return None
+        return roaster_id
+
+    def room(self, roaster_id):
+        """Get the Socket.IO room for clients watching a roaster.
+
+        :param roaster_id: Port of the roaster, or None for the default
+        :type roaster_id: str
+        :returns: str
+        """
+        return 'roaster:%s' % (roaster_id or self.DEFAULT)
+
+    def stats(self):
+        """Get per-roaster counters and an estimate of how many fit.
+
+        The estimate divides the share of each tick spent handling readings
+        in this process by the tick interval. It only counts the work done in
+        this process, so overruns should be checked alongside it.
+
+        :returns: dict
+        """
+        roasters = dict()
+        load = 0.0
+        running = 0
+        for roaster_id, roaster in list(self._roasters.items()):
+            callback = roaster.get_callback_stats()
+            interval = roaster.get_current_config()['settings']['interval']
+            roasters[roaster_id] = {'roasting': roaster.get_roasting(),
+                                    'interval': interval,
+                                    'ticks': roaster.get_tick_stats(),
+                                    'callback': callback,
+                                    'detectors': roaster.get_detector_stats()}
+            if roaster.get_roasting() and callback['calls']:
+                load += callback['mean'] / interval
+                running += 1
+        capacity = int(running / load) if load else None
+        return {'roasters': roasters, 'running': running, 'load': load,
+                'capacity': capacity}
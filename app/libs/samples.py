@@ -0,0 +1,319 @@
+"""
+Compact storage for the readings recorded during a roast.
+
+Readings used to be kept as a list of nested dictionaries, each repeating the
+same dozen keys for every half second of the roast. Here every field lives in
+its own typed array column and the on/off devices are packed into a single
+byte, so a sample costs a few dozen bytes. Dictionaries in the old shape are
+only built when somebody reads the events back out.
+
+For storage the columns are packed further: times in milliseconds and
+temperatures in tenths of a degree are delta-encoded as integers, the device
+levels and flags are kept as bytes, and the lot is compressed into a single
+binary blob. Marked events are few and stay as they are next to it.
+"""
+import sys
+import zlib
+
+from array import array
+from itertools import accumulate
+
+
+class SampleStore:
+
+    """Column store for roast readings and the events marked between them.
+
+    :returns: SampleStore instance
+    """
+
+    TEMPS = ['environment_temp', 'bean_temp']
+    LEVELS = ['heater', 'fan', 'main_fan']
+    FLAGS = ['solenoid', 'drum_motor', 'cooling_motor', 'chaff_tray', 'valid']
+    FORMAT = 1
+    # Stored units per minute of roast time and per degree
+    TIME_SCALE = 60000
+    TEMP_SCALE = 10
+
+    def __init__(self):
+        """Start with empty columns."""
+        self.time = array('d')
+        self.environment_temp = array('d')
+        self.bean_temp = array('d')
+        self.heater = array('B')
+        self.fan = array('B')
+        self.main_fan = array('B')
+        self.flags = array('B')
+        self._markers = list()
+
+    def __len__(self):
+        return len(self.time) + len(self._markers)
+
+    def __iter__(self):
+        """Yield samples and marked events in the order they were recorded."""
+        return self._iter(0, 0, len(self))
+
+    def _iter(self, index, marker, count):
+        """Yield samples and marked events from a point in the recording.
+
+        :param index: Position of the first reading
+        :type index: int
+        :param marker: Position of the first marked event
+        :type marker: int
+        :param count: Number of samples and events to yield
+        :type count: int
+        """
+        markers = self._markers
+        while count > 0:
+            if marker < len(markers) and markers[marker][0] <= index:
+                yield markers[marker][1]
+                marker += 1
+            elif index < len(self.time):
+                yield self.sample(index)
+                index += 1
+            else:
+                return
+            count -= 1
+
+    def count(self):
+        """Get the number of readings stored, ignoring marked events.
+
+        :returns: int
+        """
+        return len(self.time)
+
+    def nbytes(self):
+        """Get the memory used by the sample columns.
+
+        :returns: int
+        """
+        columns = [self.time, self.environment_temp, self.bean_temp,
+                   self.heater, self.fan, self.main_fan, self.flags]
+        return sum([c.itemsize * len(c) for c in columns])
+
+    def append(self, config):
+        """Add a reading to the end of the columns.
+
+        :param config: Reading from the roaster including its time
+        :type config: dict
+        :returns: None
+        """
+        self.time.append(config['time'])
+        for key in self.TEMPS:
+            getattr(self, key).append(config[key])
+        for key in self.LEVELS:
+            getattr(self, key).append(config[key])
+        flags = 0
+        for bit, key in enumerate(self.FLAGS):
+            if config.get(key, True):
+                flags |= 1 << bit
+        self.flags.append(flags)
+
+    def mark(self, event):
+        """Record an event after the most recent reading.
+
+        :param event: Event details including time and config
+        :type event: dict
+        :returns: None
+        """
+        self._markers.append((len(self.time), event))
+
+    def markers(self):
+        """Get the marked events in the order they were recorded.
+
+        :returns: list
+        """
+        return [event for _, event in self._markers]
+
+    def config(self, index):
+        """Build the config dictionary for a single reading.
+
+        :param index: Position of the reading
+        :type index: int
+        :returns: dict
+        """
+        config = {'time': self.time[index]}
+        for key in self.TEMPS:
+            config[key] = getattr(self, key)[index]
+        for key in self.LEVELS:
+            config[key] = getattr(self, key)[index]
+        flags = self.flags[index]
+        for bit, key in enumerate(self.FLAGS):
+            config[key] = (flags >> bit) & 1
+        config['valid'] = bool(config['valid'])
+        return config
+
+    def sample(self, index):
+        """Build a reading in the same shape stored with historic roasts.
+
+        :param index: Position of the reading
+        :type index: int
+        :returns: dict
+        """
+        return {'config': self.config(index), 'time': self.time[index]}
+
+    def materialize(self):
+        """Build the full list of samples and events.
+
+        :returns: list
+        """
+        return list(self)
+
+    def extend(self, events):
+        """Add samples and marked events in the shape they are stored in.
+
+        :param events: Samples and events, oldest first
+        :type events: list
+        :returns: None
+        """
+        for event in events:
+            if 'event' in event:
+                self.mark(event)
+            else:
+                self.append(dict(event['config'], time=event['time']))
+
+    def _packed_columns(self):
+        """Get every column as integers ready to be packed.
+
+        :returns: list of arrays
+        """
+        scaled = [[int(round(t * self.TIME_SCALE)) for t in self.time]]
+        for key in self.TEMPS:
+            scaled.append([int(round(t * self.TEMP_SCALE))
+                           for t in getattr(self, key)])
+        columns = list()
+        for values in scaled:
+            deltas = [b - a for a, b in zip([0] + values, values)]
+            columns.append(array('i', deltas))
+        columns.extend([self.heater, self.fan, self.main_fan, self.flags])
+        return columns
+
+    def pack(self):
+        """Encode the store into a compact document for saving.
+
+        :returns: dict
+        """
+        payload = bytearray()
+        for column in self._packed_columns():
+            if sys.byteorder == 'big' and column.itemsize > 1:
+                column = array(column.typecode, column)
+                column.byteswap()
+            payload.extend(column.tobytes())
+        return {'format': self.FORMAT, 'count': len(self.time),
+                'samples': zlib.compress(bytes(payload)),
+                'markers': [{'position': p, 'event': e}
+                            for p, e in self._markers]}
+
+    @classmethod
+    def unpack(cls, packed):
+        """Rebuild a store from a document made by `pack`.
+
+        :param packed: Document returned from `pack`
+        :type packed: dict
+        :returns: SampleStore instance
+        """
+        store = cls()
+        count = packed['count']
+        payload = zlib.decompress(packed['samples'])
+        offset = 0
+        columns = list()
+        for typecode in ['i'] * 3 + ['B'] * 4:
+            column = array(typecode)
+            size = column.itemsize * count
+            column.frombytes(payload[offset:offset + size])
+            if sys.byteorder == 'big' and column.itemsize > 1:
+                column.byteswap()
+            columns.append(column)
+            offset += size
+        store.time = array('d', [t / float(cls.TIME_SCALE)
+                                 for t in accumulate(columns[0])])
+        for key, column in zip(cls.TEMPS, columns[1:3]):
+            setattr(store, key, array('d', [t / float(cls.TEMP_SCALE)
+                                            for t in accumulate(column)]))
+        store.heater, store.fan, store.main_fan, store.flags = columns[3:]
+        store._markers = [(m['position'], m['event'])
+                          for m in packed['markers']]
+        return store
+
+    def since(self, position):
+        """Build the samples and events recorded after a position.
+
+        Positions count samples and events together, the same way they are
+        laid out by `materialize`, so `len` of the store is the position to
+        pass next time.
+
+        :param position: Number of samples and events already collected
+        :type position: int
+        :returns: list
+        """
+        count = len(self) - position
+        index, marker = position, 0
+        markers = self._markers
+        # Work out how many of the leading entries were marked events
+        while marker < len(markers) and markers[marker][0] <= index - 1:
+            marker += 1
+            index -= 1
+        return list(self._iter(index, marker, count))
+
+
+def pack_events(events):
+    """Encode a list of samples and events for saving.
+
+    :param events: Samples and events in the shape they are stored in
+    :type events: list
+    :returns: dict
+    """
+    store = SampleStore()
+    store.extend(events)
+    return store.pack()
+
+
+def unpack_events(packed):
+    """Decode samples and events saved with `pack_events`.
+
+    Lists of events saved before they were packed are passed through.
+
+    :param packed: Packed document or list of events
+    :type packed: dict or list
+    :returns: list
+    """
+    if isinstance(packed, list):
+        return packed
+    return SampleStore.unpack(packed).materialize()
+
+
+class Decimator:
+
+    """Pick readings off a fast stream at a slower, steady rate.
+
+    Readings are let through at the first one on or after each step of a grid
+    anchored on the first reading seen. The tolerance lets a reading that is a
+    little early still count for its step, so a tier running at the same rate
+    as the stream passes every reading.
+
+    :param interval: Seconds between readings that are let through
+    :type interval: int or float
+    :param tolerance: Seconds a reading may arrive ahead of its step
+    :type tolerance: int or float
+    :returns: Decimator instance
+    """
+
+    def __init__(self, interval, tolerance=0.0):
+        """Start without an anchor."""
+        self.interval = interval
+        self.tolerance = tolerance
+        self._next = None
+
+    def due(self, t):
+        """Check whether the reading taken at a time should be let through.
+
+        :param t: Seconds on the clock the reading was taken
+        :type t: float
+        :returns: bool
+        """
+        if self._next is None:
+            self._next = t
+        if t + self.tolerance < self._next:
+            return False
+        steps = int((t + self.tolerance - self._next) // self.interval) + 1
+        self._next += steps * self.interval
+        return True
@@ -0,0 +1,88 @@
+"""
+Keep the roaster loop ticking on a fixed schedule.
+
+Sleeping for the full interval after doing the work lets every tick drift by
+however long the work took. Instead, deadlines are laid out on the monotonic
+clock at exact multiples of the interval and the loop only sleeps for whatever
+time is left before the next one. When a tick overruns, the scheduler either
+catches up by running the missed ticks back-to-back (up to a limit) or skips
+ahead to the next deadline, and counts what happened either way.
+"""
+import time
+
+
+class TickScheduler:
+
+    """Deadline based scheduler for a periodic loop.
+
+    :param interval: Seconds between ticks
+    :type interval: int or float
+    :param catch_up: Run missed ticks immediately instead of skipping them
+    :type catch_up: bool
+    :param clock: Monotonic clock function
+    :type clock: function
+    :param sleep: Sleep function
+    :type sleep: function
+    :returns: TickScheduler instance
+    """
+
+    CATCH_UP_LIMIT = 4
+
+    def __init__(self, interval, catch_up=False, clock=time.monotonic,
+                 sleep=time.sleep):
+        """Prepare the schedule without starting it."""
+        self.interval = interval
+        self.catch_up = catch_up
+        self._clock = clock
+        self._sleep = sleep
+        self._deadline = None
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.jitter = 0.0
+        self.max_jitter = 0.0
+        self._total_jitter = 0.0
+
+    def start(self):
+        """Anchor the schedule to the current time.
+
+        :returns: float deadline of the first tick
+        """
+        self._deadline = self._clock()
+        return self._deadline
+
+    def wait(self):
+        """Sleep until the next deadline.
+
+        :returns: float deadline of the tick that is starting
+        """
+        if self._deadline is None:
+            self.start()
+        self._deadline += self.interval
+        now = self._clock()
+        if now > self._deadline:
+            self.overruns += 1
+            behind = int((now - self._deadline) // self.interval)
+            if self.catch_up and behind < self.CATCH_UP_LIMIT:
+                behind = 0
+            self.skipped += behind
+            self._deadline += behind * self.interval
+        remaining = self._deadline - now
+        if remaining > 0:
+            self._sleep(remaining)
+        self.jitter = max(self._clock() - self._deadline, 0.0)
+        self.max_jitter = max(self.max_jitter, self.jitter)
+        self._total_jitter += self.jitter
+        self.ticks += 1
+        return self._deadline
+
+    def stats(self):
+        """Get the scheduling counters.
+
+        :returns: dict
+        """
+        mean = self._total_jitter / self.ticks if self.ticks else 0.0
+        return {'interval': self.interval, 'ticks': self.ticks,
+                'overruns': self.overruns, 'skipped': self.skipped,
+                'jitter': self.jitter, 'max_jitter': self.max_jitter,
+                'mean_jitter': mean}
@@ -0,0 +1,176 @@
+"""
+Shared memory structures for running acquisition in its own process.
+
+The acquisition process is the only writer of the sample ring and the web
+process is the only writer of the command mailbox, so neither needs a lock.
+Both use sequence numbers so a reader can tell when it looked at a slot while
+it was being written and simply try again later.
+"""
+import multiprocessing
+
+SPAWN = multiprocessing.get_context('spawn')
+
+
+class SampleRing:
+
+    """Fixed size ring of readings shared between processes.
+
+    Every slot begins with the sequence number of the reading it holds. The
+    writer marks the slot as busy, writes the fields and then stamps the
+    sequence number, so readers can detect torn or overwritten slots.
+
+    :param capacity: Number of readings kept before the oldest is overwritten
+    :type capacity: int
+    :returns: SampleRing instance
+    """
+
+    FIELDS = ['acquired', 'environment_temp', 'bean_temp', 'heater', 'fan',
+              'main_fan', 'solenoid', 'drum_motor', 'cooling_motor',
+              'chaff_tray', 'valid']
+    FLOATS = ['acquired', 'environment_temp', 'bean_temp']
+
+    def __init__(self, capacity=1024, ctx=SPAWN):
+        """Allocate the shared slots."""
+        self.capacity = capacity
+        self._width = len(self.FIELDS) + 1
+        self._data = ctx.RawArray('d', capacity * self._width)
+        self._head = ctx.RawValue('Q', 0)
+
+    def head(self):
+        """Get the sequence number the next reading will be written with.
+
+        :returns: int
+        """
+        return self._head.value
+
+    def write(self, settings):
+        """Publish a reading into the next slot.
+
+        :param settings: Reading from the roaster
+        :type settings: dict
+        :returns: int sequence number of the reading
+        """
+        seq = self._head.value
+        base = (seq % self.capacity) * self._width
+        self._data[base] = -1
+        self._data[base + 1:base + self._width] = [
+            float(settings.get(key, 0)) for key in self.FIELDS]
+        self._data[base] = seq
+        self._head.value = seq + 1
+        return seq
+
+    def read(self, since):
+        """Read every reading published since a sequence number.
+
+        :param since: Sequence number of the first reading wanted
+        :type since: int
+        :returns: tuple of readings, next sequence number and readings lost
+        """
+        head = self._head.value
+        start = max(since, head - self.capacity)
+        lost = start - since
+        readings = list()
+        for seq in range(start, head):
+            base = (seq % self.capacity) * self._width
+            row = self._data[base:base + self._width]
+            if row[0] != seq or self._data[base] != seq:
+                lost += 1
+                continue
+            reading = dict()
+            for key, value in zip(self.FIELDS, row[1:]):
+                reading[key] = value if key in self.FLOATS else int(value)
+            reading['valid'] = bool(reading['valid'])
+            readings.append(reading)
+        return readings, head, lost
+
+
+class CommandMailbox:
+
+    """Latest control settings shared from the web process.
+
+    Commands always carry the complete set of controls, so only the most
+    recent one matters. The generation counter is odd while an update is being
+    written, which tells the reader to leave it for the next poll.
+
+    :returns: CommandMailbox instance
+    """
+
+    FIELDS = ['heater', 'fan', 'main_fan', 'solenoid', 'drum_motor',
+              'cooling_motor', 'interval', 'cooldown', 'exit']
+
+    def __init__(self, ctx=SPAWN):
+        """Allocate the shared fields."""
+        self._data = ctx.RawArray('d', len(self.FIELDS))
+        self._generation = ctx.RawValue('Q', 0)
+        self._seen = 0
+
+    def _write(self, values):
+        """Write fields between two generation bumps.
+
+        :param values: Field names mapped to their new values
+        :type values: dict
+        :returns: None
+        """
+        self._generation.value += 1
+        for key, value in values.items():
+            self._data[self.FIELDS.index(key)] = float(value)
+        self._generation.value += 1
+
+    def put(self, config):
+        """Publish the current control settings.
+
+        Named to match `Queue.put`, so the mailbox can stand in for the
+        queue the control settings are normally passed through.
+
+        :param config: Control settings from the Hottop
+        :type config: dict
+        :returns: None
+        """
+        self._write({k: v for k, v in config.items() if k in self.FIELDS})
+
+    def flag(self, key):
+        """Raise one of the cooldown or exit flags.
+
+        :param key: Name of the flag
+        :type key: str
+        :returns: None
+        """
+        self._write({key: 1})
+
+    def poll(self, seen):
+        """Get the settings if they changed since the last poll.
+
+        :param seen: Generation returned from the previous poll
+        :type seen: int
+        :returns: tuple of generation and settings, or None for no change
+        """
+        generation = self._generation.value
+        if generation == seen or generation % 2:
+            return seen, None
+        values = self._data[:]
+        if self._generation.value != generation:
+            return seen, None
+        settings = dict(zip(self.FIELDS, values))
+        for key in self.FIELDS:
+            if key != 'interval':
+                settings[key] = int(settings[key])
+        return generation, settings
+
+    def empty(self):
+        """Check whether there is nothing new to `get`.
+
+        :returns: bool
+        """
+        generation = self._generation.value
+        return generation == self._seen or generation % 2 == 1
+
+    def get(self):
+        """Get the latest settings, or None if they are still being written.
+
+        Named to match `Queue.get`, so the control loop can drain the mailbox
+        the same way it drains a queue.
+
+        :returns: dict or None
+        """
+        self._seen, settings = self.poll(self._seen)
+        return settings
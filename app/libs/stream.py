@@ -0,0 +1,85 @@
+"""
+Sequence the live roast state into incremental frames.
+
+Rather than attaching the whole roast (and its ever-growing list of events) to
+every reading, each frame only carries the newest sample, the roast metadata
+that changed since the previous frame and a sequence number. Clients that
+notice a gap in the sequence ask for a snapshot and rebuild from there.
+"""
+import copy
+from threading import Lock
+
+
+class StateStream:
+
+    """Build sequenced delta frames from the roast state.
+
+    :param excluded: Roast keys that should never be sent in a delta
+    :type excluded: list
+    :returns: StateStream instance
+    """
+
+    EXCLUDED = ['events', 'last']
+
+    def __init__(self, excluded=None):
+        """Start with an empty sequence."""
+        self._excluded = excluded or self.EXCLUDED
+        self._lock = Lock()
+        self._seq = 0
+        self._sent = dict()
+
+    def _metadata(self, roast):
+        """Strip the heavy keys out of the roast properties.
+
+        :param roast: Current roast properties
+        :type roast: dict
+        :returns: dict
+        """
+        return {k: v for k, v in roast.items() if k not in self._excluded}
+
+    def frame(self, output, roast, roasting):
+        """Build the next frame in the sequence.
+
+        :param output: Current sample with config and time
+        :type output: dict
+        :param roast: Current roast properties
+        :type roast: dict
+        :param roasting: Whether the control process is running
+        :type roasting: bool
+        :returns: dict
+        """
+        with self._lock:
+            metadata = self._metadata(roast)
+            changed = dict()
+            for key, value in metadata.items():
+                if key not in self._sent or self._sent[key] != value:
+                    changed[key] = value
+            self._sent.update(copy.copy(changed))
+            self._seq += 1
+            frame = dict(output)
+            frame['seq'] = self._seq
+            frame['roast'] = changed
+            frame['roasting'] = roasting
+            return frame
+
+    def snapshot(self, roast, roasting):
+        """Build a full snapshot to resynchronize a client.
+
+        :param roast: Current roast properties
+        :type roast: dict
+        :param roasting: Whether the control process is running
+        :type roasting: bool
+        :returns: dict
+        """
+        with self._lock:
+            return {'seq': self._seq, 'roasting': roasting,
+                    'roast': self._metadata(roast),
+                    'events': list(roast.get('events', list()))}
+
+    def reset(self):
+        """Forget what was sent so the next frame carries all metadata.
+
+        :returns: None
+        """
+        with self._lock:
+            self._sent = dict()
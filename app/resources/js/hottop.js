@@ -2,6 +2,30 @@ socket = null;
 debug = true;
 plotCharge = false;
 plotTurningPoint = false;
+lastSeq = null;
+roastState = {};
+// Flag titles and labels of marked events, by event name
+eventFlags = {
+    'Charge': ['C', 'Charge'],
+    'Turning Point': ['TP', 'Turning Point'],
+    'Dry End': ['DE', 'Dry End'],
+    'Detected Dry End': ['DE?', 'Detected Dry End'],
+    'First Crack': ['FC', 'First Crack'],
+    'Second Crack': ['SC', 'Second Crack'],
+    'Drop': ['D', 'Dropped'],
+    'RoR Crash': ['RC', 'RoR Crash'],
+    'Flick': ['FL', 'Flick']
+};
+
+function eventFlag(event) {
+    var flag = eventFlags[event.event] || [event.event, event.event];
+    var reading = event.config || {time: event.time};
+    var title = flag[0];
+    if (reading.bean_temp !== undefined) {
+        title += ' (' + reading.bean_temp.toFixed(0) + ")";
+    }
+    return {x: reading.time, title: title, text: flag[1]};
+}
 
 function initToggleControl(id, state) {
     if (state === 'false') {
@@ -31,6 +55,7 @@ $(document).ready(function() {
 
     socket.on('connect', function(data) {
         if (debug) { console.log("Client has connect to the server"); }
+        socket.emit('join', roasterId);
     });
 
     socket.on('disconnect', function(data) {
@@ -69,7 +94,38 @@ $(document).ready(function() {
         $("#heat-slider").slider("disable");
     });
 
+    socket.on('snapshot', function(data) {
+        if (debug) { console.log("Stream snapshot", data.seq); }
+        lastSeq = data.seq;
+        roastState = data.roast;
+        // Series come thinned out by the server, events are left as is
+        mainChart.series[0].setData(data.series.s1);
+        mainChart.series[1].setData(data.series.s2);
+        auxChart.series[0].setData(data.series.s3);
+        auxChart.series[1].setData(data.series.s4);
+        // Redraw every flag, the stream only adds them as they happen
+        var flags = [];
+        plotCharge = false;
+        plotTurningPoint = false;
+        $.each(data.events, function(index, event) {
+            flags.push(eventFlag(event));
+            if (event.event === 'Charge') { plotCharge = true; }
+            if (event.event === 'Turning Point') { plotTurningPoint = true; }
+        });
+        mainChart.series[2].setData(flags);
+    });
+
     socket.on('state', function(data) {
+        if (lastSeq === null || data.seq !== lastSeq + 1) {
+            // Missed part of the stream, ask for everything again
+            lastSeq = data.seq;
+            socket.emit('resync', roasterId);
+            return false;
+        }
+        lastSeq = data.seq;
+        $.extend(roastState, data.roast);
+        data.roast = roastState;
+
         if (data.roasting && data.roast.record) {
             $('.mock').prop("disabled", true);
             $('.setup').prop("disabled", true);
@@ -136,9 +192,11 @@ $(document).ready(function() {
 
         mainChart.series[0].addPoint([data.time, data.config.environment_temp]);
         mainChart.series[1].addPoint([data.time, data.config.bean_temp]);
-        // if (data.config.delta_bean_temp){
-        //     mainChart.series[3].addPoint([data.alt_time, data.config.delta_bean_temp]);
-        // }
+        if (data.ror) {
+            // Rate of rise is smoothed on the server, plot it as it comes
+            mainChart.series[3].addPoint([data.time, data.ror.bean_temp]);
+            mainChart.series[4].addPoint([data.time, data.ror.environment_temp]);
+        }
         // Normalize the fan data set to match the scale of heat
         auxChart.series[0].addPoint([data.time, data.config.main_fan * 10]);
         auxChart.series[1].addPoint([data.time, data.config.heater]);
@@ -174,10 +232,23 @@ $(document).ready(function() {
             $("#fan-slider").slider("disable");
             $("#heat-slider").slider("disable");
         } else if (data.activity === "DRY_END") {
+            // Detected dry end is only a suggestion until it is marked
+            mainChart.series[2].addPoint({
+                x: data.state.last.time,
+                title: (data.detected ? 'DE? (' : 'DE (') + data.state.last.bean_temp.toFixed(0) + ")",
+                text: data.detected ? "Detected Dry End" : "Dry End"
+            });
+        } else if (data.activity === "ROR_CRASH") {
+            mainChart.series[2].addPoint({
+                x: data.state.last.time,
+                title: 'RC (' + data.state.last.bean_temp.toFixed(0) + ")",
+                text: "RoR Crash"
+            });
+        } else if (data.activity === "FLICK") {
             mainChart.series[2].addPoint({
                 x: data.state.last.time,
-                title: 'DE (' + data.state.last.bean_temp.toFixed(0) + ")",
-                text: "Dry End"
+                title: 'FL (' + data.state.last.bean_temp.toFixed(0) + ")",
+                text: "Flick"
             });
         } else if (data.activity === "FIRST_CRACK") {
             mainChart.series[2].addPoint({
@@ -205,6 +276,11 @@ $(document).ready(function() {
             $('#monitor-status').toggleClass('connected').toggleClass('disconnected');
             $('.start-monitor').prop("disabled", false);
             $('.shutdown').prop("disabled", false);
+        } else if (data.activity === "ROAST_SAVED") {
+            if (debug) { console.log("Roast saved", data.state); }
+        } else if (data.activity === "ROAST_SAVE_FAILED") {
+            console.error("Saving the roast failed", data.state);
+            alert("The roast could not be saved: " + data.state.error);
         } else {
             console.log(data);
         }
@@ -212,17 +288,17 @@ $(document).ready(function() {
 
     $('.mock').click(function(e) {
         if (debug) { console.log("Mock Initiated"); }
-        socket.emit('mock');
+        socket.emit('mock', roasterId);
     });
 
     $('.setup').click(function(e) {
         if (debug) { console.log("Setup Initiated"); }
-        socket.emit('roaster-setup');
+        socket.emit('roaster-setup', roasterId);
     });
 
     $('.shutdown').click(function(e) {
         if (debug) { console.log("Shutdown Initiated"); }
-        socket.emit('roaster-shutdown');
+        socket.emit('roaster-shutdown', roasterId);
         $.each($('.reading'), function( index, value ) {
             $(this).html('-1');
         });
@@ -230,35 +306,35 @@ $(document).ready(function() {
 
     $('.start-monitor').click(function(e) {
         if (debug) { console.log("Monitoring begins"); }
-        socket.emit('start-monitor');
+        socket.emit('start-monitor', roasterId);
         stopwatch.start();
     });
 
     $('.stop-monitor').click(function(e) {
         if (debug) { console.log("Monitoring ends"); }
-        socket.emit('stop-monitor');
+        socket.emit('stop-monitor', roasterId);
         stopwatch.stop();
     });
 
     $('.dry-end').click(function() {
-        socket.emit('dry-end');
+        socket.emit('dry-end', roasterId);
         $(this).prop("disabled", true);
     });
 
     $('.fc').click(function() {
-        socket.emit('first-crack');
+        socket.emit('first-crack', roasterId);
         $(this).prop("disabled", true);
     });
 
     $('.sc').click(function() {
-        socket.emit('second-crack');
+        socket.emit('second-crack', roasterId);
         $(this).prop("disabled", true);
     });
 
     $('.zero-heat').click(function() {
         $("#heat-slider").slider("value", 0);
         $('#heat-handle').text(0);
-        socket.emit('heater', 0);
+        socket.emit('heater', 0, roasterId);
     });
 
     $('.heat-minus-10').click(function() {
@@ -269,7 +345,7 @@ $(document).ready(function() {
         }
         $("#heat-slider").slider("value", adjusted);
         $('#heat-handle').text(adjusted);
-        socket.emit('heater', adjusted);
+        socket.emit('heater', adjusted, roasterId);
     });
 
     $('.fan-plus-1').click(function() {
@@ -280,12 +356,12 @@ $(document).ready(function() {
         }
         $("#fan-slider").slider("value", adjusted);
         $('#fan-handle').text(adjusted);
-        socket.emit('main-fan', adjusted);
+        socket.emit('main-fan', adjusted, roasterId);
     });
 
     $('.drop').click(function() {
         if (debug) { console.log("Drop Initiated"); }
-        socket.emit('drop');
+        socket.emit('drop', roasterId);
         $(this).prop("disabled", true);
         $("#drum-motor-btn")
         .removeClass('btn-success')
@@ -310,20 +386,20 @@ $(document).ready(function() {
         var id = $(this).attr('id').replace('-btn', '');
         var option = $(this).attr('action');
         if (debug) { console.log(id, option); }
-        socket.emit(id, option);
+        socket.emit(id, option, roasterId);
     });
 
     $("#fan-slider" ).on("slide", function(event, ui) {
-        socket.emit('main-fan', ui.value);
+        socket.emit('main-fan', ui.value, roasterId);
         $('#fan-handle').text(ui.value);
     });
 
     $("#heat-slider" ).on("slide", function(event, ui) {
-        socket.emit('heater', ui.value);
+        socket.emit('heater', ui.value, roasterId);
         $('#heat-handle').text(ui.value);
     });
 
     $('.reset').click(function() {
-        socket.emit('reset', properties);
+        socket.emit('reset', roasterId);
     });
 });
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""Run the real acquisition loop against the emulated Hottop.
+
+Opens the emulator's pseudo-terminal with the roaster's serial settings and
+drives a `ControlProcess` on it, faster than real time and with faults on the
+line, then compares what was sent with what was decoded.
+
+    $ python benchmarks/bench_acquisition.py [seconds] [speed] [log]
+"""
+import logging
+import os
+import sys
+import time
+
+import serial
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.libs.emulator import HottopEmulator, LogReplay, ThermalModel  # noqa
+from app.libs.hottop_thread import ControlProcess, Hottop  # noqa: E402
+
+INTERVAL = 0.5
+FAULTS = {'jitter': 0.2, 'short_reads': 0.2, 'corrupt': 0.02, 'noise': 0.02}
+
+
+def main():
+    """Go."""
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    source = LogReplay(sys.argv[3]) if len(sys.argv) > 3 else ThermalModel()
+    emulator = HottopEmulator(source, INTERVAL, speed, seed=1, **FAULTS)
+    emulator.start()
+
+    log = logging.getLogger('bench')
+    log.addHandler(logging.NullHandler())
+    readings = list()
+    conn = serial.Serial(emulator.port, **Hottop()._serial_settings())
+    config = {'heater': 80, 'fan': 0, 'main_fan': 2, 'solenoid': 0,
+              'drum_motor': 1, 'cooling_motor': 0,
+              'interval': INTERVAL / speed}
+    control = ControlProcess(conn, config, Hottop()._q, log,
+                             callback=readings.append)
+    control.start()
+    time.sleep(seconds)
+    control.shutdown()
+    control.join()
+    conn.close()
+    emulator.shutdown()
+
+    sent = emulator.get_stats()
+    frames = control.get_frame_stats()
+    ticks = control.get_tick_stats()
+    print("%.0fx real time for %.0f s (%.1f roast minutes)" % (
+        speed, seconds, seconds * speed / 60))
+    print("sent      %5d frames  %d short  %d corrupted  %d noise bytes" % (
+        sent['frames'], sent['short_reads'], sent['corrupted'],
+        sent['noise_bytes']))
+    print("decoded   %5d frames  %d bad checksums  %d dropped bytes" % (
+        frames['frames'], frames['bad_checksums'], frames['dropped_bytes']))
+    print("readings  %5d  (%d invalid)" % (
+        len(readings), len([r for r in readings if not r['valid']])))
+    print("ticks     %5d  overruns %d  mean jitter %.2f ms" % (
+        ticks['ticks'], ticks['overruns'], ticks['mean_jitter'] * 1000))
+    print("commands  %5d  echoed heater %d" % (
+        sent['commands'], sent['controls']['heater']))
+    if readings:
+        last = readings[-1]
+        print("last      ET %.1f  BT %.1f" % (
+            last['environment_temp'], last['bean_temp']))
+
+
+if __name__ == '__main__':
+    main()
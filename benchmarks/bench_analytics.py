@@ -0,0 +1,111 @@
+"""Compare the per-reading analytics loop with the array-backed curve.
+
+Derives the historic roast page from the bundled roast log with the loop it
+used before, which walked a dictionary per reading, and with `derive_curve`,
+which also works out rates of rise, phases and the area under the curve.
+Building the curve from a list of events costs about as much as the old loop,
+so the curve is timed both from the events and from the columns of a store,
+as saved roasts are loaded.
+
+    $ python benchmarks/bench_analytics.py [log]
+"""
+import glob
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Import the libraries as their own package, without the web app
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from libs.analytics import derive_curve, derive_roast  # noqa: E402
+from libs.curves import RoastCurve  # noqa: E402
+from libs.samples import SampleStore  # noqa: E402
+
+ROUNDS = 50
+
+
+def legacy_derive(events):
+    """Derive the series and per-minute details one reading at a time."""
+    derived = {'s1': list(), 's2': list(), 's3': list(), 's4': list(),
+               's5': list(), 's6': list(), 'flags': list()}
+    for p in events:
+        if 'event' in p:
+            derived['flags'].append({'x': p['time'], 'title': p['event']})
+            continue
+        derived['s1'].append([p['time'], p['config']['environment_temp']])
+        derived['s2'].append([p['time'], p['config']['bean_temp']])
+        derived['s3'].append([p['time'], p['config']['main_fan'] * 10])
+        derived['s4'].append([p['time'], p['config']['heater']])
+    details = OrderedDict({'state': {'last': -1, 'previous': None}})
+    for idx, p in enumerate(events):
+        if 'event' in p:
+            continue
+        round_time = int(p['time'])
+        config = dict(p['config'])
+        config['bean_temp_str'] = ("%.2f" % config['bean_temp'])
+        if round_time not in details:
+            details[round_time] = {'first': config}
+        if round_time > details['state']['last']:
+            if round_time > 0 and round_time - 1 in details:
+                previous = details[round_time - 1]
+                previous['last'] = details['state']['previous']
+                previous['delta'] = (previous['last']['bean_temp'] -
+                                     previous['first']['bean_temp'])
+                last = previous['last']['environment_temp']
+                first = previous['first']['environment_temp']
+                derived['s5'].append([p['time'], previous['delta']])
+                derived['s6'].append([p['time'], last - first])
+                previous['percent'] = int((last - first) / first * 100)
+            details['state']['last'] = round_time
+        details['state']['previous'] = config
+    del details['state']
+    return derived, details
+
+
+def timed(func, *args):
+    """Run a function a few rounds and report the best time."""
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def derive_packed(packed):
+    """Derive a saved roast the way the historic roast page does."""
+    return derive_curve(RoastCurve.from_store(SampleStore.unpack(packed)))
+
+
+def main():
+    """Go."""
+    path = sys.argv[1] if len(sys.argv) > 1 else glob.glob(
+        os.path.join(ROOT, 'logs', '*.log'))[0]
+    with open(path) as handle:
+        events = json.load(handle)['events']
+    store = SampleStore()
+    store.extend(events)
+    packed = store.pack()
+    curve = RoastCurve.from_store(store)
+
+    results = [
+        ('legacy loop', timed(legacy_derive, events)),
+        ('derive from events', timed(derive_roast, events)),
+        ('derive from packed', timed(derive_packed, packed)),
+        ('derive_curve', timed(derive_curve, curve)),
+        ('curve from events', timed(RoastCurve.from_events, events)),
+        ('curve from store', timed(RoastCurve.from_store, store)),
+        ('unpack store', timed(SampleStore.unpack, packed)),
+        ('curve summary', timed(curve.summary)),
+    ]
+    print("%d readings" % len(curve))
+    for label, best in results:
+        print("%-18s %8.3f ms" % (label, best * 1000))
+
+
+if __name__ == '__main__':
+    main()
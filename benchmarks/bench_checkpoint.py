@@ -0,0 +1,83 @@
+"""Compare saving a roast in one insert with checkpointing it into buckets.
+
+Replays a saved roast log into a scratch database, once as the single insert
+done when monitoring stops and once as ten-second checkpoints followed by the
+seal, and reports the latency of the stop step, the bytes written and the
+size of the saved roast with its events packed.
+
+    $ MONGO_URI=mongodb://localhost python benchmarks/bench_checkpoint.py [log]
+"""
+import glob
+import json
+import os
+import sys
+import time
+
+import bson
+import pymongo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.libs.checkpoint import RoastCheckpointer, load_events  # noqa: E402
+
+SAMPLES_PER_CHECKPOINT = 20
+
+
+class Replay:
+
+    """Reveal the events of a saved roast a few at a time."""
+
+    def __init__(self, roast):
+        self.roast = roast
+        self.visible = 0
+
+    def get_events_since(self, position):
+        events = self.roast['events'][position:self.visible]
+        return events, position + len(events)
+
+    def get_roast(self, events=True):
+        return {k: v for k, v in self.roast.items() if k != 'events'}
+
+
+def main():
+    """Go."""
+    path = sys.argv[1] if len(sys.argv) > 1 else glob.glob(
+        os.path.join(ROOT, 'logs', '*.log'))[0]
+    with open(path) as handle:
+        roast = json.load(handle)
+    client = pymongo.MongoClient(os.environ.get('MONGO_URI'))
+    db = client['bench_checkpoint']
+    client.drop_database(db)
+
+    start = time.perf_counter()
+    db.history.insert(dict(roast))
+    single = time.perf_counter() - start
+    single_bytes = len(bson.BSON.encode(roast))
+
+    replay = Replay(roast)
+    checkpoint = RoastCheckpointer(replay, db.samples, roast.get('user'))
+    while replay.visible < len(roast['events']):
+        replay.visible += SAMPLES_PER_CHECKPOINT
+        checkpoint.flush()
+    stats = checkpoint.seal(db.history, roast)
+    fetch = time.perf_counter()
+    saved = db.history.find_one({'_id': checkpoint.roast_id})
+    restored = load_events(db.samples, saved)
+    fetch = time.perf_counter() - fetch
+    assert len(restored) == len(roast['events'])
+
+    print("%d events, %d checkpoints, %d bucket writes" % (
+        len(roast['events']), stats['checkpoints'], stats['writes']))
+    print("single insert  stop %7.2f ms  %8d bytes" % (
+        single * 1000, single_bytes))
+    print("checkpointed   stop %7.2f ms  %8d bytes  (max checkpoint %.2f ms)"
+          % (stats['seal_latency'] * 1000, stats['bytes'],
+             stats['max_latency'] * 1000))
+    print("saved roast    %d bytes, fetched and decoded in %.2f ms" % (
+        len(bson.BSON.encode(saved)), fetch * 1000))
+    client.drop_database(db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Time lining up many roasts for an overlay comparison.
+
+Unpacks the bundled roast log as if it were stored many times over, shifts
+each copy a little so they need lining up, and times building the curves
+and resampling them onto one grid the way /roast/compare does.
+
+    $ python benchmarks/bench_compare.py [count]
+"""
+import glob
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Import the libraries as their own package, without the web app
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from libs.curves import RoastCurve, align_curves  # noqa: E402
+from libs.samples import SampleStore, pack_events  # noqa: E402
+
+COUNT = 25
+ROUNDS = 20
+
+
+def shifted(events, minutes):
+    """Copy events with every time moved later by some minutes."""
+    moved = list()
+    for event in events:
+        event = dict(event, time=event['time'] + minutes)
+        if 'config' in event:
+            event['config'] = dict(event['config'], time=event['time'])
+        moved.append(event)
+    return moved
+
+
+def main():
+    """Go."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else COUNT
+    path = glob.glob(os.path.join(ROOT, 'logs', '*.log'))[0]
+    with open(path) as handle:
+        events = json.load(handle)['events']
+    packed = [pack_events(shifted(events, i * 0.05)) for i in range(count)]
+
+    for align in ['charge', 'turning_point']:
+        best = None
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            curves = [RoastCurve.from_store(SampleStore.unpack(p))
+                      for p in packed]
+            built = time.perf_counter()
+            grid, offsets, series = align_curves(curves, align)
+            done = time.perf_counter()
+            timing = (built - start, done - built)
+            best = timing if best is None or sum(timing) < sum(best) else best
+        print("%-14s %d roasts, %d grid points: unpack %.2f ms, "
+              "align %.2f ms" % (align, count, len(grid), best[0] * 1000,
+                                 best[1] * 1000))
+
+
+if __name__ == '__main__':
+    main()
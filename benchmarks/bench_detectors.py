@@ -0,0 +1,67 @@
+"""Time the event detectors against the budget each reading gets.
+
+Replays the readings from the bundled roast log through the rate of rise
+estimator and the detector pipeline, marking first crack where the log does
+so the late roast detectors run too, and reports the cost per reading along
+with the counters of every detector.
+
+    $ python benchmarks/bench_detectors.py [log]
+"""
+import glob
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Import the libraries as their own package, without the web app
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from libs.detectors import DetectorPipeline  # noqa: E402
+from libs.estimators import RateOfRise  # noqa: E402
+
+ROUNDS = 20
+# Readings in the rate of rise window at the normal interval
+ROR_SAMPLES = 60
+
+
+def replay(events):
+    """Run a fresh pipeline over a roast and return it."""
+    pipeline = DetectorPipeline()
+    ror = RateOfRise('least_squares', ROR_SAMPLES)
+    for event in events:
+        if 'event' in event:
+            if event['event'] == 'First Crack':
+                pipeline.marked(event['event'], event['time'])
+            continue
+        config = event['config']
+        pipeline.update(config, ror.update(config))
+    return pipeline
+
+
+def main():
+    """Go."""
+    path = sys.argv[1] if len(sys.argv) > 1 else glob.glob(
+        os.path.join(ROOT, 'logs', '*.log'))[0]
+    with open(path) as handle:
+        events = json.load(handle)['events']
+    readings = len([e for e in events if 'event' not in e])
+
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        pipeline = replay(events)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    stats = pipeline.get_stats()
+    print("%d readings, %.2f us each with the rate of rise, budget %.0f us, "
+          "%d overruns" % (readings, best / readings * 1e6,
+                           stats['budget'] * 1e6, stats['overruns']))
+    for name, counters in stats['detectors'].items():
+        print("%-14s %5d calls %2d fired %6.2f us mean %6.2f us max"
+              % (name, counters['calls'], counters['fired'],
+                 counters['mean'] * 1e6, counters['max'] * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Measure how many exported roast logs a bulk import gets through a minute.
+
+Copies a saved roast log under many ids and start times into a scratch
+directory, imports them into a scratch database and then imports them again
+to time the pass where every roast is a duplicate.
+
+    $ MONGO_URI=mongodb://localhost python benchmarks/bench_import.py [count]
+"""
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import pymongo
+from bson.objectid import ObjectId
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Import the libraries as their own package, without the web app, as the
+# import command does
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from libs.importer import RoastImporter  # noqa: E402
+
+COUNT = 2000
+
+
+def main():
+    """Go."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else COUNT
+    path = glob.glob(os.path.join(ROOT, 'logs', '*.log'))[0]
+    with open(path) as handle:
+        roast = json.load(handle)
+    scratch = tempfile.mkdtemp()
+    for i in range(count):
+        roast['start_time'] = "roast %d" % i
+        name = "%s-%s.log" % (roast['date'], ObjectId())
+        with open(os.path.join(scratch, name), 'w') as handle:
+            json.dump(roast, handle)
+
+    client = pymongo.MongoClient(os.environ.get('MONGO_URI'))
+    db = client['bench_import']
+    client.drop_database(db)
+    try:
+        for label in ['first import', 'second import']:
+            stats = RoastImporter(db.history).run([scratch])
+            print("%-14s %5d imported %5d duplicates %7.2f s  %8.0f a minute"
+                  % (label, stats['imported'], stats['duplicates'],
+                     stats['seconds'], stats['per_minute']))
+    finally:
+        client.drop_database(db)
+        shutil.rmtree(scratch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Measure tick jitter of the roaster loop while the web process is busy.
+
+Runs the same deadline-scheduled loop twice while several threads keep the
+interpreter busy the way template rendering does: once as a thread inside
+the loaded process and once in a separate process publishing into the shared
+sample ring.
+
+    $ python benchmarks/bench_isolation.py [seconds] [load threads]
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app', 'libs'))
+
+from scheduler import TickScheduler  # noqa: E402
+from shared import SPAWN, SampleRing  # noqa: E402
+
+INTERVAL = 0.05
+SAMPLE = {'environment_temp': 400.1, 'bean_temp': 350.2, 'heater': 100,
+          'fan': 0, 'main_fan': 2, 'solenoid': 0, 'drum_motor': 1,
+          'cooling_motor': 0, 'chaff_tray': 1, 'valid': True}
+
+
+def tick_loop(seconds, publish):
+    """Run the scheduled loop and return its counters."""
+    ticker = TickScheduler(INTERVAL)
+    end = ticker.start() + seconds
+    while time.monotonic() < end:
+        reading = dict(SAMPLE, acquired=time.monotonic())
+        publish(reading)
+        ticker.wait()
+    return ticker.stats()
+
+
+def isolated_loop(seconds, ring, results):
+    """Run the loop in a child process, publishing into the ring."""
+    results.put(tick_loop(seconds, ring.write))
+
+
+def render_load(stop):
+    """Keep the interpreter busy like a heavy page render."""
+    rows = [dict(SAMPLE, time=i) for i in range(2000)]
+    while not stop.is_set():
+        json.dumps(rows)
+        ''.join(['<tr><td>%s</td></tr>' % r['time'] for r in rows])
+
+
+def with_load(threads, func):
+    """Run a function while load threads are running."""
+    stop = threading.Event()
+    workers = [threading.Thread(target=render_load, args=(stop,))
+               for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    try:
+        return func()
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+
+def run_threaded(seconds, threads):
+    """Tick loop as a thread in the loaded process."""
+    results = list()
+
+    def go():
+        loop = threading.Thread(target=lambda: results.append(
+            tick_loop(seconds, lambda reading: None)))
+        loop.start()
+        loop.join()
+        return results[0]
+    return with_load(threads, go)
+
+
+def run_isolated(seconds, threads):
+    """Tick loop in its own process while the parent reads the ring."""
+    ring = SampleRing(1024)
+    results = SPAWN.Queue()
+    child = SPAWN.Process(target=isolated_loop, args=(seconds, ring, results))
+
+    def go():
+        child.start()
+        since = 0
+        while child.is_alive() and results.empty():
+            batch, since, lost = ring.read(since)
+            time.sleep(INTERVAL / 2)
+        stats = results.get()
+        child.join()
+        return stats
+    return with_load(threads, go)
+
+
+def report(label, stats):
+    """Print the interesting counters."""
+    print("%-10s ticks %4d  overruns %3d  skipped %3d  "
+          "mean jitter %6.2f ms  max jitter %6.2f ms" % (
+              label, stats['ticks'], stats['overruns'], stats['skipped'],
+              stats['mean_jitter'] * 1000, stats['max_jitter'] * 1000))
+
+
+def main():
+    """Go."""
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    print("interval %.0f ms, %d load threads, %.0f s" % (
+        INTERVAL * 1000, threads, seconds))
+    report('threaded', run_threaded(seconds, threads))
+    report('isolated', run_isolated(seconds, threads))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Compare per-sample cost of the rolling slope against scipy's linregress.
+
+Replays the bean temperatures from the bundled roast log through both the
+previous list-rebuilding linregress approach and the incremental estimator,
+and reports the cost of the other rate of rise estimators too.
+
+Before timing anything, every bundled log is replayed through the rolling
+slope the way charge and turning point are detected, and the times found
+are checked against the events recorded in the log. It exits non-zero if
+they are more than a second apart.
+
+    $ python benchmarks/bench_slope.py [log]
+"""
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app', 'libs'))
+
+from estimators import SLOPES, RollingSlope  # noqa: E402
+
+WINDOW = 5
+ROUNDS = 20
+# Minutes detected events may be off from the recorded ones
+TOLERANCE = 1 / 60.0
+
+
+def load_samples(path):
+    """Pull (time, bean_temp) pairs out of an exported roast log."""
+    with open(path) as handle:
+        roast = json.load(handle)
+    return [(e['time'], e['config']['bean_temp']) for e in roast['events']
+            if 'event' not in e]
+
+
+def detect_events(samples):
+    """Find charge and turning point from the sign of the rolling slope."""
+    window = RollingSlope(WINDOW)
+    found = dict()
+    for x, y in samples:
+        slope = window.update(x, y)
+        if 'Charge' not in found:
+            if slope < 0:
+                found['Charge'] = x
+        elif 'Turning Point' not in found and slope > 0:
+            found['Turning Point'] = x
+    return found
+
+
+def check_events(paths):
+    """Compare detected charge and turning points with the recorded ones."""
+    ok = True
+    for path in paths:
+        with open(path) as handle:
+            events = json.load(handle)['events']
+        recorded = {e['event']: e['time'] for e in events if 'event' in e}
+        found = detect_events(load_samples(path))
+        for name in ['Charge', 'Turning Point']:
+            if name not in recorded:
+                continue
+            expected, actual = recorded[name], found.get(name)
+            close = (actual is not None and
+                     abs(actual - expected) <= TOLERANCE)
+            ok = ok and close
+            print("%-14s recorded %6.3f, detected %6s %s"
+                  % (name, expected, "%.3f" % actual if actual else '-',
+                     'ok' if close else 'MISMATCH'))
+    return ok
+
+
+def bench_linregress(samples):
+    """Rebuild the window lists and regress on every sample."""
+    from scipy.stats import linregress
+    window = deque(list(), WINDOW)
+    slopes = list()
+    for x, y in samples:
+        window.append({'time': x, 'bean_temp': y})
+        times, temps = list(), list()
+        for item in list(window):
+            times.append(item['time'])
+            temps.append(item['bean_temp'])
+        if len(times) < 2:
+            slopes.append(0.0)
+            continue
+        slopes.append(linregress(times, temps)[0])
+    return slopes
+
+
+def bench_rolling(samples):
+    """Update the running sums on every sample."""
+    window = RollingSlope(WINDOW)
+    return [window.update(x, y) for x, y in samples]
+
+
+def timed(func, samples):
+    """Run a function a few rounds and report the best per-sample cost."""
+    best = None
+    result = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = func(samples)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best / len(samples) * 1e6
+
+
+def main():
+    """Go."""
+    logs = glob.glob(os.path.join(ROOT, 'logs', '*.log'))
+    if not check_events(logs):
+        sys.exit(1)
+    default = logs[0]
+    samples = load_samples(sys.argv[1] if len(sys.argv) > 1 else default)
+    print("samples: %d, window: %d" % (len(samples), WINDOW))
+
+    rolling, cost = timed(bench_rolling, samples)
+    print("RollingSlope: %8.2f us/sample" % cost)
+    for name, estimator in sorted(SLOPES.items()):
+        window = estimator(max(WINDOW, 3))
+        _, other = timed(lambda s: [window.update(x, y) for x, y in s],
+                         samples)
+        print("  %-16s %8.2f us/sample" % (name, other))
+    try:
+        regressed, base = timed(bench_linregress, samples)
+    except ImportError:
+        print("linregress:   scipy is not installed, skipping")
+        return
+    print("linregress:   %8.2f us/sample (%.1fx)" % (base, base / cost))
+    error = max(abs(a - b) for a, b in zip(rolling, regressed))
+    print("max slope difference: %.3e" % error)
+
+
+if __name__ == '__main__':
+    main()
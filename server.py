@@ -1,9 +1,20 @@
-"""Run the server and begin hosting."""
+"""Run the server and begin hosting.
+
+Importing the `app` package monkey patches the standard library for eventlet,
+so it is only imported by the commands that need it. Bulk imports parse logs
+in worker processes, which must not inherit the patching, and only need the
+history collection, so they load the libraries on their own instead.
+"""
+import os
 import socket
 import sys
-from app import create_app, sio
+import time
 from argparse import ArgumentParser
 
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Collection `create_app` keeps finished roasts in
+HISTORY_COLLECTION = 'history'
+
 
 def main():
     """Go."""
@@ -14,8 +25,50 @@ def main():
                               help='Run in debug mode.')
     setup_parser.add_argument('--simulate', action='store_true',
                               help='Run in simulation mode.')
+    setup_parser.add_argument('--isolate', action='store_true',
+                              help='Run roaster I/O in its own process.')
+    setup_parser.add_argument('--high-rate', action='store_true',
+                              help='Sample the roaster as fast as possible.')
+    setup_parser.add_argument('--port', action='append', dest='ports',
+                              help='Serial port a roaster may use, such as '
+                                   'an emulator. Repeat for more.')
+    emulate_parser = subs.add_parser('emulate')
+    emulate_parser.add_argument('--log', help='Replay a saved roast log.')
+    emulate_parser.add_argument('--speed', type=float, default=1.0,
+                                help='Times faster than real time.')
+    emulate_parser.add_argument('--interval', type=float, default=0.5,
+                                help='Seconds of roast time per frame.')
+    emulate_parser.add_argument('--faults', action='store_true',
+                                help='Add jitter, short reads and bad frames.')
+    subs.add_parser('compact')
+    recover_parser = subs.add_parser('recover')
+    recover_parser.add_argument('--age', type=float, default=60,
+                                help='Minutes since a roast started before '
+                                     'it is recovered.')
+    recover_parser.add_argument('--discard', action='store_true',
+                                help='Remove unfinished roasts instead.')
+    import_parser = subs.add_parser('import')
+    import_parser.add_argument('paths', nargs='+',
+                               help='Exported logs or directories of them.')
+    import_parser.add_argument('--user',
+                               help='Owner to give every imported roast.')
+    import_parser.add_argument('--workers', type=int,
+                               help='Processes parsing logs, one per CPU.')
+    import_parser.add_argument('--batch', type=int, default=200,
+                               help='Roasts inserted at once.')
     args = parser.parse_args()
-    kwargs = {'simulate': args.simulate, 'debug': args.debug}
+    if args.cmd == 'emulate':
+        return emulate(args)
+    if args.cmd == 'import':
+        return import_logs(args)
+    from app import create_app, sio
+    if args.cmd == 'compact':
+        return compact(create_app())
+    if args.cmd == 'recover':
+        return recover(create_app(), args)
+    kwargs = {'simulate': args.simulate, 'debug': args.debug,
+              'isolate': args.isolate, 'high_rate': args.high_rate,
+              'ports': args.ports}
     app = create_app(**kwargs)
 
     try:
@@ -26,5 +79,76 @@ def main():
     sio.run(app, host="0.0.0.0", port=80)
 
 
+def emulate(args):
+    """Serve an emulated roaster until interrupted."""
+    from app.libs.emulator import HottopEmulator, LogReplay, ThermalModel
+    source = LogReplay(args.log) if args.log else ThermalModel()
+    faults = dict()
+    if args.faults:
+        faults = {'jitter': 0.2, 'short_reads': 0.1, 'corrupt': 0.01,
+                  'noise': 0.01}
+    emulator = HottopEmulator(source, args.interval, args.speed, **faults)
+    emulator.start()
+    print("Emulated Hottop on %s, serve with --port %s"
+          % (emulator.port, emulator.port))
+    try:
+        while emulator.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    emulator.shutdown()
+    print(emulator.get_stats())
+
+
+def compact(app):
+    """Pack the events of roasts saved before they were stored packed."""
+    from app import mongo
+    from app.libs.samples import pack_events
+    with app.app_context():
+        c = mongo.db[app.config['HISTORY_COLLECTION']]
+        count = 0
+        for item in c.find({'events': {'$type': 'array'}}, {'events': 1}):
+            packed = pack_events(item['events'])
+            c.update({'_id': item['_id']}, {'$set': {'events': packed}})
+            count += 1
+        print("Packed the events of %d roasts" % count)
+
+
+def recover(app, args):
+    """Seal or discard roasts left in checkpoint buckets by a crash."""
+    from app import mongo
+    from app.libs.checkpoint import recover_roasts
+    with app.app_context():
+        stats = recover_roasts(mongo.db[app.config['SAMPLES_COLLECTION']],
+                               mongo.db[app.config['HISTORY_COLLECTION']],
+                               args.age, args.discard)
+    print("Recovered %(sealed)d roasts, discarded %(discarded)d, cleaned up "
+          "%(cleaned)d already saved and skipped %(skipped)d recent" % stats)
+
+
+def import_logs(args):
+    """Bulk import exported roast logs, connecting to Mongo directly."""
+    # Import the libraries as their own package, without the web app
+    sys.path.insert(0, os.path.join(ROOT, 'app'))
+    from libs.importer import RoastImporter
+    from pymongo import MongoClient
+
+    def progress(stats):
+        print("%(done)d of %(files)d logs, %(imported)d imported, "
+              "%(duplicates)d duplicates, %(failed)d failed "
+              "(%(per_minute).0f a minute)" % stats)
+
+    # Same database as Flask-PyMongo, the one named in the URI
+    client = MongoClient(os.environ.get('MONGO_URI'))
+    c = client.get_database()[HISTORY_COLLECTION]
+    importer = RoastImporter(c, args.user, args.workers, args.batch,
+                             progress)
+    stats = importer.run(args.paths)
+    client.close()
+    for path, error in sorted(stats.get('errors', dict()).items()):
+        print("Skipped %s: %s" % (path, error))
+    print("Imported %(imported)d roasts in %(seconds).1f seconds" % stats)
+
+
 if __name__ == '__main__':
     main()
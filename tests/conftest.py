@@ -0,0 +1,8 @@
+"""Import the libraries as their own package, without the web app."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+# Tests of the views still import them through the app
+sys.path.insert(1, ROOT)
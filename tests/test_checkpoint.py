@@ -0,0 +1,109 @@
+"""Check roasts recovered from checkpoint buckets."""
+import datetime
+
+from bson.objectid import ObjectId
+
+from app.core.history import SUMMARY, add_rest_days
+from libs.checkpoint import load_events, recover_roasts
+from libs.samples import pack_events
+
+
+class Cursor(list):
+
+    def sort(self, key, direction):
+        return Cursor(sorted(self, key=lambda d: d[key],
+                             reverse=direction < 0))
+
+
+class Collection:
+
+    """Just enough of a Mongo collection for the recovery."""
+
+    def __init__(self, docs=None):
+        self.docs = list(docs or list())
+
+    def _match(self, query):
+        return [d for d in self.docs
+                if all(d.get(k) == v for k, v in query.items())]
+
+    def find(self, query):
+        return Cursor(self._match(query))
+
+    def find_one(self, query, projection=None, sort=None):
+        found = self.find(query)
+        for key, direction in sort or list():
+            found = found.sort(key, direction)
+        return found[0] if found else None
+
+    def distinct(self, key):
+        return list({d[key] for d in self.docs})
+
+    def insert(self, doc):
+        self.docs.append(doc)
+
+    def remove(self, query):
+        matched = self._match(query)
+        self.docs = [d for d in self.docs if d not in matched]
+
+
+def readings(count):
+    """Build a reading every half second."""
+    output = list()
+    for i in range(count):
+        config = {'time': i / 120.0, 'environment_temp': 400.0,
+                  'bean_temp': 200.0 + i, 'heater': 80, 'fan': 2,
+                  'main_fan': 0, 'solenoid': 0, 'drum_motor': 1,
+                  'cooling_motor': 0, 'chaff_tray': 1, 'valid': True}
+        output.append({'time': config['time'], 'config': config})
+    return output
+
+
+def buckets(state, updated=None):
+    started = datetime.datetime.utcnow() - datetime.timedelta(hours=3)
+    roast_id = ObjectId.from_datetime(started)
+    events = readings(300)
+    docs = list()
+    for bucket, offset in enumerate(range(0, len(events), 240)):
+        doc = {'roast': roast_id, 'bucket': bucket, 'user': 'tester',
+               'chunks': [pack_events(events[offset:offset + 240])],
+               'state': state}
+        if updated:
+            doc['updated'] = updated
+        docs.append(doc)
+    return roast_id, events, docs
+
+
+def test_recovered_roast_can_be_listed():
+    state = {'name': 'Kenya', 'coffee': None, 'start_time':
+             '2026-10-14 08:00:00', 'end_time': None, 'duration': '02:30',
+             'input_weight': 250, 'output_weight': -1, 'operator': None}
+    roast_id, events, docs = buckets(state, '2026-10-14 08:02:30')
+    samples, history = Collection(docs), Collection()
+
+    stats = recover_roasts(samples, history)
+
+    assert stats['sealed'] == 1
+    assert samples.docs == list()
+    roast = history.docs[0]
+    assert roast['_id'] == roast_id
+    assert roast['recovered']
+    assert roast['end_time'] == '2026-10-14 08:02:30'
+    assert roast['date'] == '2026-10-14'
+    assert len(load_events(samples, roast)) == len(events)
+    summary = [{k: roast[k] for k in SUMMARY}]
+    assert add_rest_days(summary)[0]['rest_days'] >= 0
+
+
+def test_old_buckets_fall_back_to_the_start_time():
+    state = {'start_time': '2026-10-14 08:00:00', 'end_time': None,
+             'duration': -1}
+    _, _, docs = buckets(state)
+    history = Collection()
+
+    recover_roasts(Collection(docs), history)
+
+    roast = history.docs[0]
+    assert roast['end_time'] == '2026-10-14 08:00:00'
+    assert roast['date'] == '2026-10-14'
+    assert roast['duration'] == '02:29'
+    add_rest_days([{k: roast[k] for k in SUMMARY}])
@@ -0,0 +1,49 @@
+"""Check the slope estimators against a plain numpy fit."""
+import numpy
+import pytest
+
+from libs.estimators import PolynomialSlope, RollingSlope
+
+
+def curve(minutes, interval):
+    """Yield (minute, temperature) along a smooth 15 minute roast."""
+    for step in range(int(minutes * 60 / interval) + 1):
+        x = step * interval / 60.0
+        yield x, 200 + 30 * x + 0.5 * x * x
+
+
+@pytest.mark.parametrize('interval,window', [(0.5, 7), (0.1, 50)])
+def test_polynomial_slope_matches_polyfit(interval, window):
+    estimator = PolynomialSlope(window)
+    xs, ys = list(), list()
+    for x, y in curve(15, interval):
+        slope = estimator.update(x, y)
+        xs.append(x)
+        ys.append(y)
+        if len(xs) < window:
+            continue
+        a, b, _ = numpy.polyfit(xs[-window:], ys[-window:], 2)
+        assert slope == pytest.approx(2 * a * x + b, abs=1e-6)
+    # The curve rises at 30 + x degrees per minute
+    assert slope == pytest.approx(30 + xs[-1], abs=1e-6)
+
+
+def test_rolling_slope_matches_polyfit():
+    estimator = RollingSlope(60)
+    xs, ys = list(), list()
+    for x, y in curve(15, 0.5):
+        slope = estimator.update(x, y)
+        xs.append(x)
+        ys.append(y)
+        if len(xs) < 60:
+            continue
+        b, _ = numpy.polyfit(xs[-60:], ys[-60:], 1)
+        assert slope == pytest.approx(b, abs=1e-6)
+
+
+@pytest.mark.parametrize('cls', [PolynomialSlope, RollingSlope])
+def test_flat_window_has_no_slope(cls):
+    estimator = cls(7)
+    for step in range(20):
+        slope = estimator.update(14 + step / 120.0, 410.0)
+    assert slope == 0.0